@@ -0,0 +1,65 @@
+IF NOT EXISTS (SELECT schema_id FROM sys.schemas WHERE name = 'f23_project')
+    EXEC('CREATE SCHEMA f23_project;');
+
+--Creating sequence for US_Treasury_details without an upper limit, or lifting the limit of an existing one
+IF NOT EXISTS (SELECT 1 FROM sys.sequences WHERE name = 'US_Treasury_details_sequence' AND schema_id = SCHEMA_ID('f23_project'))
+    EXEC('CREATE SEQUENCE f23_project.US_Treasury_details_sequence AS BIGINT INCREMENT BY 1 MINVALUE 1 NO MAXVALUE START WITH 1;');
+ELSE
+    EXEC('ALTER SEQUENCE f23_project.US_Treasury_details_sequence NO MAXVALUE;');
+
+-- Creating table US_Treasury_details only when it does not exist, incremental loads keep its rows and indexes
+IF OBJECT_ID('f23_project.US_Treasury_details', 'U') IS NULL
+    CREATE TABLE f23_project.US_Treasury_details (
+                                                     id BIGINT PRIMARY KEY DEFAULT NEXT VALUE FOR f23_project.US_Treasury_details_sequence,
+                                                     record_date DATE,
+                                                     security_type_desc varchar(30),
+                                                     security_desc varchar(100),
+                                                     avg_interest_rate_amt FLOAT,
+                                                     record_fiscal_year_df2 int,
+                                                     record_fiscal_quarter_df2 int,
+                                                     record_calendar_year_df2 int,
+                                                     record_calendar_quarter_df2 int,
+                                                     record_calendar_month_df2 int,
+                                                     record_calendar_day_df2 int,
+                                                     debt_held_public_mil_amt FLOAT,
+                                                     intragov_hold_mil_amt FLOAT,
+                                                     total_mil_amt FLOAT
+    );
+
+-- Key of the MERGE/upsert
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_US_Treasury_details_record_date_security_desc'
+               AND object_id = OBJECT_ID('f23_project.US_Treasury_details'))
+    CREATE UNIQUE INDEX UX_US_Treasury_details_record_date_security_desc
+        ON f23_project.US_Treasury_details (record_date, security_desc);
+
+-- Indexes used by the analysis and Power BI filters
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_US_Treasury_details_record_date'
+               AND object_id = OBJECT_ID('f23_project.US_Treasury_details'))
+    CREATE INDEX IX_US_Treasury_details_record_date
+        ON f23_project.US_Treasury_details (record_date);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_US_Treasury_details_security_type_desc'
+               AND object_id = OBJECT_ID('f23_project.US_Treasury_details'))
+    CREATE INDEX IX_US_Treasury_details_security_type_desc
+        ON f23_project.US_Treasury_details (security_type_desc, record_date)
+        INCLUDE (security_desc, avg_interest_rate_amt, debt_held_public_mil_amt, intragov_hold_mil_amt);
+
+-- Creating the monthly aggregate cube only when it does not exist, loads refresh the changed months in place
+IF OBJECT_ID('f23_project.US_Treasury_monthly_cube', 'U') IS NULL
+    CREATE TABLE f23_project.US_Treasury_monthly_cube (
+                                                          record_month DATE,
+                                                          security_type_desc varchar(30),
+                                                          security_desc varchar(100),
+                                                          row_count int,
+                                                          rate_count int,
+                                                          rate_sum FLOAT,
+                                                          rate_max FLOAT,
+                                                          debt_held_public_sum FLOAT,
+                                                          intragov_hold_sum FLOAT,
+                                                          total_sum FLOAT
+    );
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_US_Treasury_monthly_cube'
+               AND object_id = OBJECT_ID('f23_project.US_Treasury_monthly_cube'))
+    CREATE UNIQUE CLUSTERED INDEX UX_US_Treasury_monthly_cube
+        ON f23_project.US_Treasury_monthly_cube (record_month, security_type_desc, security_desc);
@@ -9,9 +9,10 @@ IF EXISTS (SELECT 1 FROM sys.sequences WHERE name = 'US_Treasury_details_sequenc
 
 --Creating sequence for US_Treasury_details
 CREATE SEQUENCE f23_project.US_Treasury_details_sequence
+    AS BIGINT
     INCREMENT BY 1
     MINVALUE 1
-    MAXVALUE 1000000
+    NO MAXVALUE
     START WITH 1;
 
 -- Creating table US_Treasury_details
@@ -30,4 +31,32 @@ CREATE TABLE f23_project.US_Treasury_details (
                                                  debt_held_public_mil_amt FLOAT,
                                                  intragov_hold_mil_amt FLOAT,
                                                  total_mil_amt FLOAT
-);
\ No newline at end of file
+);
+
+-- Indexes used by the analysis queries and Power BI filters
+CREATE INDEX IX_US_Treasury_details_record_date
+    ON f23_project.US_Treasury_details (record_date);
+
+CREATE INDEX IX_US_Treasury_details_security_type_desc
+    ON f23_project.US_Treasury_details (security_type_desc, record_date)
+    INCLUDE (security_desc, avg_interest_rate_amt, debt_held_public_mil_amt, intragov_hold_mil_amt);
+
+-- Creating the monthly aggregate cube the analysis questions are answered from
+IF OBJECT_ID('f23_project.US_Treasury_monthly_cube', 'U') IS NOT NULL
+    DROP TABLE f23_project.US_Treasury_monthly_cube;
+
+CREATE TABLE f23_project.US_Treasury_monthly_cube (
+                                                      record_month DATE,
+                                                      security_type_desc varchar(30),
+                                                      security_desc varchar(100),
+                                                      row_count int,
+                                                      rate_count int,
+                                                      rate_sum FLOAT,
+                                                      rate_max FLOAT,
+                                                      debt_held_public_sum FLOAT,
+                                                      intragov_hold_sum FLOAT,
+                                                      total_sum FLOAT
+);
+
+CREATE UNIQUE CLUSTERED INDEX UX_US_Treasury_monthly_cube
+    ON f23_project.US_Treasury_monthly_cube (record_month, security_type_desc, security_desc);
@@ -0,0 +1,37 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+from fiscal_api import fetch_all_pages
+from stub_fiscaldata_server import make_fake_records, start_stub_server
+
+
+# Function to time one full paginated fetch against the stub server
+def time_fetch(base_url, page_size, max_workers):
+    start = time.perf_counter()
+    records = fetch_all_pages(base_url, {}, page_size=page_size, max_workers=max_workers)
+    return time.perf_counter() - start, len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark paginated fiscaldata fetching against a local stub server")
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated server latency per page in seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(make_fake_records(args.records), args.latency)
+    try:
+        # Baseline: one page holding every record, the way the script used to fetch
+        elapsed, count = time_fetch(base_url, args.records, 1)
+        print(f"single page      : {elapsed:8.3f}s  {count} records")
+
+        for workers in args.workers:
+            elapsed, count = time_fetch(base_url, args.page_size, workers)
+            print(f"workers={workers:<2} pages: {elapsed:8.3f}s  {count} records")
+    finally:
+        server.shutdown()
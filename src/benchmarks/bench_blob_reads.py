@@ -0,0 +1,105 @@
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+import pandas as pd
+
+from blob_cache import BlobCache, mapped_reader
+from schema import apply_schema, read_csv_options
+from storage_backend import ChunkReader, LocalStorageBackend, default_download_chunk_size
+from synthetic_treasury import interest_rate_header, iter_records_csv_chunks, make_interest_rate_records
+
+container_name = "benchmark"
+blob_name = "processed_data/interest_rates.csv"
+
+
+# Function to read the blob the way the script used to: the whole download, a decoded str copy, then the parse
+def read_decoded(storage, blob_cache, chunk_size):
+    text = storage.read_bytes(container_name, blob_name).decode('utf-8')
+    return apply_schema(pd.read_csv(io.StringIO(text), **read_csv_options(interest_rate_header)))
+
+
+# Function to read the blob from one bytes object holding the whole download
+def read_whole_bytes(storage, blob_cache, chunk_size):
+    data = storage.read_bytes(container_name, blob_name)
+    return apply_schema(pd.read_csv(io.BytesIO(data), **read_csv_options(interest_rate_header)))
+
+
+# Function to parse the blob's ranges as they are downloaded
+def read_streamed(storage, blob_cache, chunk_size):
+    with io.BufferedReader(ChunkReader(storage.iter_chunks(container_name, blob_name, chunk_size)),
+                           buffer_size=chunk_size) as blob_stream:
+        return apply_schema(pd.read_csv(blob_stream, **read_csv_options(interest_rate_header)))
+
+
+# Function to parse the memory-mapped copy in the blob cache
+def read_cached(storage, blob_cache, chunk_size):
+    with blob_cache.open_mapped(container_name, blob_name) as mapped:
+        return apply_schema(pd.read_csv(mapped_reader(mapped), **read_csv_options(interest_rate_header)))
+
+
+# Function to aggregate the streamed blob chunk by chunk, the mean interest rate per security type
+def aggregate_row_chunks(storage, blob_cache, chunk_size):
+    sums = None
+    with io.BufferedReader(ChunkReader(storage.iter_chunks(container_name, blob_name, chunk_size)),
+                           buffer_size=chunk_size) as blob_stream:
+        with pd.read_csv(blob_stream, chunksize=100000, **read_csv_options(interest_rate_header)) as chunks:
+            for chunk_df in chunks:
+                chunk_sums = apply_schema(chunk_df).groupby('security_type_desc', observed=True)[
+                    'avg_interest_rate_amt'].agg(['sum', 'count'])
+                sums = chunk_sums if sums is None else sums.add(chunk_sums, fill_value=0)
+    return sums['sum'] / sums['count']
+
+
+# Function to measure the wall time and peak Python allocations of one read, traced on their own
+def measure(read, storage, blob_cache, chunk_size):
+    start = time.perf_counter()
+    result = read(storage, blob_cache, chunk_size)
+    seconds = time.perf_counter() - start
+    result_bytes = result.memory_usage(deep=True).sum() if isinstance(result, pd.DataFrame) else 0
+    del result
+
+    tracemalloc.start()
+    read(storage, blob_cache, chunk_size)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak_bytes, result_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of reading a CSV blob into a DataFrame")
+    parser.add_argument("--scale", type=int, default=100, help="multiple of the current data volume")
+    parser.add_argument("--chunk-size", type=int, default=default_download_chunk_size,
+                        help="size of the downloaded ranges")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="ranges downloaded at a time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        storage = LocalStorageBackend(os.path.join(work_directory, "storage"))
+        storage.max_concurrency = args.max_concurrency
+        storage.upload_blocks(container_name, blob_name,
+                              iter_records_csv_chunks(make_interest_rate_records(args.scale), interest_rate_header))
+        blob_cache = BlobCache(storage, os.path.join(work_directory, "blob_cache"))
+        # Warm the cache, the cached read then measures a hit
+        with blob_cache.open_mapped(container_name, blob_name):
+            pass
+
+        print(f"blob of {storage.blob_size(container_name, blob_name) / 2 ** 20:.1f} MiB, ranges of "
+              f"{args.chunk_size / 2 ** 20:.1f} MiB, {args.max_concurrency} at a time")
+        reads = {
+            'readall + decode + StringIO': read_decoded,
+            'readall + BytesIO': read_whole_bytes,
+            'streamed ranges': read_streamed,
+            'blob cache (mmap)': read_cached,
+            'row chunks, aggregated': aggregate_row_chunks,
+        }
+        for name, read in reads.items():
+            seconds, peak_bytes, frame_bytes = measure(read, storage, blob_cache, args.chunk_size)
+            frame_text = f"  frame={frame_bytes / 2 ** 20:7.1f} MiB" if frame_bytes else ""
+            print(f"{name:<28}: {seconds:6.2f}s  peak={peak_bytes / 2 ** 20:7.1f} MiB{frame_text}")
@@ -0,0 +1,69 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+import pandas as pd
+
+from csv_stream import iter_dataframe_csv_chunks
+
+header = ["record_date", "security_type_desc", "security_desc", "avg_interest_rate_amt",
+          "src_line_nbr", "record_fiscal_year", "record_fiscal_quarter",
+          "record_calendar_year", "record_calendar_quarter", "record_calendar_month", "record_calendar_day"]
+
+
+# Function to lazily generate synthetic records, some with commas in security_desc
+def generate_records(total_records):
+    for index in range(total_records):
+        yield {
+            "record_date": "2023-09-30",
+            "security_type_desc": "Marketable",
+            "security_desc": "Bills, Notes and Bonds" if index % 10 == 0 else "Treasury Bills",
+            "avg_interest_rate_amt": str(index % 500 / 100),
+            "src_line_nbr": str(index % 20),
+            "record_fiscal_year": "2023",
+            "record_fiscal_quarter": "4",
+            "record_calendar_year": "2023",
+            "record_calendar_quarter": "3",
+            "record_calendar_month": "09",
+            "record_calendar_day": "30",
+        }
+
+
+# Function to run one mode in this process and report peak RSS in MiB
+# Both modes encode the same cleaned frame, as the ingestion holds it before the upload
+def run_mode(mode, total_records, chunk_rows):
+    records_df = pd.DataFrame(list(generate_records(total_records)), columns=header)
+    start = time.perf_counter()
+    total_bytes = 0
+    if mode == "streaming":
+        # The upload's encoding: chunk_rows rows of CSV at a time
+        for chunk in iter_dataframe_csv_chunks(records_df, header, chunk_rows):
+            total_bytes += len(chunk)
+    else:
+        # The whole frame encoded into one CSV string before the upload
+        total_bytes = len(records_df.to_csv(index=False, lineterminator='\n').encode('utf-8'))
+    elapsed = time.perf_counter() - start
+    peak_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:<9} rows={total_records:<9} bytes={total_bytes:<11} time={elapsed:7.2f}s peak_rss={peak_rss_mib:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of streaming vs in-memory CSV encoding")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--mode", choices=["streaming", "in-memory"])
+    parser.add_argument("--chunk-rows", type=int, default=100000, help="rows encoded per uploaded chunk")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.rows[0], args.chunk_rows)
+    else:
+        # Each run gets its own process so peak RSS is not shared between runs
+        for mode in ["streaming", "in-memory"]:
+            for rows in args.rows:
+                subprocess.run([sys.executable, __file__, "--mode", mode, "--rows", str(rows),
+                                "--chunk-rows", str(args.chunk_rows)], check=True)
@@ -0,0 +1,74 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import tracemalloc
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+from json_stream import decode_page_columns, default_read_chunk_size, orjson
+from synthetic_treasury import interest_rate_header, make_interest_rate_records
+
+
+# Function to build the body of one API page of page_size records, gzip compressed when compress is set
+def make_page_body(page_size, compress):
+    records = make_interest_rate_records(scale=max(1, page_size // 4000 + 1))[:page_size]
+    body = json.dumps({"data": records, "meta": {"count": len(records), "total-pages": 1},
+                       "links": {"self": "&page%5Bnumber%5D=1"}}).encode('utf-8')
+    return gzip.compress(body) if compress else body
+
+
+# Function to split a body into the chunks a response is read in, gunzipping them as they arrive when compressed
+def iter_body_chunks(body, compressed):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if compressed else None
+    for offset in range(0, len(body), default_read_chunk_size):
+        chunk = body[offset:offset + default_read_chunk_size]
+        if decompressor is None:
+            yield chunk
+            continue
+        # Like a response read, each decoded chunk holds at most default_read_chunk_size bytes
+        while chunk:
+            yield decompressor.decompress(chunk, default_read_chunk_size)
+            chunk = decompressor.unconsumed_tail
+    if decompressor:
+        yield decompressor.flush()
+
+
+# Function to measure the CPU time of decoding one page, averaged over repeats, and the peak Python allocations
+# of one decode, traced on their own since tracing slows every allocation down
+def measure(decode, body, compressed, repeats):
+    start = time.process_time()
+    for _ in range(repeats):
+        decode(iter_body_chunks(body, compressed))
+    cpu_seconds = (time.process_time() - start) / repeats
+
+    tracemalloc.start()
+    decode(iter_body_chunks(body, compressed))
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu_seconds, peak_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU time and peak memory of decoding one fiscaldata page")
+    parser.add_argument("--page-size", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--gzip", action="store_true", help="decode gzip transfer-encoded bodies")
+    args = parser.parse_args()
+
+    page_body = make_page_body(args.page_size, args.gzip)
+    decoders = {
+        'json.loads (response.json)': lambda chunks: json.loads(b''.join(chunks))['data'],
+        'stream to columns': lambda chunks: decode_page_columns(chunks, interest_rate_header),
+    }
+    if orjson is not None:
+        decoders['orjson.loads'] = lambda chunks: orjson.loads(b''.join(chunks))['data']
+
+    print(f"page of {args.page_size} records, {len(page_body)} bytes{' gzipped' if args.gzip else ''}, "
+          f"orjson {'installed' if orjson is not None else 'not installed'}")
+    for name, decoder in decoders.items():
+        cpu_seconds, peak_bytes = measure(decoder, page_body, args.gzip, args.repeats)
+        print(f"{name:<28}: cpu={cpu_seconds * 1000:8.1f} ms  peak={peak_bytes / 2 ** 20:7.1f} MiB")
@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+from async_fetcher import AsyncFetcher
+from fiscal_api import fetch_all_pages
+from stub_fiscaldata_server import make_fake_records, start_stub_server
+
+
+# Function to time fetching every dataset one after the other, each with its own page thread pool
+def time_sequential_fetch(base_urls, page_size, max_workers):
+    start = time.perf_counter()
+    records = [fetch_all_pages(base_url, {}, page_size=page_size, max_workers=max_workers) for base_url in base_urls]
+    return time.perf_counter() - start, sum(len(dataset_records) for dataset_records in records)
+
+
+# Function to time fetching every dataset at once through one fetcher with shared limits
+def time_async_fetch(base_urls, page_size, max_connections, requests_per_second):
+    fetcher = AsyncFetcher(max_connections, requests_per_second)
+    try:
+        start = time.perf_counter()
+        records = fetcher.fetch_many({base_url: (base_url, {}, page_size) for base_url in base_urls})
+        return time.perf_counter() - start, sum(len(dataset_records) for dataset_records in records.values())
+    finally:
+        fetcher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion wall time as fiscaldata datasets are added, fetched one "
+                                                 "after the other or all at once by the async fetcher")
+    parser.add_argument("--datasets", type=int, nargs="+", default=[1, 2, 4, 8, 14])
+    parser.add_argument("--records", type=int, default=20000, help="records per dataset")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated server latency per page in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of requests answered with 429 or 503")
+    parser.add_argument("--workers", type=int, default=4, help="page threads per dataset of the sequential fetch")
+    parser.add_argument("--connections", type=int, default=16, help="connection limit of the async fetcher")
+    parser.add_argument("--rps", type=float, default=200.0, help="requests per second cap of the async fetcher")
+    args = parser.parse_args()
+
+    records = make_fake_records(args.records)
+    servers = [start_stub_server(records, args.latency, error_rate=args.error_rate)
+               for _ in range(max(args.datasets))]
+    try:
+        for dataset_count in args.datasets:
+            base_urls = [base_url for _, base_url in servers[:dataset_count]]
+            if not args.error_rate:
+                # The thread pool fetch does not retry, so it is only timed when the servers never fail
+                elapsed, count = time_sequential_fetch(base_urls, args.page_size, args.workers)
+                print(f"datasets={dataset_count:<3} sequential: {elapsed:8.3f}s  {count} records")
+            elapsed, count = time_async_fetch(base_urls, args.page_size, args.connections, args.rps)
+            print(f"datasets={dataset_count:<3} async     : {elapsed:8.3f}s  {count} records")
+    finally:
+        for server, _ in servers:
+            server.shutdown()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+benchmarks_directory = os.path.dirname(os.path.abspath(__file__))
+ingestion_directory = os.path.join(benchmarks_directory, "..", "ingestion")
+sys.path.insert(0, ingestion_directory)
+
+from metrics import build_run_report
+from stub_fiscaldata_server import start_stub_server
+from synthetic_treasury import make_debt_records, make_interest_rate_records
+
+# Results of every run are appended here, one JSON line per run, so throughput can be compared across versions
+default_results_path = os.path.join(benchmarks_directory, "results", "pipeline_benchmarks.jsonl")
+
+dataset_endpoints = {
+    'debt': "/services/api/fiscal_service/v1/debt/mspd/mspd_table_1",
+    'interest_rates': "/services/api/fiscal_service/v2/accounting/od/avg_interest_rates",
+}
+
+
+# Function to serve one synthetic dataset from a stub server, run in its own process so it does not share the GIL
+def serve_dataset(dataset, scale, latency_seconds, url_queue):
+    records = make_debt_records(scale) if dataset == 'debt' else make_interest_rate_records(scale)
+    server, base_url = start_stub_server(records, latency_seconds, dataset_endpoints[dataset])
+    url_queue.put((base_url, len(records)))
+    threading.Event().wait()
+
+
+# Function to start the stub server process of a dataset, returns the process, its base url and its record count
+def start_dataset_server(dataset, scale, latency_seconds):
+    url_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_dataset, args=(dataset, scale, latency_seconds, url_queue),
+                                      daemon=True)
+    process.start()
+    base_url, total_records = url_queue.get(timeout=60)
+    return process, base_url, total_records
+
+
+# Function to import the pipeline script, which resolves its relative paths from the ingestion directory
+def load_pipeline_script():
+    os.chdir(ingestion_directory)
+    import DataEngineering_Script
+
+    return DataEngineering_Script
+
+
+# Function to point the pipeline at the stub servers and the local storage and SQLite stand-ins in work_directory
+def configure_pipeline_script(script, base_url_1, base_url_2, work_directory, page_size, storage_format,
+                              merge_mode):
+    script.dataset_registry['debt']['base_url'] = base_url_1
+    script.dataset_registry['interest-rates']['base_url'] = base_url_2
+    script.params = {'filter': 'record_date:gte:2000-01-01', 'page[number]': 1, 'page[size]': page_size}
+    script.ingestion_mode = "full"
+    script.storage_format = storage_format
+    script.storage_backend_name = "local"
+    script.local_storage_root = os.path.join(work_directory, "storage")
+    script.sql_backend_name = "sqlite"
+    script.sqlite_database_path = os.path.join(work_directory, "serving.db")
+    script.serving_load_mode = "full"
+    script.api_cache_directory = None
+    script.blob_cache_directory = None
+    script.publish_manifest_path = None
+    script.analysis_cache_directory = None
+    script.merge_mode = merge_mode
+    script.merge_spool_directory = os.path.join(work_directory, "merge_partitions")
+    script.output_file_path = os.path.join(work_directory, "analysis_answers.txt")
+
+
+# Function to get the version of the code being measured
+def code_version():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=benchmarks_directory, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# Function to run the whole pipeline offline once and return the timings of each part
+def run_pipeline_benchmark(script, scale, latency_seconds, page_size, storage_format, merge_mode="single"):
+    debt_server, debt_url, debt_records = start_dataset_server('debt', scale, latency_seconds)
+    rates_server, rates_url, rate_records = start_dataset_server('interest_rates', scale, latency_seconds)
+    work_directory = tempfile.mkdtemp(prefix="treasury_bench_")
+    try:
+        configure_pipeline_script(script, debt_url, rates_url, work_directory, page_size, storage_format,
+                                  merge_mode)
+        statuses = script.run_pipeline(script.build_pipeline_stages(),
+                                       checkpoint_directory=os.path.join(work_directory, "checkpoints"), force=True)
+        stages = build_run_report()['stages']
+    finally:
+        debt_server.terminate()
+        rates_server.terminate()
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    # Function to get a metric of a stage, 0 when the stage did not record it
+    def stage_metric(stage, name):
+        return stages.get(stage, {}).get(name, 0)
+
+    ingestion_seconds = max(stage_metric('ingest-debt', 'wall_seconds'),
+                            stage_metric('ingest-interest-rates', 'wall_seconds'))
+    return {
+        'version': code_version(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scale': scale,
+        'page_size': page_size,
+        'latency_seconds': latency_seconds,
+        'storage_format': storage_format,
+        'merge_mode': merge_mode,
+        'records': {'debt': debt_records, 'interest_rates': rate_records},
+        'merged_rows': stage_metric('merge', 'rows_out'),
+        'statuses': statuses,
+        'seconds': {
+            'ingestion': ingestion_seconds,
+            'filtering': stage_metric('ingest-debt', 'cleaning_seconds') +
+                         stage_metric('ingest-interest-rates', 'cleaning_seconds'),
+            'merge': stage_metric('merge', 'wall_seconds'),
+            'publish': stage_metric('publish-blob', 'wall_seconds'),
+            'serving_load': stage_metric('load-sql', 'wall_seconds'),
+            'analysis': stage_metric('analyze', 'wall_seconds'),
+        },
+        'rows_per_second': {
+            'ingestion': (debt_records + rate_records) / ingestion_seconds if ingestion_seconds else 0,
+            'serving_load': stage_metric('load-sql', 'sql_rows_per_second'),
+        },
+        'peak_memory_bytes': max(stage.get('peak_memory_bytes') or 0 for stage in stages.values()) if stages else 0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the whole pipeline on synthetic Treasury data, "
+                                                 "served by local stub servers into local storage and SQLite")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="multiples of the current data volume, up to 1000")
+    parser.add_argument("--page-size", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated server latency per page in seconds")
+    parser.add_argument("--storage-format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--merge-mode", choices=["single", "partitioned"], default="single")
+    parser.add_argument("--results", default=default_results_path)
+    args = parser.parse_args()
+
+    results_path = os.path.abspath(args.results)
+    pipeline_script = load_pipeline_script()
+    for scale in args.scales:
+        result = run_pipeline_benchmark(pipeline_script, scale, args.latency, args.page_size, args.storage_format,
+                                        args.merge_mode)
+        seconds = result['seconds']
+        print(f"scale={scale:<5} records={sum(result['records'].values()):<9} merged={result['merged_rows']:<9} "
+              + "  ".join(f"{part}={elapsed:.2f}s" for part, elapsed in seconds.items())
+              + f"  load={result['rows_per_second']['serving_load']:.0f} rows/s")
+
+        os.makedirs(os.path.dirname(results_path), exist_ok=True)
+        with open(results_path, 'a') as results_file:
+            results_file.write(json.dumps(result) + '\n')
+    print("Results appended to:", results_path)
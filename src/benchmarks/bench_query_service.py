@@ -0,0 +1,129 @@
+import argparse
+import concurrent.futures
+import http.client
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+from query_service import QueryService, create_server, serving_blob_name
+from storage_backend import LocalStorageBackend
+from synthetic_treasury import iter_records_csv_chunks, make_interest_rate_records
+
+container_name = "benchmark"
+
+# Columns of the serving data the pipeline publishes
+serving_header = ["record_date", "security_type_desc_df2", "security_desc", "avg_interest_rate_amt",
+                  "record_fiscal_year_df2", "record_fiscal_quarter_df2", "record_calendar_year_df2",
+                  "record_calendar_quarter_df2", "record_calendar_month_df2", "record_calendar_day_df2",
+                  "debt_held_public_mil_amt", "intragov_hold_mil_amt", "total_mil_amt"]
+
+
+# Function to build serving records at scale times the current volume: the interest rate records with holdings
+def make_serving_records(scale, seed):
+    generator = random.Random(seed)
+    for record in make_interest_rate_records(scale):
+        debt_held_public = generator.uniform(1000, 15000000)
+        intragov_holding = generator.uniform(0, 5000000)
+        yield {**{f"{field}_df2": value for field, value in record.items() if field.startswith('record_')
+                  and field != 'record_date'},
+               'record_date': record['record_date'], 'security_type_desc_df2': record['security_type_desc'],
+               'security_desc': record['security_desc'], 'avg_interest_rate_amt': record['avg_interest_rate_amt'],
+               'debt_held_public_mil_amt': f"{debt_held_public:.3f}",
+               'intragov_hold_mil_amt': f"{intragov_holding:.3f}",
+               'total_mil_amt': f"{debt_held_public + intragov_holding:.3f}"}
+
+
+# Function to get the query paths of a benchmark run, distinct_queries of them drawn at random
+def make_queries(distinct_queries, seed):
+    generator = random.Random(seed)
+    security_types = ["Marketable", "Non-marketable"]
+    queries = []
+    for _ in range(distinct_queries):
+        start_year = generator.randint(2001, 2022)
+        date_range = f"start={start_year}-01-01&end={generator.randint(start_year, 2023)}-12-31"
+        queries.append(generator.choice([
+            f"/records?{date_range}&security_type={generator.choice(security_types)}&limit=100",
+            f"/records?{date_range}&security_desc=Treasury%20Bills&limit=100",
+            f"/aggregate?{date_range}&group_by={generator.choice(['security_type_desc', 'year', 'month'])}",
+            f"/top?{date_range}&security_type={generator.choice(security_types)}&n=3",
+        ]))
+    return queries
+
+
+# Function to send every query from client_count threads, each on its own kept-alive connection,
+# returns the latency of each request and the wall time of the run
+def run_queries(port, queries, client_count):
+    local = threading.local()
+
+    def send(path):
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection("127.0.0.1", port)
+        start = time.perf_counter()
+        local.connection.request("GET", path)
+        response = local.connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{path} answered {response.status}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=client_count) as executor:
+        latencies = list(executor.map(send, queries))
+    return sorted(latencies), time.perf_counter() - start
+
+
+# Function to print the latency percentiles and throughput of a run
+def report(label, latencies, wall_seconds):
+    print(f"{label:<22}: p50={latencies[len(latencies) // 2] * 1000:7.2f} ms  "
+          f"p95={latencies[int(len(latencies) * 0.95)] * 1000:7.2f} ms  "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1000:7.2f} ms  "
+          f"throughput={len(latencies) / wall_seconds:8.0f} queries/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and throughput of the serving data query service")
+    parser.add_argument("--scale", type=int, default=100, help="multiple of the current data volume")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--distinct-queries", type=int, default=200,
+                        help="different queries among the requests, the rest repeat them")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client connections")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        storage = LocalStorageBackend(os.path.join(work_directory, "storage"))
+        storage.upload_blocks(container_name, serving_blob_name,
+                              iter_records_csv_chunks(make_serving_records(args.scale, seed=1), serving_header))
+
+        distinct_queries = make_queries(args.distinct_queries, seed=3)
+        generator = random.Random(4)
+        queries = [generator.choice(distinct_queries) for _ in range(args.requests)]
+        for label, result_cache_size in [("no result cache", 0), ("LRU result cache", 4 * args.distinct_queries)]:
+            query_service = QueryService(storage, container_name, serving_blob_name, result_cache_size,
+                                         reload_interval_seconds=3600)
+            load_start = time.perf_counter()
+            server = create_server(query_service, port=0)
+            if label == "no result cache":
+                print(f"loaded {query_service.status()['rows']} serving rows in "
+                      f"{time.perf_counter() - load_start:.2f}s")
+            server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+            server_thread.start()
+            try:
+                report(label, *run_queries(server.server_address[1], queries, args.clients))
+                if result_cache_size:
+                    # A new serving version lands: time the reload the background check would do
+                    storage.upload_blocks(container_name, serving_blob_name,
+                                          iter_records_csv_chunks(make_serving_records(args.scale, seed=2),
+                                                                  serving_header))
+                    reload_start = time.perf_counter()
+                    query_service.reload()
+                    print(f"reloaded the new serving version in {time.perf_counter() - reload_start:.2f}s")
+                    report("after reload", *run_queries(server.server_address[1], queries, args.clients))
+            finally:
+                server.shutdown()
+                server.server_close()
+                query_service.stop()
@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+import pandas as pd
+
+from record_filters import compile_cleaning_rules
+
+header = ["record_date", "security_type_desc", "security_class_desc", "debt_held_public_mil_amt",
+          "intragov_hold_mil_amt", "total_mil_amt", "src_line_nbr", "record_fiscal_year",
+          "record_fiscal_quarter", "record_calendar_year", "record_calendar_quarter", "record_calendar_month",
+          "record_calendar_day"]
+
+mapping_dict = {
+    'Bills': 'Treasury Bills',
+    'Notes': 'Treasury Notes',
+    'Bonds': 'Treasury Bonds',
+    'Treasury Inflation-Protected Securities': 'Treasury Inflation-Protected Securities (TIPS)',
+    'Floating Rate Notes': 'Treasury Floating Rate Notes (FRN)'
+}
+excluded_classes = ['Other', 'Hope Bonds', 'Depositary Compensation Securities', 'R.E.A. Series',
+                    'Inflation-Indexed Bonds', 'Inflation-Indexed Notes']
+debt_rules = {
+    'include': {'security_type_desc': ['Marketable', 'Nonmarketable']},
+    'required': ['record_date'],
+    'exclude': {'security_class_desc': excluded_classes},
+    'mappings': {'security_class_desc': mapping_dict},
+}
+
+security_types = ['Marketable', 'Nonmarketable', 'Total Public Debt Outstanding']
+security_classes = list(mapping_dict) + excluded_classes + ['Domestic Series', 'Foreign Series']
+
+
+# Function to build synthetic MSPD records shaped like the API's
+def make_records(total_records):
+    return [{
+        "record_date": f"20{index % 24:02d}-{index % 12 + 1:02d}-28",
+        "security_type_desc": security_types[index % len(security_types)],
+        "security_class_desc": security_classes[index % len(security_classes)],
+        "debt_held_public_mil_amt": f"{index % 100000}.5",
+        "intragov_hold_mil_amt": "null" if index % 7 == 0 else f"{index % 5000}.25",
+        "total_mil_amt": f"{index % 105000}.75",
+        "src_line_nbr": str(index % 20 + 1),
+        "record_fiscal_year": "2023",
+        "record_fiscal_quarter": "1",
+        "record_calendar_year": "2023",
+        "record_calendar_quarter": "1",
+        "record_calendar_month": "01",
+        "record_calendar_day": "28",
+    } for index in range(total_records)]
+
+
+# Function with the three list comprehension passes the ingestion used before the rules engine
+def clean_with_comprehensions(list_of_records):
+    filtered_records = [
+        record for record in list_of_records
+        if record['security_type_desc'] in ['Marketable', 'Nonmarketable']
+        if record['record_date']
+        if not record['security_class_desc'] in excluded_classes
+    ]
+    filtered_records = [
+        {k: v for k, v in record.items() if v is not None and v != ''}
+        for record in filtered_records
+    ]
+    return [
+        {**record, 'security_class_desc': mapping_dict.get(record['security_class_desc'],
+                                                           record['security_class_desc'])}
+        for record in filtered_records
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized cleaning rules vs list comprehensions")
+    parser.add_argument("--records", type=int, nargs="+", default=[10 ** 5, 10 ** 6, 10 ** 7])
+    args = parser.parse_args()
+
+    clean = compile_cleaning_rules(debt_rules)
+    for total_records in args.records:
+        records = make_records(total_records)
+
+        start = time.perf_counter()
+        comprehension_rows = len(clean_with_comprehensions(records))
+        comprehension_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        records_df = pd.DataFrame.from_records(records, columns=header)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        vectorized_rows = len(clean(records_df))
+        vectorized_time = time.perf_counter() - start
+
+        assert comprehension_rows == vectorized_rows
+        print(f"records={total_records:<9} comprehensions={comprehension_time:7.2f}s  "
+              f"vectorized={vectorized_time:7.2f}s (+{load_time:.2f}s to build the batch)  rows={vectorized_rows}")
+        del records, records_df
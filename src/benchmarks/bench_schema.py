@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+import pandas as pd
+
+from schema import align_categories, apply_schema, read_csv_options
+from synthetic_treasury import (debt_header, interest_rate_header, iter_records_csv_chunks, make_debt_records,
+                               make_interest_rate_records)
+
+# Class names the ingestion maps to the interest rate dataset's security names before the merge
+class_mapping = {
+    'Bills': 'Treasury Bills',
+    'Notes': 'Treasury Notes',
+    'Bonds': 'Treasury Bonds',
+    'Treasury Inflation-Protected Securities': 'Treasury Inflation-Protected Securities (TIPS)',
+    'Floating Rate Notes': 'Treasury Floating Rate Notes (FRN)'
+}
+
+
+# Function to write records to a CSV file the way the ingestion stores them
+def write_dataset_csv(records, header, path):
+    with open(path, 'wb') as csv_file:
+        for chunk in iter_records_csv_chunks(records, header):
+            csv_file.write(chunk)
+
+
+# Function to time the transformation's merge and the analysis-style groupbys on one pair of frames
+def time_transformation(df_rates, df_debt):
+    start = time.perf_counter()
+    df_rates, df_debt = align_categories(df_rates, 'security_desc', df_debt, 'security_class_desc')
+    df_merged = pd.merge(df_rates, df_debt, how='inner', left_on=['record_date', 'security_desc'],
+                         right_on=['record_date', 'security_class_desc'], suffixes=('_df2', '_df1'))
+    merge_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df_merged.groupby(['security_type_desc_df2', 'record_calendar_year_df2'], observed=True)[
+        ['avg_interest_rate_amt', 'debt_held_public_mil_amt']].mean()
+    df_merged.groupby('security_desc', observed=True)['avg_interest_rate_amt'].mean().nlargest(3)
+    groupby_seconds = time.perf_counter() - start
+    return len(df_merged), df_merged.memory_usage(deep=True).sum(), merge_seconds, groupby_seconds
+
+
+# Function to read both datasets and report their memory and transformation times
+def measure(rates_path, debt_path, typed):
+    start = time.perf_counter()
+    if typed:
+        df_rates = apply_schema(pd.read_csv(rates_path, **read_csv_options(interest_rate_header)))
+        df_debt = apply_schema(pd.read_csv(debt_path, **read_csv_options(debt_header)))
+    else:
+        df_rates = pd.read_csv(rates_path)
+        df_debt = pd.read_csv(debt_path)
+    read_seconds = time.perf_counter() - start
+    input_bytes = df_rates.memory_usage(deep=True).sum() + df_debt.memory_usage(deep=True).sum()
+    merged_rows, merged_bytes, merge_seconds, groupby_seconds = time_transformation(df_rates, df_debt)
+    return input_bytes, merged_rows, merged_bytes, read_seconds, merge_seconds, groupby_seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and speed of the compact schema against pd.read_csv defaults")
+    parser.add_argument("--scale", type=int, default=1000, help="multiple of the current data volume")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        rates_path = os.path.join(work_directory, "interest_rates.csv")
+        debt_path = os.path.join(work_directory, "debt_statement.csv")
+        write_dataset_csv(make_interest_rate_records(args.scale), interest_rate_header, rates_path)
+        write_dataset_csv(({**record, 'security_class_desc': class_mapping.get(record['security_class_desc'],
+                                                                               record['security_class_desc'])}
+                           for record in make_debt_records(args.scale)), debt_header, debt_path)
+
+        results = {}
+        for label, typed in [("read_csv defaults", False), ("compact schema", True)]:
+            results[label] = measure(rates_path, debt_path, typed)
+            input_bytes, merged_rows, merged_bytes, read_seconds, merge_seconds, groupby_seconds = results[label]
+            print(f"{label:<18}: inputs={input_bytes / 2 ** 20:8.1f} MiB  merged={merged_bytes / 2 ** 20:8.1f} MiB "
+                  f"({merged_rows} rows)  read={read_seconds:6.2f}s  merge={merge_seconds:6.2f}s  "
+                  f"groupby={groupby_seconds:6.2f}s")
+
+        baseline, compact = results["read_csv defaults"], results["compact schema"]
+        print(f"memory ratio: inputs {compact[0] / baseline[0]:.2f}x, merged {compact[2] / baseline[2]:.2f}x")
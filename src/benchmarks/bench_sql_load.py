@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+import numpy as np
+import pandas as pd
+
+from sql_loader import SqliteConnector, bulk_load, serving_table_columns, serving_table_name
+
+
+# Function to build a synthetic merged serving frame in the serving table's column order
+def make_serving_frame(total_rows):
+    index = np.arange(total_rows)
+    return pd.DataFrame({
+        "record_date": pd.to_datetime("2001-01-31") + pd.to_timedelta(index % 8000, unit="D"),
+        "security_type_desc_df2": np.where(index % 2 == 0, "Marketable", "Non-marketable"),
+        "security_desc": np.where(index % 3 == 0, "Treasury Bills", "Treasury Notes"),
+        "avg_interest_rate_amt": (index % 500) / 100,
+        "record_fiscal_year_df2": 2001 + index % 23,
+        "record_fiscal_quarter_df2": 1 + index % 4,
+        "record_calendar_year_df2": 2001 + index % 23,
+        "record_calendar_quarter_df2": 1 + index % 4,
+        "record_calendar_month_df2": 1 + index % 12,
+        "record_calendar_day_df2": 28,
+        "debt_held_public_mil_amt": (index % 100000) * 1.5,
+        "intragov_hold_mil_amt": np.where(index % 7 == 0, np.nan, (index % 5000) * 1.25),
+        "total_mil_amt": (index % 105000) * 1.75,
+    })
+
+
+# Function to load the frame the way connect_to_azure_sql used to: one list of tuples, one executemany, one commit
+def load_all_at_once(connection, df):
+    query = (f"INSERT INTO {serving_table_name} ({', '.join(serving_table_columns)}) "
+             f"VALUES ({', '.join('?' for _ in serving_table_columns)})")
+    batch_df = df.assign(record_date=df['record_date'].dt.strftime('%Y-%m-%d')).astype(object)
+    rows_to_insert = [tuple(row) for row in batch_df.where(batch_df.notna(), None).itertuples(index=False, name=None)]
+    connection.cursor().executemany(query, rows_to_insert)
+    connection.commit()
+
+
+# Function to time one load into a fresh in-memory SQLite stand-in
+def time_load(df, load):
+    connector = SqliteConnector()
+    connection = connector.connect()
+    connector.run_ddl(connection, "")
+    start = time.perf_counter()
+    load(connector, connection)
+    elapsed = time.perf_counter() - start
+    loaded_rows = connection.execute(f"SELECT COUNT(*) FROM {serving_table_name}").fetchone()[0]
+    connection.close()
+    return elapsed, loaded_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serving table load throughput against the SQLite stand-in")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    df = make_serving_frame(args.rows)
+    elapsed, loaded_rows = time_load(df, lambda connector, connection: load_all_at_once(connection, df))
+    print(f"all at once            : {elapsed:7.2f}s  {loaded_rows / elapsed:10.0f} rows/s")
+
+    for batch_size in args.batch_sizes:
+        for use_staging in [False, True]:
+            elapsed, loaded_rows = time_load(df, lambda connector, connection: bulk_load(
+                connector, connection, df, batch_size=batch_size, use_staging=use_staging))
+            label = f"batch={batch_size}{' staged' if use_staging else ''}"
+            print(f"{label:<23}: {elapsed:7.2f}s  {loaded_rows / elapsed:10.0f} rows/s")
@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# Function to build fake interest rate records for the stub server
+def make_fake_records(total_records):
+    records = []
+    for index in range(total_records):
+        records.append({
+            "record_date": f"20{index % 24:02d}-{index % 12 + 1:02d}-{index % 28 + 1:02d}",
+            "security_type_desc": "Marketable" if index % 2 == 0 else "Non-marketable",
+            "security_desc": "Treasury Bills" if index % 3 == 0 else "Treasury Notes",
+            "avg_interest_rate_amt": f"{(index % 500) / 100:.3f}",
+            "src_line_nbr": str(index % 20 + 1),
+            "record_fiscal_year": "2023",
+            "record_fiscal_quarter": "1",
+            "record_calendar_year": "2023",
+            "record_calendar_quarter": "1",
+            "record_calendar_month": "01",
+            "record_calendar_day": "31",
+        })
+    return records
+
+
+# Comparisons of the fiscaldata filter syntax, e.g. record_date:gte:2000-01-01
+filter_operators = {
+    'gte': lambda value, bound: value >= bound,
+    'gt': lambda value, bound: value > bound,
+    'lte': lambda value, bound: value <= bound,
+    'lt': lambda value, bound: value < bound,
+    'eq': lambda value, bound: value == bound,
+}
+
+
+# Function to build the record_date predicate of a filter, e.g. "record_date:gte:2000-01-01,record_date:lte:2000-12-31"
+def record_date_predicate(filter_value):
+    conditions = [condition.split(':', 2) for condition in filter_value.split(',') if condition]
+    conditions = [(filter_operators[operator], bound) for field, operator, bound in conditions
+                  if field == 'record_date']
+    return lambda record_date: all(compare(record_date, bound) for compare, bound in conditions)
+
+
+# Function to select the records matching a filter in the order of sort: record_date ascending by default, like the
+# API, or descending for sort=-record_date; generated datasets select whole months without generating rows
+def select_records(records, filter_value, sort=''):
+    predicate = record_date_predicate(filter_value)
+    descending = sort == '-record_date'
+    if hasattr(records, 'between'):
+        return records.between(predicate, oldest_first=not descending)
+    return sorted((record for record in records if predicate(record['record_date'])),
+                  key=lambda record: record['record_date'], reverse=descending)
+
+
+# Function to create a request handler that serves records with fiscaldata style pagination and filters
+# Responses carry an ETag and a Last-Modified date, a request whose If-None-Match matches is answered 304 without a body
+# error_rate is the share of requests answered with a rate limit (429) or a transient server error (503)
+def make_handler(records, latency_seconds, error_rate=0.0):
+    last_modified = formatdate(time.time(), usegmt=True)
+    selections = {}
+    selections_lock = threading.Lock()
+
+    # Function to get the records of a filter in the order of sort, selected once per filter and sort
+    def filtered_records(filter_value, sort):
+        with selections_lock:
+            if (filter_value, sort) not in selections:
+                selections[(filter_value, sort)] = select_records(records, filter_value, sort)
+            return selections[(filter_value, sort)]
+
+    class StubFiscalDataHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if error_rate and random.random() < error_rate:
+                self.send_response(random.choice([429, 503]))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            query = parse_qs(urlparse(self.path).query)
+            page_number = int(query.get('page[number]', ['1'])[0])
+            page_size = int(query.get('page[size]', ['100'])[0])
+            selected_records = filtered_records(query.get('filter', [''])[0], query.get('sort', [''])[0])
+            start = (page_number - 1) * page_size
+            page_records = selected_records[start:start + page_size]
+            body = json.dumps({
+                "data": page_records,
+                "meta": {
+                    "count": len(page_records),
+                    "total-count": len(selected_records),
+                    "total-pages": max(1, math.ceil(len(selected_records) / page_size)),
+                },
+            }).encode('utf-8')
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+            if latency_seconds:
+                time.sleep(latency_seconds)
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body, compresslevel=1)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubFiscalDataHandler
+
+
+# Function to start the stub server on a free local port, returns the server and its base url
+# records can be any sequence supporting len() and slicing, e.g. the generated datasets of synthetic_treasury.py
+def start_stub_server(records, latency_seconds=0.0,
+                      endpoint="/services/api/fiscal_service/v2/accounting/od/avg_interest_rates", error_rate=0.0):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(records, latency_seconds, error_rate))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}{endpoint}"
+    return server, base_url
@@ -0,0 +1,242 @@
+import csv
+import io
+import random
+from datetime import date, timedelta
+
+# Fields of the two fiscaldata datasets, as in header_1 and header_2 of DataEngineering_Script.py
+debt_header = ["record_date", "security_type_desc", "security_class_desc", "debt_held_public_mil_amt",
+               "intragov_hold_mil_amt", "total_mil_amt", "src_line_nbr", "record_fiscal_year",
+               "record_fiscal_quarter", "record_calendar_year", "record_calendar_quarter", "record_calendar_month",
+               "record_calendar_day"]
+interest_rate_header = ["record_date", "security_type_desc", "security_desc", "avg_interest_rate_amt",
+                        "src_line_nbr", "record_fiscal_year", "record_fiscal_quarter",
+                        "record_calendar_year", "record_calendar_quarter", "record_calendar_month",
+                        "record_calendar_day"]
+
+# Rows the real MSPD table 1 publishes each month: (security_type_desc, security_class_desc, joinable security_desc)
+debt_securities = [
+    ("Marketable", "Bills", "Treasury Bills"),
+    ("Marketable", "Notes", "Treasury Notes"),
+    ("Marketable", "Bonds", "Treasury Bonds"),
+    ("Marketable", "Treasury Inflation-Protected Securities", "Treasury Inflation-Protected Securities (TIPS)"),
+    ("Marketable", "Floating Rate Notes", "Treasury Floating Rate Notes (FRN)"),
+    ("Marketable", "Federal Financing Bank", "Federal Financing Bank"),
+    ("Marketable", "Total Marketable", None),
+    ("Nonmarketable", "Domestic Series", "Domestic Series"),
+    ("Nonmarketable", "Foreign Series", "Foreign Series"),
+    ("Nonmarketable", "State and Local Government Series", "State and Local Government Series"),
+    ("Nonmarketable", "United States Savings Securities", "United States Savings Securities"),
+    ("Nonmarketable", "Government Account Series", "Government Account Series"),
+    ("Nonmarketable", "Other", None),
+    ("Nonmarketable", "Total Nonmarketable", None),
+    ("Total Public Debt Outstanding", "Total Public Debt Outstanding", None),
+]
+
+# Rows the real average interest rates dataset publishes each month: (security_type_desc, security_desc, base rate)
+interest_rate_securities = [
+    ("Marketable", "Treasury Bills", 1.5),
+    ("Marketable", "Treasury Notes", 2.2),
+    ("Marketable", "Treasury Bonds", 4.1),
+    ("Marketable", "Treasury Inflation-Protected Securities (TIPS)", 0.9),
+    ("Marketable", "Treasury Floating Rate Notes (FRN)", 1.4),
+    ("Marketable", "Federal Financing Bank", 2.6),
+    ("Marketable", "Total Marketable", 2.3),
+    ("Non-marketable", "Domestic Series", 7.9),
+    ("Non-marketable", "Foreign Series", 3.4),
+    ("Non-marketable", "State and Local Government Series", 2.8),
+    ("Non-marketable", "United States Savings Securities", 3.1),
+    ("Non-marketable", "United States Savings Inflation Securities", 2.9),
+    ("Non-marketable", "Government Account Series", 2.7),
+    ("Non-marketable", "Hope Bonds", 0.0),
+    ("Non-marketable", "Total Non-marketable", 2.8),
+    ("Interest-bearing Debt", "Total Interest-bearing Debt", 2.5),
+]
+
+# Securities present in both datasets, the ones scaled up by synthetic copies so the merge output scales too
+joinable_security_names = {security_desc for _, _, security_desc in debt_securities if security_desc is not None}
+
+# The datasets start in January 2001 and hold one month-end row per security
+first_month = date(2001, 1, 1)
+
+
+# Function to get the number of months from the first month up to the last complete month
+def default_month_count(today=None):
+    today = today or date.today()
+    return (today.year - first_month.year) * 12 + today.month - first_month.month
+
+
+# Function to get the last day of the month a number of months after the first month
+def month_end(month_index):
+    year, month = divmod(first_month.month - 1 + month_index, 12)
+    next_month = date(first_month.year + year + (month + 1) // 12, (month + 1) % 12 + 1, 1)
+    return next_month - timedelta(days=1)
+
+
+# Function to get the calendar and fiscal date fields of a record date, fiscal years start in October
+def date_fields(record_date):
+    fiscal_year = record_date.year + 1 if record_date.month >= 10 else record_date.year
+    return {
+        "record_date": record_date.isoformat(),
+        "record_fiscal_year": str(fiscal_year),
+        "record_fiscal_quarter": str((record_date.month + 2) % 12 // 3 + 1),
+        "record_calendar_year": str(record_date.year),
+        "record_calendar_quarter": str((record_date.month - 1) // 3 + 1),
+        "record_calendar_month": f"{record_date.month:02d}",
+        "record_calendar_day": f"{record_date.day:02d}",
+    }
+
+
+# Function to get the name of a security's synthetic copy, copy 0 is the real security
+def copy_name(name, copy):
+    return name if copy == 0 else f"{name} (synthetic {copy})"
+
+
+# Read-only view of the records from start to stop of a sequence
+class SequenceView:
+    def __init__(self, sequence, start, stop):
+        self.sequence = sequence
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.sequence[self.start + index]
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+# Read-only view of whole months of a view holding them newest first, listing the months oldest first with the rows of
+# each month in their order
+class OldestMonthFirstView:
+    def __init__(self, view, rows_per_month):
+        self.view = view
+        self.rows_per_month = rows_per_month
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        month, row_number = divmod(index, self.rows_per_month)
+        return self.view[len(self) - (month + 1) * self.rows_per_month + row_number]
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+# Read-only sequence of generated records, built on demand so 1000x volumes never sit in memory as dicts
+# scale adds scale - 1 copies of every security in copyable_securities
+class SyntheticRecords:
+    def __init__(self, securities, copyable_securities, make_record, scale=1, month_count=None, seed=0):
+        self.month_count = month_count or default_month_count()
+        self.rows = [(security, 0) for security in securities]
+        self.rows += [(security, copy) for copy in range(1, scale) for security in copyable_securities]
+        self.make_record = make_record
+        self.seed = seed
+
+    def __len__(self):
+        return self.month_count * len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        # Newest month first, as the API answers sort=-record_date
+        month_index = self.month_count - 1 - index // len(self.rows)
+        row_number = index % len(self.rows)
+        security, copy = self.rows[row_number]
+        generator = random.Random(self.seed * 1000003 + index)
+        return self.make_record(security, copy, month_index, row_number, generator)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    # Function to get the records of the months whose record_date matches predicate, the months must be consecutive
+    # oldest_first lists them in the API's default record_date order instead of newest first
+    def between(self, predicate, oldest_first=False):
+        month_indexes = [month_index for month_index in range(self.month_count)
+                         if predicate(month_end(month_index).isoformat())]
+        if not month_indexes:
+            return SequenceView(self, 0, 0)
+        # Months are stored newest first
+        view = SequenceView(self, (self.month_count - 1 - max(month_indexes)) * len(self.rows),
+                            (self.month_count - min(month_indexes)) * len(self.rows))
+        return OldestMonthFirstView(view, len(self.rows)) if oldest_first else view
+
+
+# Function to build one MSPD table 1 record as the API returns it, every value a string
+def make_debt_record(security, copy, month_index, row_number, generator):
+    security_type_desc, security_class_desc, security_desc = security
+    if copy:
+        security_class_desc = copy_name(security_desc, copy)
+    debt_held_public = generator.uniform(1000, 15000000)
+    intragov_holding = generator.uniform(0, 5000000) if security_type_desc != "Marketable" else \
+        generator.uniform(0, 50000)
+    return {
+        **date_fields(month_end(month_index)),
+        "security_type_desc": security_type_desc,
+        "security_class_desc": security_class_desc,
+        "debt_held_public_mil_amt": f"{debt_held_public:.3f}",
+        "intragov_hold_mil_amt": "null" if generator.random() < 0.02 else f"{intragov_holding:.3f}",
+        "total_mil_amt": f"{debt_held_public + intragov_holding:.3f}",
+        "src_line_nbr": str(row_number + 1),
+    }
+
+
+# Function to build one average interest rate record as the API returns it, every value a string
+def make_interest_rate_record(security, copy, month_index, row_number, generator):
+    security_type_desc, security_desc, base_rate = security
+    rate = max(0.0, base_rate + 1.5 * ((month_index % 120) / 60 - 1) + generator.gauss(0, 0.2))
+    return {
+        **date_fields(month_end(month_index)),
+        "security_type_desc": security_type_desc,
+        "security_desc": copy_name(security_desc, copy),
+        "avg_interest_rate_amt": "null" if generator.random() < 0.01 else f"{rate:.3f}",
+        "src_line_nbr": str(row_number + 1),
+    }
+
+
+# Function to get MSPD table 1 records at scale times the current volume
+def make_debt_records(scale=1, month_count=None, seed=1):
+    copyable_securities = [security for security in debt_securities if security[2] in joinable_security_names]
+    return SyntheticRecords(debt_securities, copyable_securities, make_debt_record, scale, month_count, seed)
+
+
+# Function to get average interest rate records at scale times the current volume
+def make_interest_rate_records(scale=1, month_count=None, seed=2):
+    copyable_securities = [security for security in interest_rate_securities
+                           if security[1] in joinable_security_names]
+    return SyntheticRecords(interest_rate_securities, copyable_securities, make_interest_rate_record, scale,
+                            month_count, seed)
+
+
+# Function to encode generated records as CSV byte chunks of about chunk_size, without holding all of them at once
+def iter_records_csv_chunks(records, header, chunk_size=4 * 1024 * 1024):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(header)
+    for record in records:
+        writer.writerow([record.get(field, '') for field in header])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
@@ -1,21 +1,51 @@
-import concurrent
-import configparser
+import argparse
+import hashlib
+import io
+import sys
+import time
 import pandas as pd
-import requests
-from azure.storage.blob import BlobServiceClient
 import logging
-import logging as error_log
-import pyodbc
-from io import StringIO
+from functools import partial
+from aggregate_cube import refresh_monthly_cube
+from analysis_cache import default_cache_directory, default_cache_max_bytes
+from analysis_queries import answer_business_questions
+from async_fetcher import get_async_fetcher
+from blob_cache import default_blob_cache_directory, default_blob_cache_max_bytes, get_blob_cache, mapped_reader
+from csv_stream import default_chunk_size, iter_dataframe_csv_chunks, iter_frames_csv_chunks
+from handoff import typed_dataframe, verify_stored_copy
+from http_cache import (default_closed_after_days, default_closed_max_age_seconds, default_ttl_seconds,
+                        default_window_years)
+from incremental import (build_watermark, group_frame_by_partition, incremental_params, parse_watermark,
+                         partition_in_range, rows_at_or_before_watermark, watermark_path)
+from metrics import add_to_counter, write_run_report
+from parquet_storage import (RangedReader, append_string_frame_to_parquet_bytes, dataframe_to_parquet_bytes,
+                             default_row_group_size, iter_frames_parquet_chunks, read_parquet, storage_file_name,
+                             string_frame_to_parquet_bytes)
+from partitioned_join import default_spool_directory, partitioned_merge
+from pipeline import Stage, default_checkpoint_directory, load_pipeline_state, run_pipeline
+from publish_manifest import (bytes_content_hash, default_manifest_path, frames_content_hash, get_publish_manifest,
+                              iter_hashed_chunks, publish_bytes, publish_chunks)
+from profiling import default_max_workers as default_profile_max_workers, write_profile_report
+from record_filters import compile_cleaning_rules
+from schema import align_categories, apply_schema, read_csv_options
+from sql_loader import (AzureSqlConnector, SqliteConnector, bulk_load, lookback_cutoff, serving_table_name,
+                        table_row_count, upsert_load)
+from storage_backend import (ChunkReader, default_download_chunk_size, default_max_concurrency, get_storage_backend,
+                             read_config_property)
 
 # Configure the logging for INFO and ERROR Mode
+# basicConfig only configures the root logger once, so error.log is a second handler that keeps only the errors
 logging.basicConfig(filename='../project_logs/scripts.log', level=logging.INFO, format ='%(asctime)s - %(levelname)s - %(message)s')
-error_log.basicConfig(filename='../project_logs/error.log', level=logging.ERROR, format ='%(asctime)s - %(levelname)s - %(message)s')
+error_log_handler = logging.FileHandler('../project_logs/error.log')
+error_log_handler.setLevel(logging.ERROR)
+error_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+logging.getLogger().addHandler(error_log_handler)
 
 # Common Configuration
 container_name_base = "f23projectcontainer"
 file_path = "../../Account_Key.config"
 ddl_script_file_path = "../SQL_Transformation/DDL_scripts.sql"
+ddl_incremental_script_file_path = "../SQL_Transformation/DDL_incremental_scripts.sql"
 
 # Configuration for U.S. Treasury Data holdings
 directory_name_1 = "processed_data/U.S.Treasury-Monthly-Statement-of-the-Public-Debt-(MSPD)"
@@ -37,12 +67,74 @@ header_2 = ["record_date", "security_type_desc", "security_desc", "avg_interest_
 base_url_1 = "https://api.fiscaldata.treasury.gov/services/api/fiscal_service/v1/debt/mspd/mspd_table_1"
 params = {'filter': 'record_date:gte:2000-01-01', 'page[number]': 1, 'page[size]': 10000}
 
+# Limits shared by the requests of every dataset: open connections, requests started per second, and retries of a
+# page on rate limits (429), server errors (5xx) and connection failures, with jittered exponential backoff
+api_max_connections = 8
+api_requests_per_second = 10
+api_max_retries = 5
+
+# Local directory of the API response cache, e.g. "../http_cache" (None, the default, fetches every page), the lifetime
+# of responses without an ETag or Last-Modified, the age after which a month is closed, how long the responses of
+# closed months are served before they are revalidated, and the record_date windows each request is split into when
+# cached; past windows of closed months are served from the cache without a request
+api_cache_directory = None
+api_cache_ttl_seconds = default_ttl_seconds
+api_cache_closed_after_days = default_closed_after_days
+api_cache_closed_max_age_seconds = default_closed_max_age_seconds
+api_window_years = default_window_years
+
+# Number of stages run at the same time, enough for every dataset of the registry to be ingested at once
+pipeline_max_workers = 16
+
+# "full" re-downloads the whole history into one blob per dataset,
+# "incremental" only asks for rows newer than the stored watermark and writes year=/month= partitions
+ingestion_mode = "full"
+
+# Size of each staged block when uploading data to Azure Blob Storage, and rows per staged block for CSV data
+upload_chunk_size = default_chunk_size
+upload_chunk_rows = 100000
+
+# "csv" or "parquet" for the processed_data and serving_data outputs, parquet needs pyarrow installed
+storage_format = "csv"
+parquet_row_group_size = default_row_group_size
+
 # API Request Configuration for Average Interest Rates Data
 base_url_2 = "https://api.fiscaldata.treasury.gov/services/api/fiscal_service/v2/accounting/od/avg_interest_rates"
 
 connection_string = "CONNECTION-STRING"
 DB_PASSWORD_CONNECTION_STRING = "DB-PASSWORD-CONNECTION-STRING"
 
+# "azure" for Azure Blob Storage, "local" keeps the containers as folders under local_storage_root for offline runs
+storage_backend_name = "azure"
+local_storage_root = "../../local_storage"
+storage_max_concurrency = default_max_concurrency
+
+# Local read-through copy of the blobs read back from storage (src/blob_cache), revalidated with each blob's ETag and
+# least recently read copies evicted beyond blob_cache_max_bytes; None downloads every read
+blob_cache_directory = default_blob_cache_directory
+blob_cache_max_bytes = default_blob_cache_max_bytes
+
+# Size of the ranges uncached CSV blobs are downloaded in, storage_max_concurrency ranges at a time, and parsed as
+# they arrive
+blob_download_chunk_size = default_download_chunk_size
+
+# Manifest of the content hash of every published blob and of the serving table load, an output whose content and
+# stored copy are unchanged since the last publish is not written again; None always writes every output
+publish_manifest_path = default_manifest_path
+
+# "azure" loads the serving table into Azure SQL, "sqlite" into an embedded database at sqlite_database_path
+sql_backend_name = "azure"
+sqlite_database_path = "../../local_storage/serving.db"
+
+# Rows bound and committed per batch when loading the serving table, and whether to load through a staging table
+sql_batch_size = 10000
+sql_use_staging_table = False
+
+# "full" drops and reloads the serving table, "incremental" upserts new or changed rows on (record_date, security_desc)
+# and only sends rows dated within serving_upsert_lookback_days of the newest row already in the table (None for all)
+serving_load_mode = "full"
+serving_upsert_lookback_days = 366
+
 # serving_data directory and file name
 serving_directory_name = "serving_data"
 serving_data = "serving_data.csv"
@@ -56,52 +148,226 @@ mapping_dict = {
     'Floating Rate Notes': 'Treasury Floating Rate Notes (FRN)'
 }
 
+# Cleaning rules for each dataset, applied to all of its records in one vectorized pass
+cleaning_rules = {
+    upload_file_2: {
+        'include': {'security_type_desc': ['Marketable', 'Non-marketable']},
+        'exclude': {'security_desc': ['Total Marketable',
+                                      'TotalMarketable',
+                                      'Total Non-marketable',
+                                      'Hope Bonds',
+                                      'R.E.A. Series',
+                                      'Treasury Inflation-Indexed Bonds',
+                                      'Treasury Inflation-Indexed Notes']},
+    },
+    upload_file_1: {
+        'include': {'security_type_desc': ['Marketable', 'Nonmarketable']},
+        'required': ['record_date'],
+        'exclude': {'security_class_desc': ['Other',
+                                            'Hope Bonds',
+                                            'Depositary Compensation Securities',
+                                            'R.E.A. Series',
+                                            'Inflation-Indexed Bonds',
+                                            'Inflation-Indexed Notes']},
+        # Update 'security_class_desc' values based on the mapping dictionary
+        'mappings': {'security_class_desc': mapping_dict},
+    },
+}
+
+# Registry of the fiscaldata datasets to ingest, each one is fetched, cleaned and stored by its own ingest-<name> stage
+# base_url: the endpoint, fields: the fields requested and stored, filter: the API filter,
+# cleaning_rules: the record_filters rules, directory_name and upload_file: where the processed data is stored
+dataset_registry = {
+    'debt': {
+        'base_url': base_url_1,
+        'fields': header_1,
+        'filter': params['filter'],
+        'cleaning_rules': cleaning_rules[upload_file_1],
+        'directory_name': directory_name_1,
+        'upload_file': upload_file_1,
+    },
+    'interest-rates': {
+        'base_url': base_url_2,
+        'fields': header_2,
+        'filter': params['filter'],
+        'cleaning_rules': cleaning_rules[upload_file_2],
+        'directory_name': directory_name_2,
+        'upload_file': upload_file_2,
+    },
+}
+cleaning_functions = {dataset['upload_file']: compile_cleaning_rules(dataset['cleaning_rules'])
+                      for dataset in dataset_registry.values()}
+
 # text file for with analysis answers
 output_file_path = "../project_logs/analysis_answers.txt"
 
+# Local directory and size bound of the analysis result cache, None recomputes the answers on every run
+analysis_cache_directory = default_cache_directory
+analysis_cache_max_bytes = default_cache_max_bytes
+
+# columns the transformation reads from each dataset, only these are parsed or downloaded
+transformation_columns_1 = ['record_date', 'security_class_desc', 'debt_held_public_mil_amt',
+                            'intragov_hold_mil_amt', 'total_mil_amt']
+transformation_columns_2 = ['record_date', 'security_type_desc', 'security_desc', 'avg_interest_rate_amt',
+                            'record_fiscal_year', 'record_fiscal_quarter', 'record_calendar_year',
+                            'record_calendar_quarter', 'record_calendar_month', 'record_calendar_day']
+
+# "single" joins the two datasets in one pd.merge, "partitioned" splits both by merge_partition_by ("month" or
+# "fiscal_year"), joins the partitions in merge_max_workers processes and writes each joined partition to
+# merge_spool_directory, from where the blob publish and the SQL load stream them one partition at a time
+merge_mode = "single"
+merge_partition_by = "month"
+merge_max_workers = 4
+merge_spool_directory = default_spool_directory
+
+# Directory of the nightly dataset profile (profile.json, profile.html and the figures) written by the profile
+# stage after the ingestion, rendered in profile_max_workers processes; None leaves the profile stage out
+profile_output_directory = None
+profile_max_workers = default_profile_max_workers
+
 # columns to drop
-unwanted_columns = ['src_line_nbr_df1',
-                    'src_line_nbr_df2',
-                    'record_fiscal_year_df1',
-                    'record_fiscal_quarter_df1',
-                    'record_calendar_year_df1',
-                    'record_calendar_quarter_df1',
-                    'record_calendar_month_df1',
-                    'record_calendar_day_df1',
-                    'security_type_desc_df1',
-                    'security_class_desc']
+unwanted_columns = ['security_class_desc']
+
+# serving_data column names for the interest rate columns
+serving_column_renames = {column: f"{column}_df2" for column in ['security_type_desc',
+                                                                  'record_fiscal_year',
+                                                                  'record_fiscal_quarter',
+                                                                  'record_calendar_year',
+                                                                  'record_calendar_quarter',
+                                                                  'record_calendar_month',
+                                                                  'record_calendar_day']}
+
+
+# Function to get the storage backend shared by every upload and read of this process
+def get_storage():
+    return get_storage_backend(storage_backend_name, file_path, connection_string, local_storage_root,
+                               storage_max_concurrency)
+
+
+# Function to get the manifest of published outputs, None when every output is always written
+def get_manifest():
+    return None if publish_manifest_path is None else get_publish_manifest(publish_manifest_path)
+
+
+# Function to get the blob cache in front of the storage backend, None when blob reads are not cached
+def get_storage_cache():
+    if blob_cache_directory is None:
+        return None
+    return get_blob_cache(get_storage(), blob_cache_directory, blob_cache_max_bytes)
 
 
 # Function to upload data to Azure Blob Storage
 def upload_to_azure_blob_storage(container_name, blob_data, upload_file, directory_name):
     try:
         logging.info("uploading the data to the Azure Blob Storage")
-        blob_service_client = BlobServiceClient.from_connection_string(read_property_from_file(file_path, connection_string))
-        container_client = blob_service_client.get_container_client(container_name)
+        manifest = get_manifest()
+        if manifest is None:
+            get_storage().upload_bytes(container_name, f"{directory_name}/{upload_file}", blob_data)
+        elif not publish_bytes(manifest, get_storage(), container_name, f"{directory_name}/{upload_file}", blob_data):
+            logging.info(f"{upload_file} is unchanged in Azure Blob Storage, skipped the upload.")
+            return
+        logging.info(f"Uploaded {upload_file} to Azure Blob Storage successfully.")
+
+    except Exception as excep:
+        logging.exception(f"Error uploading {upload_file} to Azure Blob Storage: {excep}")
+        raise
 
-        if not container_client.exists():
-            container_client.create_container()
 
-        blob_client = container_client.get_blob_client(f"{directory_name}/{upload_file}")
-        blob_client.upload_blob(blob_data, overwrite=True)
-        logging.info(f"Uploaded {upload_file} to Azure Blob Storage successfully.")
+# Function to upload a stream of byte chunks to Azure Blob Storage as staged blocks committed at the end
+# content_hash identifies the content the chunks are encoded from, an unchanged output is skipped without encoding it
+# Returns the MD5 digest of the uploaded bytes, None when the upload was skipped
+def upload_stream_to_azure_blob_storage(container_name, chunks, upload_file, directory_name, content_hash):
+    try:
+        logging.info("streaming the data to the Azure Blob Storage")
+        content_md5 = hashlib.md5()
+        chunks = iter_hashed_chunks(chunks, content_md5, [])
+        # Nothing is visible to readers until the block list is committed
+        manifest = get_manifest()
+        if manifest is None:
+            block_count = get_storage().upload_blocks(container_name, f"{directory_name}/{upload_file}", chunks)
+        else:
+            # The chunks are hashed for the manifest as they are uploaded, the stream is still read only once
+            block_count = publish_chunks(manifest, get_storage(), container_name, f"{directory_name}/{upload_file}",
+                                         chunks, content_hash)
+            if not block_count:
+                logging.info(f"{upload_file} is unchanged in Azure Blob Storage, skipped the upload.")
+                return None
+        logging.info(f"Uploaded {upload_file} to Azure Blob Storage in {block_count} block(s) successfully.")
+        return content_md5.digest()
 
     except Exception as excep:
-        print(f"Error uploading to Azure Blob Storage: {str(excep)}")
+        logging.exception(f"Error uploading {upload_file} to Azure Blob Storage: {excep}")
+        raise
+
+
+# Function to read a blob's bytes from Azure Blob Storage, returns None when the blob does not exist
+def read_bytes_from_azure_blob_storage(container_name, blob_name):
+    blob_cache = get_storage_cache()
+    if blob_cache is not None:
+        return blob_cache.read_bytes(container_name, blob_name)
+    return get_storage().read_bytes(container_name, blob_name)
+
+
+# Function to read a text blob from Azure Blob Storage, returns None when the blob does not exist
+def read_text_from_azure_blob_storage(container_name, blob_name):
+    blob_data = read_bytes_from_azure_blob_storage(container_name, blob_name)
+    return None if blob_data is None else blob_data.decode('utf-8')
+
+
+# Function to split bytes into chunks for a staged block upload
+def iter_byte_chunks(data, chunk_size):
+    for offset in range(0, len(data), chunk_size):
+        yield data[offset:offset + chunk_size]
+
+
+# Function to list the blob names under a prefix in Azure Blob Storage
+def list_blobs_in_azure_blob_storage(container_name, prefix):
+    return get_storage().list_blobs(container_name, prefix)
+
+
+# Function to upload new records into year=YYYY/month=MM partitions and advance the watermark
+# Each partition is rewritten from its rows up to the watermark and the new records, so a retry of a run that failed
+# after writing some partitions replaces the rows it wrote instead of appending them twice
+def upload_partitions_to_azure_blob_storage(container_name, records_df, header, upload_file, directory_name, watermark):
+    if records_df.empty:
+        logging.info(f"No new records for {upload_file} after watermark {watermark}")
+        return
+
+    partitions = group_frame_by_partition(records_df, directory_name, storage_file_name(upload_file, storage_format))
+    for blob_name, partition_df in sorted(partitions.items()):
+        partition_directory, partition_file = blob_name.rsplit('/', 1)
+        if storage_format == "parquet":
+            partition_data = append_string_frame_to_parquet_bytes(
+                read_bytes_from_azure_blob_storage(container_name, blob_name), partition_df, header, watermark,
+                parquet_row_group_size)
+            upload_stream_to_azure_blob_storage(container_name, iter_byte_chunks(partition_data, upload_chunk_size),
+                                                partition_file, partition_directory, bytes_content_hash(partition_data))
+            continue
+
+        existing_csv_data = read_text_from_azure_blob_storage(container_name, blob_name)
+        if existing_csv_data:
+            # The stored values are read back as the API's strings, so the kept rows are written unchanged
+            existing_df = pd.read_csv(io.StringIO(existing_csv_data), dtype=str, keep_default_na=False)
+            partition_df = pd.concat([rows_at_or_before_watermark(existing_df, watermark), partition_df[header]],
+                                     ignore_index=True)
+        csv_data = partition_df.to_csv(index=False, columns=header, lineterminator='\n')
+        upload_to_azure_blob_storage(container_name, csv_data, partition_file, partition_directory)
+    logging.info(f"Uploaded {len(records_df)} new records of {upload_file} into {len(partitions)} partition(s)")
+
+    # The watermark only moves forward once every partition has been written
+    watermark_directory, watermark_file = watermark_path(directory_name).rsplit('/', 1)
+    upload_to_azure_blob_storage(container_name, build_watermark(records_df['record_date'].dropna(), watermark),
+                                 watermark_file, watermark_directory)
 
 
 # Function to read connection string from config file
 def read_property_from_file(filepath, property_name):
     try:
         logging.info("Reading the "+property_name+" from the "+filepath)
-        config = configparser.ConfigParser()
-        config.read(filepath)
-
-        if property_name in config and property_name in config[property_name]:
-            logging.info("successfully read the "+property_name+" from the "+filepath)
-            return config[property_name][property_name]
-        else:
-            raise KeyError(f'{property_name} key not found in the configuration file.')
+        # The config file is parsed once per process and the parsed copy is reused
+        property_value = read_config_property(filepath, property_name)
+        logging.info("successfully read the "+property_name+" from the "+filepath)
+        return property_value
 
     except FileNotFoundError as e:
         print(f'Error: {e.strerror} - {filepath} not found.')
@@ -112,299 +378,428 @@ def read_property_from_file(filepath, property_name):
         return None
 
 
-# Function to convert JSON list to CSV string
-def json_list_to_csv(json_data_list, header):
-    if not json_data_list:
-        return ''
-    csv_data = [header]
-    for item in json_data_list:
-        row = [str(item.get(field, '')) for field in header]
-        csv_data.append(row)
-    return '\n'.join([','.join(row) for row in csv_data])
+# Function to apply a dataset's cleaning rules to the columns of one page of records in a single vectorized pass
+def clean_page(upload_file, header, columns):
+    cleaning_start = time.perf_counter()
+    page_df = cleaning_functions[upload_file](pd.DataFrame(columns, columns=header))
+    add_to_counter('cleaning_seconds', time.perf_counter() - cleaning_start)
+    return page_df
 
 
 # Function to make API request and process data
-def process_api_request(base_url, params, header, upload_file, directory_name):
+def process_api_request(base_url, params, header, upload_file, directory_name, page_size=None):
     try:
-        logging.info("Making a GET request to "+base_url)
-        response = requests.get(base_url, params)
-        if response.status_code == 200:
-            logging.info(f"GET request made to" +base_url+ "was successful ")
-            logging.info("Data Ingestion Starts now ")
-            data = response.json()
-            list_of_records = data['data']
-            # data cleaning, removal of invalid data
-            if upload_file == "interest_rates.csv":
-                logging.info("removing unwanted reocrds")
-                # Filter records based on conditions
-                filtered_records = [
-                 record for record in list_of_records
-                 if record['security_type_desc'] in ['Marketable', 'Non-marketable']
-                 if not record['security_desc'] in ['Total Marketable',
-                                                    'TotalMarketable',
-                                                    'Total Non-marketable',
-                                                    'Hope Bonds',
-                                                    'R.E.A. Series',
-                                                    'Treasury Inflation-Indexed Bonds',
-                                                    'Treasury Inflation-Indexed Notes']
-                ]
-            else:
-             if upload_file == "debt_statement.csv":
-                logging.info("removing unwanted reocrds")
-                filtered_records = [
-                    record for record in list_of_records
-                    if record['security_type_desc'] in ['Marketable', 'Nonmarketable']
-                    if record['record_date']
-                    if not record['security_class_desc'] in ['Other',
-                                                             'Hope Bonds',
-                                                             'Depositary Compensation Securities',
-                                                             'R.E.A. Series',
-                                                             'Inflation-Indexed Bonds',
-                                                             'Inflation-Indexed Bonds',
-                                                             'Inflation-Indexed Notes']
-                ]
-
-            # Removing records with null or empty values
-            filtered_records = [
-                {k: v for k, v in record.items() if v is not None and v != ''}
-                for record in filtered_records
-            ]
-
-            if upload_file == "debt_statement.csv":
-                logging.info(f"adjusting the attribute names in the "+upload_file)
-                # Update 'security_desc' values based on the mapping dictionary
-                filtered_records = [
-                    {**record,
-                        'security_class_desc': mapping_dict.get(record['security_class_desc'],
-                                                                record['security_class_desc'])}
-                    for record in filtered_records
-                ]
-
-            # Convert the JSON data to a CSV string
-            csv_data = json_list_to_csv(filtered_records, header)
-
-            # Upload CSV data to Azure Blob Storage
-            upload_to_azure_blob_storage(container_name_base, csv_data, upload_file, directory_name)
-
+        if ingestion_mode == "incremental":
+            watermark = parse_watermark(read_text_from_azure_blob_storage(container_name_base,
+                                                                          watermark_path(directory_name)))
+            logging.info(f"Incremental ingestion of {upload_file} after watermark {watermark}")
+            params = incremental_params(params, watermark)
+
+        logging.info("Making GET requests to "+base_url)
+        # Every dataset's pages go through the same fetcher, under its shared connection limit and rate cap
+        fetcher = get_async_fetcher(api_max_connections, api_requests_per_second, api_max_retries, api_cache_directory,
+                                    api_cache_ttl_seconds, api_cache_closed_after_days,
+                                    api_cache_closed_max_age_seconds)
+        # Each page's records are decoded straight into columns as the body arrives and cleaned on arrival,
+        # so only the cleaned pages are kept
+        logging.info("removing unwanted records of "+upload_file)
+        cleaned_pages = fetcher.fetch_pages(base_url, params, page_size, api_window_years, fields=header,
+                                            page_handler=partial(clean_page, upload_file, header))
+        logging.info("GET requests made to " +base_url+ " were successful ")
+        logging.info("Data Ingestion Starts now ")
+        records_df = pd.concat(cleaned_pages, ignore_index=True) if cleaned_pages else pd.DataFrame(columns=header)
+        del cleaned_pages
+
+        if ingestion_mode == "incremental":
+            # Upload only the new rows into their monthly partitions
+            upload_partitions_to_azure_blob_storage(container_name_base, records_df, header, upload_file,
+                                                    directory_name, watermark)
         else:
-            print(f"API request failed with status code: {response.status_code}")
-    except Exception as excep:
-        print(f"Error making API request: {str(excep)}")
-
-
-# Function to read the file from Azure Blob Storage
-def read_from_azure_blob_storage(container_name, blob_name):
-    try:
-        logging.info("reading the data from the Azure Blob Storage")
-        blob_service_client = BlobServiceClient.from_connection_string(read_property_from_file(file_path,connection_string))
-
-        # Get a reference to the container
-        container_client = blob_service_client.get_container_client(container_name)
+            if storage_format == "parquet":
+                # Encode the records as a typed Parquet file with record_date row group statistics
+                parquet_data = string_frame_to_parquet_bytes(records_df, header, parquet_row_group_size)
+                content_md5 = upload_stream_to_azure_blob_storage(
+                    container_name_base, iter_byte_chunks(parquet_data, upload_chunk_size),
+                    storage_file_name(upload_file, storage_format), directory_name, bytes_content_hash(parquet_data))
+            else:
+                # Encode the cleaned records as CSV chunks, only once they are read by the upload
+                csv_chunks = iter_dataframe_csv_chunks(records_df, header, upload_chunk_rows)
 
-        # Download blob
-        blob_client = container_client.get_blob_client(blob_name)
+                # Upload the CSV chunks to Azure Blob Storage as staged blocks
+                content_md5 = upload_stream_to_azure_blob_storage(container_name_base, csv_chunks, upload_file,
+                                                                  directory_name,
+                                                                  f"csv:{frames_content_hash(records_df[header])}")
 
-        # Download blob content
-        blob_content = blob_client.download_blob()
+            # The transformation uses the frame in memory instead of the stored copy, so the stored copy must hold
+            # the bytes encoded from it; a skipped upload left the copy published from the same rows
+            if content_md5 is not None:
+                verify_stored_copy(get_storage(), container_name_base,
+                                   f"{directory_name}/{storage_file_name(upload_file, storage_format)}", content_md5)
 
-        # Read the content into a Pandas DataFrame
-        df = pd.read_csv(StringIO(blob_content.readall().decode('utf-8')))
-        logging.info("data has been read successfully from the Azure Blob Storage")
-        return df
+        # Hand the typed frame over to the transformation
+        return typed_dataframe(records_df)
 
     except Exception as excep:
-        print(f"Error reading from Azure Blob Storage: {str(excep)}")
+        # The stage fails with the cause, and its traceback is kept in scripts.log and error.log
+        logging.exception(f"Error making API request to {base_url}: {excep}")
+        raise
 
 
-def connect_to_azure_sql(ddl_script_file_path, df_merged, DB_PASSWORD_CONNECTION_STRING):
+# Function to open a blob as a stream of its downloaded ranges, without holding the whole blob in memory
+def open_blob_stream(container_name, blob_name):
+    return io.BufferedReader(ChunkReader(get_storage().iter_chunks(container_name, blob_name,
+                                                                   blob_download_chunk_size)),
+                             buffer_size=blob_download_chunk_size)
 
-    try:
-        logging.info("reading the required DDL statements from "+ ddl_script_file_path)
 
-        with open(ddl_script_file_path, 'r') as script_file:
-            ddl_script = script_file.read()
-
-        # Connect to the Azure SQL Database
-        with pyodbc.connect(DB_PASSWORD_CONNECTION_STRING) as connection:
-            cursor = connection.cursor()
-            cursor.execute(ddl_script)
-            connection.commit()
-            logging.info("executing the required DDL statement for the database")
-            # Iterate through the DataFrame and insert rows into the SQL table
-            query = """
-                INSERT INTO f23_project.US_Treasury_details (
-                    record_date, security_type_desc, security_desc, avg_interest_rate_amt,
-                    record_fiscal_year_df2, record_fiscal_quarter_df2, record_calendar_year_df2,
-                    record_calendar_quarter_df2, record_calendar_month_df2, record_calendar_day_df2,
-                    debt_held_public_mil_amt, intragov_hold_mil_amt, total_mil_amt
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-
-            # Convert DataFrame to a list of tuples
-            rows_to_insert = [tuple(row) for row in df_merged.itertuples(index=False, name=None)]
-
-            # Use executemany to insert multiple rows at once
-            cursor.executemany(query, rows_to_insert)
-
-            # Commit the changes
-            connection.commit()
-
-            logging.info('Data in Azure SQL database has been inserted successfully.')
-
-    except Exception as e:
-        print(f'Error: {e}')
-        # Handle the error as needed
-        return None
-def read_azure_sql(DB_PASSWORD_CONNECTION_STRING):
+# Function to read the file from Azure Blob Storage
+def read_from_azure_blob_storage(container_name, blob_name, columns=None):
     try:
-        logging.info("Reading the data from the Azure SQL database")
-        # Connect to the Azure SQL Database
-        with pyodbc.connect(DB_PASSWORD_CONNECTION_STRING) as connection:
-            # Query to retrieve data from the table
-            query = ''' SELECT * FROM f23_project.US_Treasury_details '''
-
-            # Execute the query and fetch the data into a DataFrame
-            df = pd.read_sql(query, connection)
-
+        logging.info("reading the data from the Azure Blob Storage")
+        blob_cache = get_storage_cache()
+        if blob_cache is not None:
+            # An unchanged blob is parsed straight from its memory-mapped local copy instead of being downloaded
+            with blob_cache.open_mapped(container_name, blob_name) as mapped:
+                if mapped is None:
+                    raise FileNotFoundError(f"{blob_name} does not exist in {container_name}")
+                df = apply_schema(pd.read_csv(mapped_reader(mapped), encoding='utf-8', usecols=columns,
+                                              **read_csv_options(columns)))
+            logging.info("data has been read successfully from the Azure Blob Storage")
             return df
 
-    except Exception as e:
-        logging.error(f'Error: {e}')
-        # Handle the error as needed
-        return None
-
-
-# List of tasks to be executed in parallel
-tasks = [
-    (base_url_1, params, header_1, upload_file_1, directory_name_1),
-    (base_url_2, params, header_2, upload_file_2, directory_name_2)
-]
-
-# Data Ingestion starts here
-# Using ThreadPoolExecutor for parallel processing
-with concurrent.futures.ThreadPoolExecutor() as executor:
-    # Execute the tasks asynchronously
-    futures = [executor.submit(process_api_request, *task) for task in tasks]
-
-    # Wait for all tasks to complete
-    concurrent.futures.wait(futures)
-
-print("Both datasets completed.")
-# Data Ingestion ends here
-
-# Data Transformation Starts Here
-# After the tasks are completed, read the uploaded files separately
-df_uploaded_1 = read_from_azure_blob_storage(container_name_base, f"{directory_name_1}/{upload_file_1}")
-df_uploaded_2 = read_from_azure_blob_storage(container_name_base, f"{directory_name_2}/{upload_file_2}")
-
-common_columns_df1 = ['record_date', 'security_desc']
-common_columns_df2 = ['record_date', 'security_class_desc']
-
-# Perform an inner join
-df_merged = pd.merge(df_uploaded_2,
-                     df_uploaded_1,
-                     how='inner',
-                     left_on=common_columns_df1,
-                     right_on=common_columns_df2,
-                     suffixes=('_df2', '_df1'))
+        # Stream the blob content into a Pandas DataFrame, parsing each downloaded range as it arrives
+        # Read the columns straight into the compact schema dtypes, with record_date parsed as a date
+        with open_blob_stream(container_name, blob_name) as blob_stream:
+            df = apply_schema(pd.read_csv(blob_stream, encoding='utf-8', usecols=columns,
+                                          **read_csv_options(columns)))
+        logging.info("data has been read successfully from the Azure Blob Storage")
+        return df
 
-df_merged = df_merged.drop(columns=unwanted_columns)
+    except Exception as excep:
+        logging.exception(f"Error reading {blob_name} from Azure Blob Storage: {excep}")
+        raise
 
-merged_csv_data = df_merged.to_csv(index=False)
 
-# call for upload_to_azure_blob_storage: Upload CSV data to Azure Blob Storage
-# Data Transformation Ends here
-upload_to_azure_blob_storage(container_name_base, merged_csv_data, serving_data, "serving_data")
+# Function to read a Parquet blob, downloading only the byte ranges of the needed columns and row groups
+def read_parquet_from_azure_blob_storage(container_name, blob_name, columns=None, start_date=None, end_date=None):
+    try:
+        logging.info("reading the parquet data from the Azure Blob Storage")
+        blob_cache = get_storage_cache()
+        if blob_cache is not None:
+            # A current local copy is read in place, a miss reads the needed ranges below instead of downloading
+            # the whole blob into the cache
+            with blob_cache.open_mapped_if_cached(container_name, blob_name) as mapped:
+                if mapped is not None:
+                    df = apply_schema(read_parquet(mapped_reader(mapped), columns, start_date, end_date))
+                    logging.info(f"read {blob_name} from the blob cache")
+                    return df
+
+        storage = get_storage()
+        blob_size = storage.blob_size(container_name, blob_name)
+
+        reader = RangedReader(lambda offset, length: storage.read_range(container_name, blob_name, offset, length),
+                              blob_size)
+        df = apply_schema(read_parquet(reader, columns, start_date, end_date))
+        logging.info(f"read {reader.bytes_read} of {blob_size} bytes of {blob_name} from the Azure Blob Storage")
+        return df
 
-# Data Serving start here
-# call for connect_to_azure_sql: To execute DDL Statements and insert data for serving purpose
-connect_to_azure_sql(ddl_script_file_path, df_merged, read_property_from_file(file_path, DB_PASSWORD_CONNECTION_STRING))
+    except Exception as excep:
+        logging.exception(f"Error reading {blob_name} from Azure Blob Storage: {excep}")
+        raise
 
-# call for read_azure_sql: Reads the serving_data from AzureSQL Database
-analysis_df = read_azure_sql(read_property_from_file(file_path, DB_PASSWORD_CONNECTION_STRING))
 
-grouped_data = analysis_df.groupby('security_type_desc').agg({
-    'debt_held_public_mil_amt': 'sum',
-    'intragov_hold_mil_amt': 'sum'
-})
+# Function to read a CSV or Parquet blob with optional column and record_date range filters
+def read_blob_dataframe(container_name, blob_name, columns=None, start_date=None, end_date=None):
+    if blob_name.endswith(".parquet"):
+        return read_parquet_from_azure_blob_storage(container_name, blob_name, columns, start_date, end_date)
 
-# Calculate the total holding by summing 'debt_held_public_mil_amt' and 'intragov_hold_mil_amt'
-grouped_data['total_holding'] = grouped_data['debt_held_public_mil_amt'] + grouped_data['intragov_hold_mil_amt']
+    df = read_from_azure_blob_storage(container_name, blob_name, columns)
+    if start_date is not None:
+        df = df[df['record_date'] >= str(start_date)]
+    if end_date is not None:
+        df = df[df['record_date'] <= str(end_date)]
+    return df
 
-# 1 Which category has more holdings
-# Find the category with the highest total holding
-max_holding_category = grouped_data['total_holding'].idxmax()
 
-analysis_df['record_date'] = pd.to_datetime(analysis_df['record_date'], format='%m/%d/%Y')
+# Function to read the year=/month= partitions of a dataset, skipping partitions outside the date range
+def read_partitioned_from_azure_blob_storage(container_name, directory_name, columns=None, start_date=None,
+                                             end_date=None):
+    try:
+        logging.info("reading the partitions of "+directory_name+" from the Azure Blob Storage")
+        blob_names = [blob_name for blob_name in list_blobs_in_azure_blob_storage(container_name, f"{directory_name}/year=")
+                      if partition_in_range(blob_name, start_date, end_date)]
+        frames = [read_blob_dataframe(container_name, blob_name, columns, start_date, end_date)
+                  for blob_name in blob_names]
+        # Partitions with different categories concatenate to plain objects, the schema makes them categories again
+        df = apply_schema(pd.concat(frames, ignore_index=True))
+        logging.info(f"read {len(blob_names)} partition(s) of {directory_name}")
+        return df
 
-# Get the latest month
-latest_month = analysis_df['record_date'].max()
+    except Exception as excep:
+        logging.exception(f"Error reading the partitions of {directory_name} from Azure Blob Storage: {excep}")
+        raise
 
-# Filter the DataFrame to include only the rows corresponding to the latest month
-latest_month_data = analysis_df[analysis_df['record_date'].dt.month == latest_month.month]
 
-# Separate the data into 'marketable' and 'non-marketable' categories for the latest month
-marketable_data_latest = latest_month_data[latest_month_data['security_type_desc'] == 'Marketable']
-non_marketable_data_latest = latest_month_data[latest_month_data['security_type_desc'] == 'Non-marketable']
+# Function to read a processed dataset in the configured ingestion mode and storage format
+def read_dataset_from_azure_blob_storage(container_name, directory_name, upload_file, columns=None, start_date=None,
+                                         end_date=None):
+    if ingestion_mode == "incremental":
+        return read_partitioned_from_azure_blob_storage(container_name, directory_name, columns, start_date, end_date)
+    blob_name = f"{directory_name}/{storage_file_name(upload_file, storage_format)}"
+    return read_blob_dataframe(container_name, blob_name, columns, start_date, end_date)
 
-# Calculate the total debt held public amount for 'marketable' and 'non-marketable' types
-total_debt_marketable = marketable_data_latest['debt_held_public_mil_amt'].sum()
-total_debt_non_marketable = non_marketable_data_latest['debt_held_public_mil_amt'].sum()
 
-# 2 Which category has more public holdings
-if total_debt_marketable > total_debt_non_marketable:
-    max_public_holding_category = 'Marketable'
-else:
-    max_public_holding_category = 'Non-marketable'
+# Function to read the connection string of the configured SQL backend, None for SQLite, which needs no credentials
+def read_sql_connection_string():
+    if sql_backend_name == "sqlite":
+        return None
+    return read_property_from_file(file_path, DB_PASSWORD_CONNECTION_STRING)
 
-analysis_df['avg_interest_rate_amt'] = pd.to_numeric(analysis_df['avg_interest_rate_amt'], errors='coerce')
-analysis_df['record_date'] = pd.to_datetime(analysis_df['record_date'], format='%m/%d/%Y')
 
-# Filter the DataFrame to include only the rows corresponding to the current year
-current_year_data = analysis_df[analysis_df['record_date'].dt.year == pd.to_datetime('today').year]
+# Function to get the connector of the configured SQL backend
+def get_sql_connector(DB_PASSWORD_CONNECTION_STRING):
+    if sql_backend_name == "sqlite":
+        return SqliteConnector(sqlite_database_path)
+    return AzureSqlConnector(DB_PASSWORD_CONNECTION_STRING)
 
-# Get the security with the highest average interest rate in the current year
-highest_avg_interest_security = current_year_data.loc[current_year_data['avg_interest_rate_amt'].idxmax()]
 
-last_two_years_data = analysis_df[analysis_df['record_date'] >= pd.to_datetime('today') - pd.DateOffset(years=2)]
+def connect_to_azure_sql(ddl_script_file_path, df_merged, DB_PASSWORD_CONNECTION_STRING):
 
-# Separate the data into 'marketable' and 'non-marketable' categories for the last 2 years
-marketable_data_last_two_years = last_two_years_data[last_two_years_data['security_type_desc'] == 'Marketable']
-non_marketable_data_last_two_years = last_two_years_data[last_two_years_data['security_type_desc'] == 'Non-marketable']
+    try:
+        logging.info("reading the required DDL statements from "+ ddl_script_file_path)
 
-# Calculate the average interest rate for 'marketable' and 'non-marketable' types
-average_interest_marketable = marketable_data_last_two_years['avg_interest_rate_amt'].mean()
-average_interest_non_marketable = non_marketable_data_last_two_years['avg_interest_rate_amt'].mean()
+        with open(ddl_script_file_path, 'r') as script_file:
+            ddl_script = script_file.read()
 
-# Calculate the average interest rate for each 'security_desc' in 'marketable' and 'non-marketable' types
-average_interest_security_marketable = marketable_data_last_two_years.groupby('security_desc')['avg_interest_rate_amt'].mean()
-average_interest_security_non_marketable = non_marketable_data_last_two_years.groupby('security_desc')['avg_interest_rate_amt'].mean()
+        # Connect to the Azure SQL Database
+        connector = get_sql_connector(DB_PASSWORD_CONNECTION_STRING)
+        # A partitioned join is loaded one partition at a time
+        frames = [df_merged] if isinstance(df_merged, pd.DataFrame) else df_merged
+        manifest = get_manifest()
+        with connector.connect() as connection:
+            if manifest is not None:
+                # The table is left alone when it was loaded from the same rows, in the same mode, and still holds
+                # the row count that load left in it
+                manifest_key = f"sql:{sql_backend_name}:{serving_table_name}"
+                content_hash = f"{serving_load_mode}:{frames_content_hash(df_merged)}"
+                if manifest.is_unchanged(manifest_key, content_hash, table_row_count(connection)):
+                    manifest.record(manifest_key, content_hash, table_row_count(connection), reused=True)
+                    logging.info("the serving table already holds these rows, skipped the load.")
+                    return
+
+            if serving_load_mode == "incremental":
+                connector.run_incremental_ddl(connection, ddl_script)
+                logging.info("executing the required DDL statement for the database")
+
+                # Stage the rows and merge them into the SQL table in one statement
+                refresh_from_date = lookback_cutoff(connection.cursor(), lookback_days=serving_upsert_lookback_days)
+                # Partitions come oldest first, so each partition's lookback cutoff is the same as for the whole frame
+                for frame in frames:
+                    upsert_load(connector, connection, frame, batch_size=sql_batch_size,
+                                lookback_days=serving_upsert_lookback_days)
+
+                # Re-aggregate only the months the upsert could have changed
+                refresh_monthly_cube(connector, connection, refresh_from_date)
+            else:
+                connector.run_ddl(connection, ddl_script)
+                logging.info("executing the required DDL statement for the database")
 
-# Get the top 3 'security_desc' for 'marketable' and 'non-marketable' based on average interest rates
-top_3_marketable = average_interest_security_marketable.nlargest(3).index.to_list()
-top_3_non_marketable = average_interest_security_non_marketable.nlargest(3).index.to_list()
+                # Stream the DataFrame into the SQL table in parameter-array batches, committing after each batch
+                for frame in frames:
+                    bulk_load(connector, connection, frame, batch_size=sql_batch_size,
+                              use_staging=sql_use_staging_table)
+                refresh_monthly_cube(connector, connection)
 
-# Calculating the overall average interest return for 'Marketable' securities
-average_return_marketable_all = analysis_df.loc[analysis_df['security_type_desc'] == 'Marketable', 'avg_interest_rate_amt'].mean()
+            if manifest is not None:
+                manifest.record(manifest_key, content_hash, table_row_count(connection), reused=False)
+            logging.info('Data in Azure SQL database has been inserted successfully.')
 
-# Calculating the overall average interest return for 'Non-marketable' securities
-average_return_non_marketable_all = analysis_df.loc[analysis_df['security_type_desc'] == 'Non-marketable', 'avg_interest_rate_amt'].mean()
+    except Exception as e:
+        logging.exception(f'Error loading the serving table: {e}')
+        # The failure is raised so the stages depending on the load do not run
+        raise
 
-if average_return_marketable_all > average_return_non_marketable_all:
-    highest_interest_category = 'Marketable'
-else:
-    highest_interest_category = 'Non-Marketable'
 
-# getting the answers to a text file for the questions from Business solution
-with open(output_file_path, 'w') as file:
-    file.write("#1 Which category has more holdings: " + str(max_holding_category) + "\n")
-    file.write("#2 Which category has more public holdings: " + str(max_public_holding_category) + "\n")
-    file.write(f"#3 Which category has good average tracks of returns(interest): " + str(highest_interest_category) + "\n")
-    file.write(f"#4 The average interest return for 'Marketable' securities in the last 2 years is: {average_interest_marketable}\n")
-    file.write(f"#5 The average interest return for 'Non-marketable' securities in the last 2 years is: {average_interest_non_marketable}\n")
-    file.write(f"#6 Top 3 marketable securities with good returns are : {top_3_marketable}\n")
-    file.write(f"#7 Top 3 non-marketable securities with good returns are : {top_3_non_marketable}\n")
-    file.write(f"#8 The security with the highest average interest rate in the current year is: " + str(highest_avg_interest_security['security_desc']) + "\n")
+# Function to answer the business questions with aggregate queries run in the database
+def analyze_azure_sql(DB_PASSWORD_CONNECTION_STRING):
+    try:
+        logging.info("Answering the business questions in the Azure SQL database")
+        # Connect to the Azure SQL Database
+        with get_sql_connector(DB_PASSWORD_CONNECTION_STRING).connect() as connection:
+            # Only the aggregated answers come back, computed from the monthly cube
+            # A rerun on unchanged serving data with the same parameters reuses the cached answers
+            return answer_business_questions(connection, cache_directory=analysis_cache_directory,
+                                             cache_max_bytes=analysis_cache_max_bytes)
 
-# Data Serving Ends here
-print("Results have been saved to:", output_file_path)
+    except Exception as e:
+        logging.exception(f'Error answering the business questions: {e}')
+        raise
+
+
+# Function to ingest one dataset, a failed ingestion raises and fails the stage
+def ingest_dataset(base_url, params, header, upload_file, directory_name):
+    return process_api_request(base_url, params, header, upload_file, directory_name)
+
+
+# Function to join the two datasets into the serving frame
+def merge_datasets(ingested_df_1, ingested_df_2):
+    # Use the frames handed over by the ingestion, the stored files are only read when a full frame is not in memory
+    if ingestion_mode == "full":
+        df_uploaded_1 = ingested_df_1[transformation_columns_1]
+        df_uploaded_2 = ingested_df_2[transformation_columns_2]
+    else:
+        df_uploaded_1 = read_dataset_from_azure_blob_storage(container_name_base, directory_name_1, upload_file_1,
+                                                             columns=transformation_columns_1)
+        df_uploaded_2 = read_dataset_from_azure_blob_storage(container_name_base, directory_name_2, upload_file_2,
+                                                             columns=transformation_columns_2)
+
+    common_columns_df1 = ['record_date', 'security_desc']
+    common_columns_df2 = ['record_date', 'security_class_desc']
+
+    # With the same categories on both sides the join compares category codes instead of strings
+    df_uploaded_2, df_uploaded_1 = align_categories(df_uploaded_2, 'security_desc', df_uploaded_1,
+                                                    'security_class_desc')
+
+    if merge_mode == "partitioned":
+        # Both keys include record_date, so joining month by month gives the same rows as one join
+        return partitioned_merge(df_uploaded_2, df_uploaded_1,
+                                 {'how': 'inner', 'left_on': common_columns_df1, 'right_on': common_columns_df2,
+                                  'suffixes': ('_df2', '_df1')},
+                                 unwanted_columns, serving_column_renames, merge_partition_by, merge_max_workers,
+                                 merge_spool_directory)
+
+    # Perform an inner join
+    df_merged = pd.merge(df_uploaded_2,
+                         df_uploaded_1,
+                         how='inner',
+                         left_on=common_columns_df1,
+                         right_on=common_columns_df2,
+                         suffixes=('_df2', '_df1'))
+
+    return df_merged.drop(columns=unwanted_columns).rename(columns=serving_column_renames)
+
+
+# Function to profile both ingested datasets into the profile report, returns the path of its JSON file
+def profile_datasets(ingested_df_1, ingested_df_2):
+    # Incremental ingestions only hand over the new records, so the whole datasets are read back from storage
+    if ingestion_mode != "full":
+        ingested_df_1 = read_dataset_from_azure_blob_storage(container_name_base, directory_name_1, upload_file_1)
+        ingested_df_2 = read_dataset_from_azure_blob_storage(container_name_base, directory_name_2, upload_file_2)
+    return write_profile_report({'debt': ingested_df_1, 'interest_rates': ingested_df_2}, profile_output_directory,
+                                profile_max_workers)
+
+
+# Function to upload the serving frame to Azure Blob Storage, returns the uploaded blob name
+def publish_serving_data(df_merged):
+    if not isinstance(df_merged, pd.DataFrame):
+        # Stream the partitions of a partitioned join into one blob as staged blocks, one partition in memory at a time
+        if storage_format == "parquet":
+            chunks = iter_frames_parquet_chunks(df_merged, parquet_row_group_size)
+            content_hash = f"parquet:{parquet_row_group_size}:{frames_content_hash(df_merged)}"
+        else:
+            chunks = iter_frames_csv_chunks(df_merged, chunk_rows=upload_chunk_rows)
+            content_hash = f"csv:{frames_content_hash(df_merged)}"
+        upload_stream_to_azure_blob_storage(container_name_base, chunks, storage_file_name(serving_data, storage_format),
+                                            serving_directory_name, content_hash)
+    elif storage_format == "parquet":
+        merged_parquet_data = dataframe_to_parquet_bytes(df_merged, parquet_row_group_size)
+        upload_stream_to_azure_blob_storage(container_name_base,
+                                            iter_byte_chunks(merged_parquet_data, upload_chunk_size),
+                                            storage_file_name(serving_data, storage_format), serving_directory_name,
+                                            bytes_content_hash(merged_parquet_data))
+    else:
+        merged_csv_data = df_merged.to_csv(index=False)
+        upload_to_azure_blob_storage(container_name_base, merged_csv_data, serving_data, serving_directory_name)
+    return f"{serving_directory_name}/{storage_file_name(serving_data, storage_format)}"
+
+
+# Function to load the serving frame into the SQL database, returns the number of rows in the frame
+def load_serving_table(df_merged):
+    # call for connect_to_azure_sql: To execute DDL Statements and insert data for serving purpose
+    connect_to_azure_sql(ddl_incremental_script_file_path if serving_load_mode == "incremental" else ddl_script_file_path,
+                         df_merged, read_sql_connection_string())
+    return len(df_merged)
+
+
+# Function to answer the business questions and write them to the answers file
+def analyze_serving_data(rows_loaded):
+    # call for analyze_azure_sql: Answers the business questions from the serving_data in AzureSQL Database
+    answers = analyze_azure_sql(read_sql_connection_string())
+
+    # getting the answers to a text file for the questions from Business solution
+    with open(output_file_path, 'w') as file:
+        file.write("#1 Which category has more holdings: " + str(answers['max_holding_category']) + "\n")
+        file.write("#2 Which category has more public holdings: " + str(answers['max_public_holding_category']) + "\n")
+        file.write("#3 Which category has good average tracks of returns(interest): " + str(answers['highest_interest_category']) + "\n")
+        file.write(f"#4 The average interest return for 'Marketable' securities in the last 2 years is: {answers['average_interest_marketable']}\n")
+        file.write(f"#5 The average interest return for 'Non-marketable' securities in the last 2 years is: {answers['average_interest_non_marketable']}\n")
+        file.write(f"#6 Top 3 marketable securities with good returns are : {answers['top_3_marketable']}\n")
+        file.write(f"#7 Top 3 non-marketable securities with good returns are : {answers['top_3_non_marketable']}\n")
+        file.write("#8 The security with the highest average interest rate in the current year is: " + str(answers['highest_avg_interest_security']) + "\n")
+
+    print("Results have been saved to:", output_file_path)
+    return answers
+
+
+# Function to get the API request parameters of a registry dataset
+def dataset_params(dataset):
+    return {**params, 'filter': dataset.get('filter', params['filter']), 'fields': ','.join(dataset['fields'])}
+
+
+# Function to build the ingest stage of a registry dataset
+def build_ingest_stage(name, dataset):
+    dataset_request_params = dataset_params(dataset)
+    return Stage(f"ingest-{name}",
+                 partial(ingest_dataset, dataset['base_url'], dataset_request_params, dataset['fields'],
+                         dataset['upload_file'], dataset['directory_name']),
+                 parameters={'base_url': dataset['base_url'], 'params': dataset_request_params,
+                             'header': dataset['fields'], 'cleaning_rules': dataset['cleaning_rules'],
+                             'ingestion_mode': ingestion_mode, 'storage_format': storage_format},
+                 always_run=True)
+
+
+# Function to build the pipeline's stages: every registry dataset is ingested concurrently, then the debt and
+# interest rate datasets are merged and, with a profile_output_directory, profiled, then the blob publish and the SQL
+# load run concurrently, then the analysis
+def build_pipeline_stages():
+    profile_stages = [] if profile_output_directory is None else [
+        Stage('profile', profile_datasets, ['ingest-debt', 'ingest-interest-rates'],
+              parameters={'ingestion_mode': ingestion_mode, 'profile_output_directory': profile_output_directory})]
+    return [build_ingest_stage(name, dataset) for name, dataset in dataset_registry.items()] + profile_stages + [
+        Stage('merge', merge_datasets, ['ingest-debt', 'ingest-interest-rates'],
+              parameters={'ingestion_mode': ingestion_mode, 'columns_1': transformation_columns_1,
+                          'columns_2': transformation_columns_2, 'renames': serving_column_renames,
+                          'merge_mode': merge_mode, 'merge_partition_by': merge_partition_by,
+                          'merge_spool_directory': merge_spool_directory}),
+        Stage('publish-blob', publish_serving_data, ['merge'],
+              parameters={'storage_backend': storage_backend_name, 'storage_format': storage_format,
+                          'serving_data': serving_data}),
+        Stage('load-sql', load_serving_table, ['merge'],
+              parameters={'sql_backend': sql_backend_name, 'serving_load_mode': serving_load_mode,
+                          'sql_use_staging_table': sql_use_staging_table}),
+        # The analysis depends on the clock for its time-relative questions, its answers are memoized on their own
+        Stage('analyze', analyze_serving_data, ['load-sql'], always_run=True),
+    ]
+
+
+if __name__ == "__main__":
+    pipeline_stages = build_pipeline_stages()
+    parser = argparse.ArgumentParser(description="Ingest the Treasury datasets, publish and load the serving data "
+                                                 "and answer the business questions")
+    parser.add_argument("--stages", nargs="+", choices=[stage.name for stage in pipeline_stages],
+                        help="stages to run, their dependencies are read from the checkpoints (default: all)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last run, skipping the stages it completed")
+    parser.add_argument("--force", action="store_true", help="run the stages even when their inputs are unchanged")
+    parser.add_argument("--checkpoint-directory", default=default_checkpoint_directory)
+    args = parser.parse_args()
+
+    stage_statuses = run_pipeline(pipeline_stages, args.stages, args.checkpoint_directory, resume=args.resume,
+                                  force=args.force, max_workers=pipeline_max_workers)
+
+    # Per-stage wall time, rows, bytes, page latencies, SQL throughput and peak memory of this run
+    write_run_report(load_pipeline_state(args.checkpoint_directory)['run_id'])
+    for stage_name, stage_status in stage_statuses.items():
+        print(f"{stage_name}: {stage_status}")
+    if any(stage_status in ('failed', 'blocked') for stage_status in stage_statuses.values()):
+        sys.exit(1)
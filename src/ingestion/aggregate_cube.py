@@ -0,0 +1,69 @@
+import hashlib
+import json
+import logging
+import time
+
+import pandas as pd
+
+from sql_loader import serving_table_name
+
+# Aggregate cube at (month, security_type_desc, security_desc) grain that the analysis questions are answered from
+# Means are kept as sums and counts so they combine exactly across months and securities
+monthly_cube_table_name = "f23_project.US_Treasury_monthly_cube"
+monthly_cube_columns = ["record_month", "security_type_desc", "security_desc", "row_count", "rate_count", "rate_sum",
+                        "rate_max", "debt_held_public_sum", "intragov_hold_sum", "total_sum"]
+
+
+# Function to get the first day of the month of a date as an ISO string
+def month_start(value):
+    return pd.Timestamp(value).strftime('%Y-%m-01')
+
+
+# Function to rebuild the cube's months from from_date's month on out of the serving table, every month when None
+# Only the changed months are deleted and re-aggregated, the rest of the cube stays in place
+def refresh_monthly_cube(connector, connection, from_date=None, table_name=serving_table_name,
+                         cube_table_name=monthly_cube_table_name):
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    month = connector.month_start_expression('record_date')
+
+    params = []
+    month_filter = ""
+    if from_date is not None:
+        params = [month_start(from_date)]
+        month_filter = "WHERE record_month >= ?"
+    cursor.execute(f"DELETE FROM {cube_table_name} {month_filter}", params)
+    cursor.execute(f"""
+        INSERT INTO {cube_table_name} ({', '.join(monthly_cube_columns)})
+        SELECT {month}, security_type_desc, security_desc, COUNT(*), COUNT(avg_interest_rate_amt),
+               SUM(avg_interest_rate_amt), MAX(avg_interest_rate_amt), SUM(debt_held_public_mil_amt),
+               SUM(intragov_hold_mil_amt), SUM(total_mil_amt)
+        FROM {table_name}
+        {'WHERE record_date >= ?' if from_date is not None else ''}
+        GROUP BY {month}, security_type_desc, security_desc
+    """, params)
+    cells_refreshed = cursor.rowcount
+    connection.commit()
+
+    logging.info(f"refreshed {cells_refreshed} cells of {cube_table_name} from "
+                 f"{params[0] if params else 'the first month'} in {time.perf_counter() - start:.2f}s")
+    return cells_refreshed
+
+
+# Function to get a content hash of the cube, every cell in key order, the version its analysis answers are cached on
+# The answers are computed from the cube alone, so any change that can change an answer changes the hash, including
+# relabeled securities whose counts and totals stay the same; the cube holds one row per month and security
+def cube_version(connection, cube_table_name=monthly_cube_table_name, batch_size=10000):
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        SELECT {', '.join(monthly_cube_columns)}
+        FROM {cube_table_name}
+        ORDER BY record_month, security_type_desc, security_desc
+    """)
+    digest = hashlib.sha256()
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return digest.hexdigest()
+        for row in rows:
+            digest.update(json.dumps([str(value) for value in row]).encode('utf-8'))
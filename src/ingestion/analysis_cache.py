@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+
+# Default directory and total size bound of the analysis result cache
+default_cache_directory = "../analysis_cache"
+default_cache_max_bytes = 16 * 1024 * 1024
+
+# Bump when the layout of a cached result changes, old entries then stop matching
+cache_format_version = 1
+
+
+# Function to hash the source of the modules whose code decides the answers
+def code_version(modules):
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+
+# Function to build the cache key of an analysis run from the data version, the code version and the parameters
+# The parameters hold the time-relative cutoffs, so "last 2 years" and "current year" roll over the key on their own
+def cache_key(data_version, analysis_code_version, parameters):
+    key_source = json.dumps({'format': cache_format_version, 'data': data_version, 'code': analysis_code_version,
+                             'parameters': parameters}, sort_keys=True, default=str)
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+
+# Function to get the path a cached result is stored under
+def cache_entry_path(cache_directory, key):
+    return os.path.join(cache_directory, key + ".json")
+
+
+# Function to read a cached result, None when the key is not cached
+def read_cached_result(cache_directory, key):
+    path = cache_entry_path(cache_directory, key)
+    try:
+        with open(path, 'r') as cache_file:
+            result = json.load(cache_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.error(f"ignoring the unreadable analysis cache entry {path}: {e}")
+        return None
+    # Reading an entry marks it as recently used for the eviction
+    os.utime(path)
+    logging.info(f"analysis cache hit for {key}")
+    return result
+
+
+# Function to remove the least recently used entries until the cache fits in max_bytes
+def evict_least_recently_used(cache_directory, max_bytes=default_cache_max_bytes):
+    entries = []
+    for entry in os.scandir(cache_directory):
+        if entry.is_file() and entry.name.endswith(".json"):
+            entry_stat = entry.stat()
+            entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        os.remove(path)
+        total_bytes -= size
+        logging.info(f"evicted {path} from the analysis cache")
+
+
+# Function to store a result in the cache, then evict old entries beyond max_bytes
+def write_cached_result(cache_directory, key, result, max_bytes=default_cache_max_bytes):
+    os.makedirs(cache_directory, exist_ok=True)
+    path = cache_entry_path(cache_directory, key)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'w') as cache_file:
+        json.dump(result, cache_file, default=str)
+    os.replace(temporary_path, path)
+    evict_least_recently_used(cache_directory, max_bytes)
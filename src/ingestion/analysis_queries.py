@@ -0,0 +1,157 @@
+import logging
+import sys
+
+import pandas as pd
+
+import aggregate_cube
+from aggregate_cube import cube_version, month_start
+from analysis_cache import (cache_key, code_version, default_cache_max_bytes, read_cached_result,
+                            write_cached_result)
+
+# Each business question as a parameterized aggregate query over the monthly cube, never over the serving table
+# Work is proportional to the cube's size, and the queries run on both Azure SQL and the embedded SQLite stand-in
+analysis_queries = {
+    # 1 and 3: holdings and overall average interest by category
+    'holdings_by_category': """
+        SELECT security_type_desc,
+               SUM(debt_held_public_sum) AS debt_held_public_mil_amt,
+               SUM(intragov_hold_sum) AS intragov_hold_mil_amt,
+               SUM(rate_sum) / NULLIF(SUM(rate_count), 0) AS avg_interest_rate_amt
+        FROM f23_project.US_Treasury_monthly_cube
+        GROUP BY security_type_desc
+    """,
+    # 2: public holdings by category in the latest month
+    'latest_month_public_holdings': """
+        SELECT security_type_desc, SUM(debt_held_public_sum) AS debt_held_public_mil_amt
+        FROM f23_project.US_Treasury_monthly_cube
+        WHERE record_month = (SELECT MAX(record_month) FROM f23_project.US_Treasury_monthly_cube)
+        GROUP BY security_type_desc
+    """,
+    # 4 and 5: average interest by category from a month on
+    'average_interest_since': """
+        SELECT security_type_desc, SUM(rate_sum) / NULLIF(SUM(rate_count), 0) AS avg_interest_rate_amt
+        FROM f23_project.US_Treasury_monthly_cube
+        WHERE record_month >= ?
+        GROUP BY security_type_desc
+    """,
+    # 6 and 7: top N securities of each category by average interest from a month on
+    'top_securities_since': """
+        SELECT security_type_desc, security_desc, avg_interest_rate_amt
+        FROM (
+            SELECT security_type_desc, security_desc, SUM(rate_sum) / SUM(rate_count) AS avg_interest_rate_amt,
+                   ROW_NUMBER() OVER (PARTITION BY security_type_desc
+                                      ORDER BY SUM(rate_sum) / SUM(rate_count) DESC) AS rank_in_category
+            FROM f23_project.US_Treasury_monthly_cube
+            WHERE record_month >= ?
+            GROUP BY security_type_desc, security_desc
+            HAVING SUM(rate_count) > 0
+        ) ranked
+        WHERE rank_in_category <= ?
+        ORDER BY security_type_desc, rank_in_category
+    """,
+    # 8: the security with the highest interest rate between two months
+    'highest_interest_between': """
+        SELECT security_desc, rate_max AS avg_interest_rate_amt
+        FROM (
+            SELECT security_desc, rate_max, ROW_NUMBER() OVER (ORDER BY rate_max DESC) AS rank_in_period
+            FROM f23_project.US_Treasury_monthly_cube
+            WHERE record_month >= ? AND record_month < ? AND rate_max IS NOT NULL
+        ) ranked
+        WHERE rank_in_period = 1
+    """,
+}
+
+
+# Function to run one of the analysis queries and return its result as a small DataFrame
+def run_analysis_query(connection, query_name, params=()):
+    logging.info("running the analysis query " + query_name)
+    cursor = connection.cursor()
+    cursor.execute(analysis_queries[query_name], list(params))
+    columns = [description[0] for description in cursor.description]
+    return pd.DataFrame.from_records([tuple(row) for row in cursor.fetchall()], columns=columns)
+
+
+# Function to get a category's value from a per-category result, NaN when the category has no rows
+def category_value(result, category, column):
+    values = result.loc[result['security_type_desc'] == category, column]
+    return float(values.iloc[0]) if len(values) and pd.notna(values.iloc[0]) else float('nan')
+
+
+# Function to get the time-relative parameters of the analysis for a day, part of the cache key of its results
+def analysis_parameters(today=None):
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today).normalize()
+    # The cube's grain is a month and fiscaldata records are dated at month end, so months match the date filters
+    return {
+        'two_years_ago': month_start(today - pd.DateOffset(years=2)),
+        'year_start': f"{today.year}-01-01",
+        'next_year_start': f"{today.year + 1}-01-01",
+        'top_n': 3,
+    }
+
+
+# Function to compute every business answer from the monthly cube, with the query results it was derived from
+def compute_business_answers(connection, parameters):
+    holdings = run_analysis_query(connection, 'holdings_by_category')
+    holdings['total_holding'] = holdings['debt_held_public_mil_amt'] + holdings['intragov_hold_mil_amt']
+    public_holdings = run_analysis_query(connection, 'latest_month_public_holdings')
+    average_interest = run_analysis_query(connection, 'average_interest_since', [parameters['two_years_ago']])
+    top_securities = run_analysis_query(connection, 'top_securities_since',
+                                        [parameters['two_years_ago'], parameters['top_n']])
+    highest_interest = run_analysis_query(connection, 'highest_interest_between',
+                                          [parameters['year_start'], parameters['next_year_start']])
+
+    answers = {
+        # 1 Which category has more holdings
+        'max_holding_category': holdings.loc[holdings['total_holding'].idxmax(), 'security_type_desc'],
+        # 2 Which category has more public holdings
+        'max_public_holding_category':
+            'Marketable' if category_value(public_holdings, 'Marketable', 'debt_held_public_mil_amt') >
+                            category_value(public_holdings, 'Non-marketable', 'debt_held_public_mil_amt')
+            else 'Non-marketable',
+        # 3 Which category has good average tracks of returns(interest)
+        'highest_interest_category':
+            'Marketable' if category_value(holdings, 'Marketable', 'avg_interest_rate_amt') >
+                            category_value(holdings, 'Non-marketable', 'avg_interest_rate_amt')
+            else 'Non-Marketable',
+        # 4 and 5 The average interest return for each category in the last 2 years
+        'average_interest_marketable': category_value(average_interest, 'Marketable', 'avg_interest_rate_amt'),
+        'average_interest_non_marketable': category_value(average_interest, 'Non-marketable',
+                                                          'avg_interest_rate_amt'),
+        # 6 and 7 Top 3 securities of each category with good returns
+        'top_3_marketable':
+            top_securities.loc[top_securities['security_type_desc'] == 'Marketable', 'security_desc'].to_list(),
+        'top_3_non_marketable':
+            top_securities.loc[top_securities['security_type_desc'] == 'Non-marketable', 'security_desc'].to_list(),
+        # 8 The security with the highest average interest rate in the current year
+        'highest_avg_interest_security':
+            highest_interest['security_desc'].iloc[0] if len(highest_interest) else None,
+    }
+    intermediate_results = {
+        'holdings_by_category': holdings, 'latest_month_public_holdings': public_holdings,
+        'average_interest_since': average_interest, 'top_securities_since': top_securities,
+        'highest_interest_between': highest_interest,
+    }
+    return answers, intermediate_results
+
+
+# Function to answer every business question, today sets the time-relative questions
+# With a cache_directory the answers are memoized on the cube's version, the analysis code and the parameters
+def answer_business_questions(connection, today=None, cache_directory=None,
+                              cache_max_bytes=default_cache_max_bytes):
+    parameters = analysis_parameters(today)
+    if cache_directory is None:
+        return compute_business_answers(connection, parameters)[0]
+
+    key = cache_key(cube_version(connection), code_version([aggregate_cube, sys.modules[__name__]]), parameters)
+    cached_result = read_cached_result(cache_directory, key)
+    if cached_result is not None:
+        return cached_result['answers']
+
+    answers, intermediate_results = compute_business_answers(connection, parameters)
+    write_cached_result(cache_directory, key, {
+        'parameters': parameters,
+        'answers': answers,
+        'intermediate_results': {name: frame.to_dict(orient='split')
+                                 for name, frame in intermediate_results.items()},
+    }, cache_max_bytes)
+    return answers
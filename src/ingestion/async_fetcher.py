@@ -0,0 +1,257 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from fiscal_api import create_api_session, default_page_size
+from http_cache import (HttpCache, default_closed_after_days, default_closed_max_age_seconds, default_ttl_seconds,
+                        default_window_years, record_date_windows)
+from json_stream import decode_json, decode_page_columns, default_read_chunk_size, iter_file_chunks
+from metrics import add_to_counter, observe
+
+# Default limits shared by every dataset fetched by the process: open connections and requests started per second
+default_max_connections = 8
+default_requests_per_second = 10.0
+
+# Default retries of a page and the base and cap of the backoff between them, in seconds
+default_max_retries = 5
+default_backoff_seconds = 0.5
+default_max_backoff_seconds = 30.0
+
+# Statuses worth retrying: rate limited and transient server errors
+retry_status_codes = {429, 500, 502, 503, 504}
+
+
+# Spaces the requests started on an event loop evenly, at most requests_per_second of them (no limit when None)
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_start = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Function to get the wait before retry number attempt, the server's Retry-After when it sent one,
+# otherwise a random wait up to an exponentially growing cap so retrying clients do not stay in step
+def retry_delay(attempt, retry_after=None, backoff_seconds=default_backoff_seconds,
+                max_backoff_seconds=default_max_backoff_seconds):
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), max_backoff_seconds)
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_backoff_seconds, backoff_seconds * 2 ** attempt))
+
+
+# Function to run a coroutine with the context variables of the thread that asked for it, e.g. the metrics' stage
+async def run_in_context(context, coroutine):
+    for variable, value in context.items():
+        variable.set(value)
+    return await coroutine
+
+
+# Fetches fiscaldata endpoints on one event loop running in a background thread, so every dataset fetched by the
+# process shares the connection limit and the requests-per-second cap; the blocking requests calls run in a
+# thread pool with one thread per connection
+# With a cache, pages are answered from it when they are fresh and revalidated with conditional requests otherwise
+class AsyncFetcher:
+    def __init__(self, max_connections=default_max_connections, requests_per_second=default_requests_per_second,
+                 max_retries=default_max_retries, backoff_seconds=default_backoff_seconds,
+                 max_backoff_seconds=default_max_backoff_seconds, session=None, cache=None):
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.session = session or create_api_session(max_connections)
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=max_connections,
+                                                                             thread_name_prefix="fiscaldata"))
+        self.thread = threading.Thread(target=self.loop.run_forever, name="fiscaldata-loop", daemon=True)
+        self.thread.start()
+        self.connections = asyncio.Semaphore(max_connections)
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+    # Function to decode a page body arriving as byte chunks: the whole document when fields is None, otherwise its
+    # records are streamed into columns of fields and page_handler, when given, turns the columns into the page's data
+    def decode_page(self, chunks, fields=None, page_handler=None):
+        if fields is None:
+            return decode_json(b''.join(chunks))
+        page = decode_page_columns(chunks, fields)
+        if page_handler is not None:
+            page['data'] = page_handler(page['data'])
+        return page
+
+    # Function to decode a page from the cache when it can be served without asking the server, run in the thread
+    # pool, returns None when the page needs a request
+    def get_cached(self, base_url, params, fields=None, page_handler=None):
+        entry = self.cache.lookup(base_url, params) if self.cache else None
+        if entry is None or not self.cache.is_fresh(entry, params):
+            return None
+        add_to_counter('http_cache_hits', 1)
+        return self.decode_page(iter_file_chunks(self.cache.body_path(entry)), fields, page_handler)
+
+    # Function to send one GET request and decode its body as it arrives, run in the thread pool, returns the response
+    # and the decoded page (None when the request failed); a cached page is revalidated with a conditional request
+    def get(self, base_url, params, fields=None, page_handler=None):
+        entry = self.cache.lookup(base_url, params) if self.cache else None
+        start = time.perf_counter()
+        response = self.session.get(base_url, params=params, stream=True,
+                                    headers=self.cache.conditional_headers(entry) if self.cache else None)
+        if response.status_code == 304 and entry is not None:
+            # The server confirmed the cached page, only the headers crossed the network
+            response.close()
+            observe('api_page_seconds', time.perf_counter() - start)
+            add_to_counter('http_cache_revalidated', 1)
+            self.cache.refresh(entry)
+            return response, self.decode_page(iter_file_chunks(self.cache.body_path(entry)), fields, page_handler)
+        if response.status_code != 200:
+            add_to_counter('bytes_downloaded', len(response.content))
+            observe('api_page_seconds', time.perf_counter() - start)
+            return response, None
+
+        # Function to count the body's bytes as they are read, after any gzip decoding
+        def counted(chunks):
+            for chunk in chunks:
+                add_to_counter('bytes_downloaded', len(chunk))
+                yield chunk
+
+        chunks = counted(response.iter_content(default_read_chunk_size))
+        if self.cache:
+            add_to_counter('http_cache_misses', 1)
+            chunks = self.cache.store_chunks(base_url, params, response.headers, chunks)
+        page = self.decode_page(chunks, fields, page_handler)
+        observe('api_page_seconds', time.perf_counter() - start)
+        return response, page
+
+    # Function to fetch a single page, retrying rate limited, failed and unreachable requests with backoff
+    async def fetch_page(self, base_url, params, page_number, page_size, fields=None, page_handler=None):
+        page_params = dict(params)
+        page_params['page[number]'] = page_number
+        page_params['page[size]'] = page_size
+        # A fresh cached page is served without taking a connection or waiting on the rate cap
+        if self.cache:
+            page = await asyncio.to_thread(self.get_cached, base_url, page_params, fields, page_handler)
+            if page is not None:
+                return page
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self.connections:
+                    await self.rate_limiter.wait()
+                    response, page = await asyncio.to_thread(self.get, base_url, page_params, fields, page_handler)
+                if page is not None:
+                    return page
+                error = requests.HTTPError(f"API request for page {page_number} failed with status code: "
+                                           f"{response.status_code}", response=response)
+                if response.status_code not in retry_status_codes:
+                    raise error
+                retry_after = response.headers.get('Retry-After')
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as excep:
+                error = excep
+
+            if attempt == self.max_retries:
+                raise error
+            delay = retry_delay(attempt, retry_after, self.backoff_seconds, self.max_backoff_seconds)
+            add_to_counter('api_retries', 1)
+            logging.warning(f"page {page_number} of {base_url} failed ({error}), retry {attempt + 1} of "
+                            f"{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    # Function to fetch every page of a fiscaldata endpoint and return each page's data in page order
+    async def fetch_pages_async(self, base_url, params, page_size=None, fields=None, page_handler=None):
+        if page_size is None:
+            page_size = params.get('page[size]', default_page_size)
+
+        # The first page tells us how many pages there are in total
+        logging.info(f"Fetching page 1 from {base_url}")
+        first_page = await self.fetch_page(base_url, params, 1, page_size, fields, page_handler)
+        total_pages = int(first_page.get('meta', {}).get('total-pages', 1) or 1)
+        logging.info(f"{base_url} has {total_pages} page(s) of size {page_size}")
+
+        # The remaining pages are requested together, the connection limit and rate cap pace them
+        pages = await asyncio.gather(*(self.fetch_page(base_url, params, page_number, page_size, fields, page_handler)
+                                       for page_number in range(2, total_pages + 1)))
+        return [first_page['data']] + [page['data'] for page in pages]
+
+    # Function to fetch every page of a fiscaldata endpoint and return the records in page order
+    async def fetch_all_pages_async(self, base_url, params, page_size=None):
+        pages = await self.fetch_pages_async(base_url, params, page_size)
+        list_of_records = [record for page in pages for record in page]
+        logging.info(f"Fetched {len(list_of_records)} records from {base_url}")
+        return list_of_records
+
+    # Function to fetch every page of an endpoint from any thread, blocking until every page is in, returns each page's
+    # data in order: its records, or with fields the columns of its records passed through page_handler when given
+    # With a cache and window_years the request is split into record_date windows fetched together, so the pages of
+    # past windows stay the same between runs and are served by the cache; the windows' pages are returned in the
+    # request's record_date order, the same rows in the same order as the whole request; without a cache every
+    # window would cost its own requests, so the request is fetched whole
+    def fetch_pages(self, base_url, params, page_size=None, window_years=default_window_years, fields=None,
+                    page_handler=None):
+        async def fetch_windows():
+            windows = record_date_windows(params, window_years=window_years) if self.cache else [params]
+            pages = await asyncio.gather(*(self.fetch_pages_async(base_url, window_params, page_size, fields,
+                                                                  page_handler)
+                                           for window_params in windows))
+            return [page for window_pages in pages for page in window_pages]
+
+        return asyncio.run_coroutine_threadsafe(run_in_context(contextvars.copy_context(), fetch_windows()),
+                                                self.loop).result()
+
+    # Function to fetch every page of an endpoint from any thread and return the records in page order
+    def fetch_all_pages(self, base_url, params, page_size=None, window_years=default_window_years):
+        pages = self.fetch_pages(base_url, params, page_size, window_years)
+        return [record for page in pages for record in page]
+
+    # Function to fetch several endpoints at once, requests_by_name maps a name to (base_url, params, page_size)
+    def fetch_many(self, requests_by_name):
+        async def fetch_each():
+            results = await asyncio.gather(*(self.fetch_all_pages_async(base_url, params, page_size)
+                                             for base_url, params, page_size in requests_by_name.values()))
+            return dict(zip(requests_by_name, results))
+
+        return asyncio.run_coroutine_threadsafe(run_in_context(contextvars.copy_context(), fetch_each()),
+                                                self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.session.close()
+
+
+async_fetchers = {}
+async_fetchers_lock = threading.Lock()
+
+
+# Function to get the process-wide fetcher, created once for each configuration
+# cache_directory None fetches every page from the server
+def get_async_fetcher(max_connections=default_max_connections, requests_per_second=default_requests_per_second,
+                      max_retries=default_max_retries, cache_directory=None, cache_ttl_seconds=default_ttl_seconds,
+                      cache_closed_after_days=default_closed_after_days,
+                      cache_closed_max_age_seconds=default_closed_max_age_seconds):
+    key = (max_connections, requests_per_second, max_retries, cache_directory, cache_ttl_seconds,
+           cache_closed_after_days, cache_closed_max_age_seconds)
+    with async_fetchers_lock:
+        if key not in async_fetchers:
+            logging.info(f"creating the fiscaldata fetcher with {max_connections} connections and "
+                         f"{requests_per_second} requests per second")
+            cache = HttpCache(cache_directory, cache_ttl_seconds, cache_closed_after_days,
+                              cache_closed_max_age_seconds) if cache_directory else None
+            async_fetchers[key] = AsyncFetcher(max_connections, requests_per_second, max_retries, cache=cache)
+        return async_fetchers[key]
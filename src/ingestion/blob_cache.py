@@ -0,0 +1,198 @@
+import contextlib
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+
+from metrics import add_to_counter
+from parquet_storage import RangedReader
+
+# Default directory and total size bound of the local copies of downloaded blobs
+default_blob_cache_directory = "../blob_cache"
+default_blob_cache_max_bytes = 2 * 1024 * 1024 * 1024
+
+# Downloads of a blob that keeps changing while its ranges are read, before the read fails
+max_download_attempts = 3
+
+
+# Read-through cache of blobs on the local disk, one body file and one metadata file per blob
+# Each read asks the storage for the blob's ETag only, a matching local copy is memory-mapped instead of downloaded;
+# the copies least recently read are evicted once they add up to more than max_bytes
+class BlobCache:
+    def __init__(self, storage, directory=default_blob_cache_directory, max_bytes=default_blob_cache_max_bytes):
+        self.storage = storage
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_path(self, container_name, blob_name):
+        key = hashlib.sha256(f"{container_name}/{blob_name}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key)
+
+    # Function to get the metadata of a cached blob, None when the blob is not cached
+    def lookup(self, path):
+        try:
+            with open(path + ".json", 'r') as metadata_file:
+                entry = json.load(metadata_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        return entry if os.path.exists(path + ".blob") else None
+
+    # Function to stream a blob to a temporary file in ranges, returns the file, its size and the blob's ETag
+    # The ETag is asked again after the last range, a blob replaced in between is downloaded again so the copy never
+    # mixes two versions; returns None when the blob no longer exists
+    def download(self, path, container_name, blob_name, etag):
+        temporary_path = f"{path}.blob.{threading.get_ident()}.tmp"
+        for _ in range(max_download_attempts):
+            size = 0
+            try:
+                with open(temporary_path, 'wb') as body_file:
+                    for chunk in self.storage.iter_chunks(container_name, blob_name):
+                        body_file.write(chunk)
+                        size += len(chunk)
+            except Exception:
+                os.remove(temporary_path)
+                raise
+            current_etag = self.storage.blob_etag(container_name, blob_name)
+            if current_etag == etag:
+                return temporary_path, size, etag
+            etag = current_etag
+            if etag is None:
+                os.remove(temporary_path)
+                return None
+        os.remove(temporary_path)
+        raise RuntimeError(f"{container_name}/{blob_name} changed during each of {max_download_attempts} downloads")
+
+    # Function to store a downloaded blob with its ETag, the metadata is written last so a half written body
+    # is never served
+    def store(self, path, container_name, blob_name, temporary_path, size, etag):
+        with open(path + ".json.tmp", 'w') as metadata_file:
+            json.dump({'container': container_name, 'blob': blob_name, 'etag': etag, 'size': size}, metadata_file)
+        os.replace(temporary_path, path + ".blob")
+        os.replace(path + ".json.tmp", path + ".json")
+
+    def remove(self, path):
+        for suffix in (".json", ".blob"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+
+    # Function to remove the least recently read blobs until the cache fits in max_bytes, keeping the one at keep_path
+    def evict_least_recently_used(self, keep_path=None):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".blob"):
+                entry_stat = entry.stat()
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path[:-len(".blob")]))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                self.remove(path)
+            except OSError as e:
+                # A blob still mapped by another reader cannot be removed on every platform, it goes next time
+                logging.warning(f"could not evict {path} from the blob cache: {e}")
+                continue
+            total_bytes -= size
+            logging.info(f"evicted {path} from the blob cache")
+
+    # Function to open the local copy of a blob when it matches the blob's ETag, None otherwise
+    # The body is opened under the lock, so an eviction by another reader cannot remove it in between
+    def open_current(self, path, container_name, blob_name, etag):
+        with self.lock:
+            entry = self.lookup(path)
+            if entry is None or entry['etag'] != etag:
+                return None
+            # Reading an entry marks it as recently used for the eviction
+            os.utime(path + ".blob")
+            body_file = open(path + ".blob", 'rb')
+        add_to_counter('blob_cache_hits', 1)
+        add_to_counter('blob_cache_bytes_saved', entry['size'])
+        logging.info(f"blob cache hit for {container_name}/{blob_name}")
+        return body_file
+
+    # Function to yield an opened local copy memory-mapped, closing it after the with block
+    @contextlib.contextmanager
+    def map_body(self, body_file):
+        with body_file:
+            if os.fstat(body_file.fileno()).st_size == 0:
+                # Empty files cannot be mapped
+                yield b''
+                return
+            with mmap.mmap(body_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    # Function to read a blob through the cache, yields it memory-mapped (None when the blob does not exist)
+    # The mapping is only valid inside the with block, readers parse it in place without copying the whole blob
+    @contextlib.contextmanager
+    def open_mapped(self, container_name, blob_name):
+        path = self.entry_path(container_name, blob_name)
+        etag = self.storage.blob_etag(container_name, blob_name)
+        if etag is None:
+            with self.lock:
+                self.remove(path)
+            yield None
+            return
+
+        body_file = self.open_current(path, container_name, blob_name, etag)
+        if body_file is None:
+            add_to_counter('blob_cache_misses', 1)
+            downloaded = self.download(path, container_name, blob_name, etag)
+            if downloaded is None:
+                yield None
+                return
+            with self.lock:
+                self.store(path, container_name, blob_name, *downloaded)
+                self.evict_least_recently_used(keep_path=path)
+                body_file = open(path + ".blob", 'rb')
+
+        with self.map_body(body_file) as mapped:
+            yield mapped
+
+    # Function to read a blob from its local copy only, yields it memory-mapped when the copy is current and None
+    # otherwise; a miss downloads nothing, for readers that fetch just the ranges they need themselves
+    @contextlib.contextmanager
+    def open_mapped_if_cached(self, container_name, blob_name):
+        path = self.entry_path(container_name, blob_name)
+        etag = self.storage.blob_etag(container_name, blob_name)
+        body_file = None if etag is None else self.open_current(path, container_name, blob_name, etag)
+        if body_file is None:
+            add_to_counter('blob_cache_misses', 1)
+            yield None
+            return
+
+        with self.map_body(body_file) as mapped:
+            yield mapped
+
+    # Function to read a blob's bytes through the cache, None when the blob does not exist
+    def read_bytes(self, container_name, blob_name):
+        with self.open_mapped(container_name, blob_name) as mapped:
+            return None if mapped is None else bytes(mapped)
+
+
+# Function to get a seekable file object over a mapped blob for pd.read_csv and pyarrow, reads copy only the ranges
+# they ask for out of the mapping
+def mapped_reader(mapped):
+    return RangedReader(lambda offset, length: mapped[offset:offset + length], len(mapped))
+
+
+blob_caches = {}
+blob_caches_lock = threading.Lock()
+
+
+# Function to get the process-wide blob cache of a storage backend, created once for each configuration
+def get_blob_cache(storage, directory=default_blob_cache_directory, max_bytes=default_blob_cache_max_bytes):
+    key = (id(storage), directory, max_bytes)
+    with blob_caches_lock:
+        if key not in blob_caches:
+            logging.info(f"creating the blob cache in {directory} of at most {max_bytes} bytes")
+            blob_caches[key] = BlobCache(storage, directory, max_bytes)
+        return blob_caches[key]
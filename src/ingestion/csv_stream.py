@@ -0,0 +1,22 @@
+# Size of each encoded CSV chunk, also the size of each staged block on upload
+default_chunk_size = 4 * 1024 * 1024
+
+
+# Function to encode a DataFrame as correctly quoted CSV and yield it as byte chunks of chunk_rows rows
+def iter_dataframe_csv_chunks(df, header, chunk_rows=100000, include_header=True):
+    # A frame without rows is still written with its header, as to_csv writes it
+    if df.empty and include_header:
+        yield df.to_csv(index=False, columns=header, lineterminator='\n').encode('utf-8')
+    for start in range(0, len(df), chunk_rows):
+        csv_data = df.iloc[start:start + chunk_rows].to_csv(index=False, header=include_header and start == 0,
+                                                            columns=header, lineterminator='\n')
+        yield csv_data.encode('utf-8')
+
+
+# Function to encode a sequence of DataFrames as one CSV, with the header only before the first row
+def iter_frames_csv_chunks(frames, header=None, chunk_rows=100000):
+    header_written = False
+    for df in frames:
+        for chunk in iter_dataframe_csv_chunks(df, header, chunk_rows, include_header=not header_written):
+            header_written = True
+            yield chunk
@@ -0,0 +1,74 @@
+import concurrent.futures
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import add_to_counter, in_current_context, observe
+
+# Default paging configuration for the fiscaldata API
+default_page_size = 10000
+default_max_workers = 4
+
+
+# Function to create a pooled requests session sized for the number of workers
+def create_api_session(max_workers=default_max_workers):
+    session = requests.Session()
+    # Page bodies may come gzip encoded, requests decodes them as they are read
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Function to fetch a single page from a fiscaldata endpoint
+def fetch_page(session, base_url, params, page_number, page_size):
+    page_params = dict(params)
+    page_params['page[number]'] = page_number
+    page_params['page[size]'] = page_size
+    start = time.perf_counter()
+    response = session.get(base_url, params=page_params)
+    observe('api_page_seconds', time.perf_counter() - start)
+    add_to_counter('bytes_downloaded', len(response.content))
+    if response.status_code != 200:
+        raise requests.HTTPError(f"API request for page {page_number} failed with status code: "
+                                 f"{response.status_code}", response=response)
+    return response.json()
+
+
+# Function to fetch every page of a fiscaldata endpoint and return the records in page order
+def fetch_all_pages(base_url, params, page_size=None, max_workers=default_max_workers, session=None):
+    if page_size is None:
+        page_size = params.get('page[size]', default_page_size)
+
+    own_session = session is None
+    if own_session:
+        session = create_api_session(max_workers)
+
+    try:
+        # The first page tells us how many pages there are in total
+        logging.info(f"Fetching page 1 from {base_url}")
+        first_page = fetch_page(session, base_url, params, 1, page_size)
+        total_pages = int(first_page.get('meta', {}).get('total-pages', 1) or 1)
+        list_of_records = list(first_page['data'])
+        logging.info(f"{base_url} has {total_pages} page(s) of size {page_size}")
+
+        if total_pages > 1:
+            # Fetch the remaining pages in parallel; map keeps them in page order
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # The pages are recorded in the metrics of the stage that fetches them
+                pages = executor.map(
+                    in_current_context(
+                        lambda page_number: fetch_page(session, base_url, params, page_number, page_size)['data']),
+                    range(2, total_pages + 1))
+                for page_records in pages:
+                    list_of_records.extend(page_records)
+
+        logging.info(f"Fetched {len(list_of_records)} records from {base_url}")
+        return list_of_records
+
+    finally:
+        if own_session:
+            session.close()
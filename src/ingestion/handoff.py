@@ -0,0 +1,25 @@
+import pandas as pd
+
+from schema import apply_schema, dtype_for, missing_value_strings
+
+# Function to type a DataFrame of the API's string values into the schema's dtypes, the dtypes readers load with
+# Columns outside the schema become numeric when every value parses, the way pd.read_csv would type them
+def typed_dataframe(df):
+    df = apply_schema(df.mask(df.isin(missing_value_strings)))
+    for column in df.columns:
+        if dtype_for(column) is not None:
+            continue
+        try:
+            df[column] = pd.to_numeric(df[column])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+
+# Function to confirm the stored copy of a handed-off frame holds the bytes uploaded from it, raises when it does not
+# content_md5 is the MD5 digest of the bytes as they were uploaded, compared with the MD5 of the stored blob
+def verify_stored_copy(storage, container_name, blob_name, content_md5):
+    stored_md5 = storage.blob_content_md5(container_name, blob_name)
+    if stored_md5 != content_md5:
+        raise RuntimeError(f"{blob_name} in {container_name} does not hold the uploaded data: stored MD5 "
+                           f"{stored_md5.hex() if stored_md5 is not None else None}, uploaded MD5 {content_md5.hex()}")
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import time
+from datetime import date, timedelta
+
+# Default directory of the cached API responses, one metadata file and one body file per request
+default_cache_directory = "../http_cache"
+
+# Default lifetime of a cached response the server sent no ETag or Last-Modified for
+default_ttl_seconds = 3600
+
+# Default age after which a month is closed: requests whose record_date range ends before it never change
+default_closed_after_days = 45
+
+# Default age after which a response of a closed request is revalidated anyway, so upstream corrections to past months
+# still arrive; revalidating an unchanged response costs one 304 without a body
+default_closed_max_age_seconds = 7 * 24 * 3600
+
+# Default length of the record_date windows a request is split into, so past windows become closed requests
+default_window_years = 1
+
+
+# Function to split a filter into its conditions, "record_date:gte:2000-01-01" -> ("record_date", "gte", "2000-01-01")
+def parse_filter(filter_value):
+    return [tuple(condition.split(':', 2)) for condition in (filter_value or '').split(',') if condition]
+
+
+# Function to join conditions back into a filter
+def format_filter(conditions):
+    return ','.join(':'.join(condition) for condition in conditions)
+
+
+# Function to get the newest record_date a request can return, None when its range is open
+def request_end_date(params):
+    end_dates = [value for field, operator, value in parse_filter(params.get('filter'))
+                 if field == 'record_date' and operator in ('lte', 'lt', 'eq')]
+    return min(end_dates) if end_dates else None
+
+
+# Function to check whether a request only covers closed months, so its response never changes
+def is_closed_request(params, today=None, closed_after_days=default_closed_after_days):
+    end_date = request_end_date(params)
+    today = today or date.today()
+    return end_date is not None and end_date < (today - timedelta(days=closed_after_days)).isoformat()
+
+
+# Function to split a request with a record_date lower bound into window_years long record_date windows
+# Every window but the newest has an upper bound, so once its months are closed its pages are served from the cache
+# The windows only differ from the request in their record_date bounds and are listed in the request's record_date
+# order, the API's default being ascending, so their pages put together hold the rows in the request's order;
+# a request sorted on another field is not split
+def record_date_windows(params, today=None, window_years=default_window_years):
+    conditions = parse_filter(params.get('filter'))
+    lower_bounds = [value for field, operator, value in conditions
+                    if field == 'record_date' and operator in ('gte', 'gt')]
+    sort = params.get('sort', 'record_date')
+    if not window_years or not lower_bounds or request_end_date(params) is not None or \
+            sort not in ('record_date', '-record_date'):
+        return [params]
+
+    today = today or date.today()
+    windows = []
+    window_start_year = int(max(lower_bounds)[:4])
+    while window_start_year <= today.year:
+        window_end_year = window_start_year + window_years - 1
+        window_conditions = list(conditions)
+        if window_start_year > int(max(lower_bounds)[:4]):
+            window_conditions = [condition for condition in conditions
+                                 if condition[0] != 'record_date' or condition[1] not in ('gte', 'gt')]
+            window_conditions.append(('record_date', 'gte', f"{window_start_year}-01-01"))
+        if window_end_year < today.year:
+            window_conditions.append(('record_date', 'lte', f"{window_end_year}-12-31"))
+        windows.append({**params, 'filter': format_filter(window_conditions)})
+        window_start_year = window_end_year + 1
+    if not windows:
+        return [params]
+    return windows[::-1] if sort == '-record_date' else windows
+
+
+# On-disk cache of API responses keyed by url and parameters, revalidated with the server's ETag and Last-Modified
+class HttpCache:
+    def __init__(self, directory=default_cache_directory, ttl_seconds=default_ttl_seconds,
+                 closed_after_days=default_closed_after_days, closed_max_age_seconds=default_closed_max_age_seconds):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.closed_after_days = closed_after_days
+        self.closed_max_age_seconds = closed_max_age_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_path(self, base_url, params):
+        key_source = json.dumps([base_url, sorted((str(name), str(value)) for name, value in params.items())])
+        return os.path.join(self.directory, hashlib.sha256(key_source.encode('utf-8')).hexdigest())
+
+    # Function to get the cached entry of a request, None when the request was never cached
+    def lookup(self, base_url, params):
+        path = self.entry_path(base_url, params)
+        try:
+            with open(path + ".json", 'r') as metadata_file:
+                entry = json.load(metadata_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        entry['path'] = path
+        return entry
+
+    # Function to check whether an entry can be served without asking the server
+    # A closed request is served for closed_max_age_seconds since it was stored or last revalidated, None for ever
+    def is_fresh(self, entry, params):
+        age = time.time() - entry['stored_at']
+        if is_closed_request(params, closed_after_days=self.closed_after_days):
+            return self.closed_max_age_seconds is None or age < self.closed_max_age_seconds
+        has_validators = entry.get('etag') or entry.get('last_modified')
+        return not has_validators and age < self.ttl_seconds
+
+    # Function to get the headers that ask the server to answer 304 when the cached entry is still current
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def body_path(self, entry):
+        return entry['path'] + ".body"
+
+    # Function to cache a response's body with its validators while its chunks are passed on to the caller,
+    # the entry replaces the previous one once the last chunk has been read
+    def store_chunks(self, base_url, params, headers, chunks):
+        path = self.entry_path(base_url, params)
+        with open(path + ".body.tmp", 'wb') as body_file:
+            for chunk in chunks:
+                body_file.write(chunk)
+                yield chunk
+        os.replace(path + ".body.tmp", path + ".body")
+        self.write_metadata(path, {'url': base_url, 'params': params, 'etag': headers.get('ETag'),
+                                   'last_modified': headers.get('Last-Modified'), 'stored_at': time.time()})
+
+    # Function to restart the lifetime of an entry the server confirmed with a 304
+    def refresh(self, entry):
+        metadata = {name: value for name, value in entry.items() if name != 'path'}
+        self.write_metadata(entry['path'], {**metadata, 'stored_at': time.time()})
+
+    def write_metadata(self, path, metadata):
+        with open(path + ".json.tmp", 'w') as metadata_file:
+            json.dump(metadata, metadata_file, default=str)
+        os.replace(path + ".json.tmp", path + ".json")
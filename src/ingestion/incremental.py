@@ -0,0 +1,82 @@
+import json
+import re
+from datetime import datetime, timezone
+
+# Name of the watermark blob kept next to each dataset's partitions
+watermark_blob_name = "_watermark.json"
+
+# Starting point for the very first incremental run of a dataset
+default_watermark = "2000-01-01"
+
+partition_pattern = re.compile(r"/year=(\d{4})/month=(\d{2})/")
+
+
+# Function to get the blob path of a dataset's watermark
+def watermark_path(directory_name):
+    return f"{directory_name}/{watermark_blob_name}"
+
+
+# Function to read the record_date high-watermark out of a watermark blob's text
+def parse_watermark(watermark_text):
+    if not watermark_text:
+        return None
+    return json.loads(watermark_text).get("record_date")
+
+
+# Function to build the watermark blob's text for the newest of the record_dates
+def build_watermark(record_dates, previous_watermark=None):
+    record_dates = [str(record_date) for record_date in record_dates if record_date]
+    if previous_watermark:
+        record_dates.append(previous_watermark)
+    if not record_dates:
+        return None
+    return json.dumps({
+        "record_date": max(record_dates),
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    })
+
+
+# Function to ask the API only for records newer than the watermark
+def incremental_params(params, watermark):
+    new_params = dict(params)
+    if watermark:
+        new_params['filter'] = f"record_date:gt:{watermark}"
+    else:
+        new_params['filter'] = f"record_date:gte:{default_watermark}"
+    return new_params
+
+
+# Function to get the partition blob path of a record_date (YYYY-MM-DD)
+def partition_path(directory_name, record_date, upload_file):
+    year, month = record_date[:4], record_date[5:7]
+    return f"{directory_name}/year={year}/month={month}/{upload_file}"
+
+
+# Function to split a frame of records into the partition blob paths they belong to
+def group_frame_by_partition(df, directory_name, upload_file):
+    partitions = {}
+    for year_month, partition_df in df.groupby(df['record_date'].astype(str).str[:7], sort=True):
+        partitions[partition_path(directory_name, year_month, upload_file)] = partition_df
+    return partitions
+
+
+# Function to keep the rows of a stored partition that are not newer than the watermark
+# Newer rows were written by a run that failed before it moved the watermark, this run fetches them again, so a
+# partition rewritten from the kept rows and the fetched rows is the same whether or not the run is a retry
+def rows_at_or_before_watermark(df, watermark):
+    if not watermark:
+        return df.iloc[0:0]
+    return df[~(df['record_date'].astype(str) > watermark)]
+
+
+# Function to check whether a partition blob can hold rows between start_date and end_date
+def partition_in_range(blob_name, start_date=None, end_date=None):
+    match = partition_pattern.search(blob_name)
+    if not match:
+        return False
+    partition_month = f"{match.group(1)}-{match.group(2)}"
+    if start_date and partition_month < str(start_date)[:7]:
+        return False
+    if end_date and partition_month > str(end_date)[:7]:
+        return False
+    return True
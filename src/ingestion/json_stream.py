@@ -0,0 +1,92 @@
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Size of the body chunks read from a response or a cached file
+default_read_chunk_size = 64 * 1024
+
+# Start of the records array of a fiscaldata response
+data_array_pattern = re.compile(rb'"data"\s*:\s*\[')
+whitespace_and_commas = b' \t\r\n,'
+
+
+# Function to decode a JSON document, with orjson when it is installed
+def decode_json(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Function to decode a fiscaldata response body arriving as byte chunks into columns of fields
+# The records of each chunk are decoded as they arrive and their fields appended to the columns, so the page never
+# exists as one list of dicts; the rest of the document (meta, links) is returned with "data" set to the columns
+def decode_page_columns(chunks, fields):
+    columns = {field: [] for field in fields}
+    column_lists = [(field, columns[field]) for field in fields]
+    buffer = b''
+    prefix = None
+    position = 0
+    tail_start = None
+    for chunk in chunks:
+        buffer += chunk
+        if prefix is None:
+            match = data_array_pattern.search(buffer)
+            if match is None:
+                continue
+            prefix = buffer[:match.start()]
+            position = match.end()
+        if tail_start is not None:
+            continue
+
+        while True:
+            while position < len(buffer) and buffer[position] in whitespace_and_commas:
+                position += 1
+            if position >= len(buffer):
+                break
+            if buffer[position] == ord(']'):
+                tail_start = position + 1
+                break
+            # Every complete record in the buffer is decoded in one call, as an array ending at the last '}' that
+            # closes a record; a '}' inside a string, a nested object or the rest of the document leaves the array
+            # undecodable, so the search moves back to the previous '}'
+            records = None
+            end = buffer.rfind(b'}', position)
+            while end != -1:
+                try:
+                    records = decode_json(b'[' + buffer[position:end + 1] + b']')
+                    break
+                except ValueError:
+                    end = buffer.rfind(b'}', position, end)
+            if records is None:
+                break
+            for field, column in column_lists:
+                column.extend([record.get(field) for record in records])
+            position = end + 1
+
+        if tail_start is None:
+            # Drop the decoded records from the buffer, keeping the record still arriving
+            buffer = buffer[position:]
+            position = 0
+
+    if prefix is None:
+        # Not a records response, e.g. an error document
+        return decode_json(buffer)
+    if tail_start is None:
+        raise ValueError("the response ended inside its data array")
+    document = decode_json(prefix + b'"data":null' + buffer[tail_start:])
+    document['data'] = columns
+    return document
+
+
+# Function to read a file as byte chunks
+def iter_file_chunks(path, chunk_size=default_read_chunk_size):
+    with open(path, 'rb') as body_file:
+        while True:
+            chunk = body_file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,157 @@
+import contextlib
+import contextvars
+import json
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Default paths of the run report, the report history and the Prometheus text-format file
+default_run_report_path = "../project_logs/run_report.json"
+default_run_history_path = "../project_logs/run_history.jsonl"
+default_prometheus_path = "../project_logs/metrics.prom"
+
+# Prefix of every exported metric name
+metric_prefix = "treasury_pipeline"
+
+# Stage the current code runs for, metrics recorded outside any stage are labelled "pipeline"
+current_stage = contextvars.ContextVar('current_stage', default='pipeline')
+
+metrics_lock = threading.Lock()
+stage_spans = {}
+counters = {}
+observations = {}
+
+
+# Function to clear every recorded metric, at the start of a run
+def reset_metrics():
+    with metrics_lock:
+        stage_spans.clear()
+        counters.clear()
+        observations.clear()
+
+
+# Function to add to a counter of the current stage, e.g. bytes or rows
+def add_to_counter(name, value, stage=None):
+    key = (name, stage or current_stage.get())
+    with metrics_lock:
+        counters[key] = counters.get(key, 0) + value
+
+
+# Function to record one observation of a distribution for the current stage, e.g. a page latency
+def observe(name, value, stage=None):
+    key = (name, stage or current_stage.get())
+    with metrics_lock:
+        observations.setdefault(key, []).append(value)
+
+
+# Function to get the peak resident memory of the process in bytes, None where the platform does not report it
+def peak_memory_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Function to run a function in a copy of the caller's context, so worker threads record for the caller's stage
+def in_current_context(function):
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(function, *args, **kwargs)
+
+
+# Context manager timing a stage, everything recorded inside it (in this thread) is labelled with the stage
+@contextlib.contextmanager
+def stage_span(stage):
+    token = current_stage.set(stage)
+    span = {'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'status': 'running'}
+    with metrics_lock:
+        stage_spans[stage] = span
+    start = time.perf_counter()
+    try:
+        yield span
+        span['status'] = 'succeeded'
+    except BaseException:
+        span['status'] = 'failed'
+        raise
+    finally:
+        span['wall_seconds'] = time.perf_counter() - start
+        span['peak_memory_bytes'] = peak_memory_bytes()
+        current_stage.reset(token)
+
+
+# Function to summarize a list of observations
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'sum': sum(ordered),
+        'max': ordered[-1],
+        'p50': ordered[(len(ordered) - 1) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+# Function to build the run report: per stage its span, counters and observation summaries
+def build_run_report(run_id=None):
+    with metrics_lock:
+        report_stages = {stage: dict(span) for stage, span in stage_spans.items()}
+        for (name, stage), value in counters.items():
+            report_stages.setdefault(stage, {})[name] = value
+        for (name, stage), values in observations.items():
+            report_stages.setdefault(stage, {})[name] = summarize(values)
+    for stage_metrics in report_stages.values():
+        if stage_metrics.get('sql_load_seconds'):
+            stage_metrics['sql_rows_per_second'] = (stage_metrics.get('sql_rows_loaded', 0) /
+                                                    stage_metrics['sql_load_seconds'])
+    return {'run_id': run_id, 'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'peak_memory_bytes': peak_memory_bytes(), 'stages': report_stages}
+
+
+# Function to format a metric line of the Prometheus text format
+def prometheus_line(name, labels, value):
+    label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+    return f"{metric_prefix}_{name}{{{label_text}}} {value}"
+
+
+# Function to render the run report in the Prometheus text exposition format
+def prometheus_text(report):
+    lines = {}
+    for stage, stage_metrics in sorted(report['stages'].items()):
+        for name, value in sorted(stage_metrics.items()):
+            if isinstance(value, dict):
+                metric_lines = lines.setdefault((name, 'summary'), [])
+                for quantile, key in (('0.5', 'p50'), ('0.95', 'p95')):
+                    metric_lines.append(prometheus_line(name, {'stage': stage, 'quantile': quantile}, value[key]))
+                metric_lines.append(prometheus_line(name + "_sum", {'stage': stage}, value['sum']))
+                metric_lines.append(prometheus_line(name + "_count", {'stage': stage}, value['count']))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.setdefault((name, 'gauge'), []).append(prometheus_line(name, {'stage': stage}, value))
+            elif name == 'status':
+                lines.setdefault(('stage_succeeded', 'gauge'), []).append(
+                    prometheus_line('stage_succeeded', {'stage': stage}, int(value == 'succeeded')))
+
+    text = []
+    for (name, metric_type), metric_lines in sorted(lines.items()):
+        text.append(f"# TYPE {metric_prefix}_{name} {metric_type}")
+        text.extend(metric_lines)
+    return '\n'.join(text) + '\n'
+
+
+# Function to write the run report as JSON, append it to the run history and write the Prometheus file
+def write_run_report(run_id=None, report_path=default_run_report_path, history_path=default_run_history_path,
+                     prometheus_path=default_prometheus_path):
+    report = build_run_report(run_id)
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2, default=str)
+    if history_path:
+        with open(history_path, 'a') as history_file:
+            history_file.write(json.dumps(report, default=str) + '\n')
+    if prometheus_path:
+        with open(prometheus_path, 'w') as prometheus_file:
+            prometheus_file.write(prometheus_text(report))
+    return report
@@ -0,0 +1,237 @@
+import io
+from datetime import date
+
+from schema import missing_value_strings
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    pq = None
+
+# Rows per Parquet row group, row group statistics on record_date are what lets readers skip data
+default_row_group_size = 10000
+
+date_columns = ['record_date']
+integer_columns = ['src_line_nbr', 'record_fiscal_year', 'record_fiscal_quarter', 'record_calendar_year',
+                   'record_calendar_quarter', 'record_calendar_month', 'record_calendar_day']
+
+
+# Function to fail early with a clear message when pyarrow is not installed
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the parquet storage format, install it with: pip install pyarrow")
+
+
+# Function to get the file name a dataset is stored under for a storage format
+def storage_file_name(upload_file, storage_format):
+    if storage_format == "parquet":
+        return upload_file.rsplit('.', 1)[0] + ".parquet"
+    return upload_file
+
+
+# Function to get the Arrow type of a fiscaldata column
+def arrow_type_for(column):
+    if column in date_columns:
+        return pa.date32()
+    if column.endswith('_amt'):
+        return pa.float64()
+    if column in integer_columns:
+        return pa.int32()
+    return pa.string()
+
+
+# Function to build the typed Arrow schema for a header
+def arrow_schema_for(header):
+    require_pyarrow()
+    return pa.schema([(column, arrow_type_for(column)) for column in header])
+
+
+# Function to convert a DataFrame of the API's string values into a typed Arrow table
+# The API's missing values ("null" and the like) become nulls first, the cast cannot parse them as numbers or dates
+def string_frame_to_table(df, header):
+    require_pyarrow()
+    string_schema = pa.schema([(column, pa.string()) for column in header])
+    values = df[header].astype(object)
+    values = values.where(~values.isin(missing_value_strings), None)
+    table = pa.Table.from_pandas(values, schema=string_schema, preserve_index=False)
+    return table.cast(arrow_schema_for(header))
+
+
+# Function to write an Arrow table as Parquet bytes, sorted by record_date so row group statistics are tight
+def table_to_parquet_bytes(table, row_group_size=default_row_group_size):
+    require_pyarrow()
+    for column in date_columns:
+        if column in table.column_names and pa.types.is_string(table.schema.field(column).type):
+            table = table.set_column(table.column_names.index(column), column, table[column].cast(pa.date32()))
+        if column in table.column_names:
+            table = table.sort_by(column)
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, row_group_size=row_group_size, compression='snappy', write_statistics=True)
+    return sink.getvalue().to_pybytes()
+
+
+# Function to convert a DataFrame of the API's string values straight to typed Parquet bytes
+def string_frame_to_parquet_bytes(df, header, row_group_size=default_row_group_size):
+    return table_to_parquet_bytes(string_frame_to_table(df, header), row_group_size)
+
+
+# Function to convert a DataFrame to Parquet bytes
+def dataframe_to_parquet_bytes(df, row_group_size=default_row_group_size):
+    require_pyarrow()
+    return table_to_parquet_bytes(pa.Table.from_pandas(df, preserve_index=False), row_group_size)
+
+
+# Writable file that hands over what has been written so far, so a Parquet file can be uploaded while it is written
+class ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# Function to encode a sequence of DataFrames as one Parquet file and yield it as byte chunks, one per DataFrame,
+# each DataFrame sorted by record_date into its own row groups
+def iter_frames_parquet_chunks(frames, row_group_size=default_row_group_size):
+    require_pyarrow()
+    sink = ChunkSink()
+    writer = None
+    for df in frames:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if 'record_date' in table.column_names:
+            table = table.sort_by('record_date')
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression='snappy', write_statistics=True)
+        writer.write_table(table.cast(writer.schema), row_group_size=row_group_size)
+        data = sink.drain()
+        if data:
+            yield data
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+# Function to append a DataFrame of the API's string values to an existing Parquet file's content, replacing the
+# existing rows dated after the watermark (every existing row when there is no watermark yet) with the appended ones
+def append_string_frame_to_parquet_bytes(existing_bytes, df, header, watermark,
+                                         row_group_size=default_row_group_size):
+    table = string_frame_to_table(df, header)
+    if existing_bytes:
+        existing_table = pq.read_table(io.BytesIO(existing_bytes)).cast(table.schema)
+        if not watermark:
+            existing_table = existing_table.slice(0, 0)
+        else:
+            newer = pc.greater(existing_table['record_date'], pa.scalar(to_date(watermark), pa.date32()))
+            existing_table = existing_table.filter(pc.invert(pc.fill_null(newer, False)))
+        table = pa.concat_tables([existing_table, table])
+    return table_to_parquet_bytes(table, row_group_size)
+
+
+# Function to turn a date-like value into a datetime.date
+def to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+# Function to check from row group statistics whether a row group can hold dates in the range
+def row_group_in_range(metadata, row_group_index, column_index, start_date, end_date):
+    statistics = metadata.row_group(row_group_index).column(column_index).statistics
+    if statistics is None or not statistics.has_min_max:
+        return True
+    if start_date is not None and statistics.max < start_date:
+        return False
+    if end_date is not None and statistics.min > end_date:
+        return False
+    return True
+
+
+# Function to read Parquet into a DataFrame, reading only the requested columns and the row groups in the date range
+def read_parquet(source, columns=None, start_date=None, end_date=None):
+    require_pyarrow()
+    start_date, end_date = to_date(start_date), to_date(end_date)
+    parquet_file = pq.ParquetFile(source)
+    metadata = parquet_file.metadata
+    filtering = start_date is not None or end_date is not None
+
+    read_columns = list(columns) if columns is not None else None
+    if filtering and read_columns is not None and 'record_date' not in read_columns:
+        read_columns.append('record_date')
+
+    row_groups = list(range(metadata.num_row_groups))
+    if filtering:
+        column_index = parquet_file.schema_arrow.get_field_index('record_date')
+        row_groups = [index for index in row_groups
+                      if row_group_in_range(metadata, index, column_index, start_date, end_date)]
+
+    if row_groups:
+        table = parquet_file.read_row_groups(row_groups, columns=read_columns)
+    else:
+        table = parquet_file.schema_arrow.empty_table()
+        if read_columns is not None:
+            table = table.select(read_columns)
+
+    # Row groups overlapping the range edges still need their rows filtered
+    if start_date is not None:
+        table = table.filter(pc.greater_equal(table['record_date'], pa.scalar(start_date, pa.date32())))
+    if end_date is not None:
+        table = table.filter(pc.less_equal(table['record_date'], pa.scalar(end_date, pa.date32())))
+    if columns is not None:
+        table = table.select(list(columns))
+
+    return table.to_pandas(date_as_object=False)
+
+
+# File-like reader that fetches byte ranges on demand, so Parquet readers only download what they read
+class RangedReader(io.RawIOBase):
+    def __init__(self, read_range, size):
+        self.read_range = read_range
+        self.size = size
+        self.position = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        return self.position
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self.size - self.position)
+        if length <= 0:
+            return 0
+        data = self.read_range(self.position, length)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        self.bytes_read += len(data)
+        return len(data)
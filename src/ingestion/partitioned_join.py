@@ -0,0 +1,112 @@
+import concurrent.futures
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+
+import pandas as pd
+
+# Default directory the joined partitions are written to, one file per partition
+default_spool_directory = "../merge_partitions"
+
+# Default number of partitions joined at the same time, each in its own process
+default_max_workers = os.cpu_count() or 1
+
+
+# Function to get the partition key of each record_date: YYYYMM for "month", the fiscal year (October to September)
+# for "fiscal_year"
+def partition_keys(record_dates, partition_by="month"):
+    record_dates = pd.to_datetime(record_dates)
+    if partition_by == "month":
+        return record_dates.dt.year * 100 + record_dates.dt.month
+    if partition_by == "fiscal_year":
+        return record_dates.dt.year + (record_dates.dt.month >= 10).astype(int)
+    raise ValueError(f"unknown partition_by {partition_by}, use month or fiscal_year")
+
+
+# Function to get the row positions of each partition of a frame
+def partition_positions(df, partition_by="month"):
+    keys = partition_keys(df['record_date'], partition_by)
+    return {int(key): positions for key, positions in keys.groupby(keys.to_numpy(), sort=False).indices.items()}
+
+
+# Function to get the file a joined partition is written to
+def partition_file_path(spool_directory, partition_by, key):
+    return os.path.join(spool_directory, f"{partition_by}={key}.pkl")
+
+
+# Function to join one partition of both frames and write the result to its file, run in a worker process
+# Only the file's name, row count and fingerprint go back to the caller, never the joined rows
+def join_partition(key, left, right, merge_options, drop_columns, renames, path):
+    joined = pd.merge(left, right, **merge_options).drop(columns=drop_columns).rename(columns=renames)
+    data = pickle.dumps(joined, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(path + ".tmp", 'wb') as partition_file:
+        partition_file.write(data)
+    os.replace(path + ".tmp", path)
+    return key, os.path.basename(path), len(joined), hashlib.sha256(data).hexdigest()
+
+
+# The joined partitions written by a partitioned join, in partition order
+# Iterating reads one partition at a time, len is the total row count so it stands in for the joined frame
+class PartitionedFrame:
+    def __init__(self, spool_directory, partitions):
+        self.spool_directory = spool_directory
+        # (key, file name, row count, sha256 of the file) per partition
+        self.partitions = partitions
+
+    def __len__(self):
+        return sum(row_count for _, _, row_count, _ in self.partitions)
+
+    def __iter__(self):
+        for _, file_name, _, _ in self.partitions:
+            with open(os.path.join(self.spool_directory, file_name), 'rb') as partition_file:
+                yield pickle.load(partition_file)
+
+
+# Function to remove the partition files left by an earlier join
+def clear_spool_directory(spool_directory):
+    os.makedirs(spool_directory, exist_ok=True)
+    for file_name in os.listdir(spool_directory):
+        if file_name.endswith(".pkl") or file_name.endswith(".pkl.tmp"):
+            os.remove(os.path.join(spool_directory, file_name))
+
+
+# Function to inner join two frames partition by partition on a key that includes record_date
+# Both frames are split by month or fiscal year of record_date, only partitions present on both sides are joined,
+# with max_workers > 1 they are joined in a process pool with at most two partitions per worker in flight,
+# so the memory of the join is bounded by a few partitions instead of the whole joined frame
+def partitioned_merge(left, right, merge_options, drop_columns=(), renames=None, partition_by="month",
+                      max_workers=default_max_workers, spool_directory=default_spool_directory):
+    clear_spool_directory(spool_directory)
+    left_positions = partition_positions(left, partition_by)
+    right_positions = partition_positions(right, partition_by)
+    keys = sorted(set(left_positions) & set(right_positions))
+    drop_columns = list(drop_columns)
+    renames = renames or {}
+
+    # Function to get the arguments of a partition's join, the partition's rows are only copied when it is submitted
+    def partition_arguments(key):
+        return (key, left.take(left_positions[key]), right.take(right_positions[key]), merge_options, drop_columns,
+                renames, partition_file_path(spool_directory, partition_by, key))
+
+    if max_workers <= 1:
+        partitions = [join_partition(*partition_arguments(key)) for key in keys]
+    else:
+        partitions = []
+        # The pipeline runs stages in threads and forking a threaded process can deadlock, so workers are not forked
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                    mp_context=multiprocessing.get_context(start_method)) as executor:
+            running = set()
+            for key in keys:
+                running.add(executor.submit(join_partition, *partition_arguments(key)))
+                if len(running) >= 2 * max_workers:
+                    done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    partitions.extend(future.result() for future in done)
+            partitions.extend(future.result() for future in concurrent.futures.as_completed(running))
+        partitions.sort()
+
+    result = PartitionedFrame(spool_directory, partitions)
+    logging.info(f"joined {len(keys)} {partition_by} partition(s) into {len(result)} rows in {spool_directory}")
+    return result
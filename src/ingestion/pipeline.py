@@ -0,0 +1,216 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+import uuid
+
+from metrics import add_to_counter, reset_metrics, stage_span
+
+# Default directory of the stage checkpoints and of the pipeline state file
+default_checkpoint_directory = "../pipeline_checkpoints"
+pipeline_state_file = "pipeline_state.json"
+
+# Default number of stages run at the same time
+default_max_workers = 4
+
+
+# A named step of the pipeline, run with the outputs of its dependencies as arguments in dependency order
+# parameters are the settings its output depends on, always_run marks stages that read data from outside the
+# pipeline (the API, the clock), which are only skipped when a resumed run already completed them
+class Stage:
+    def __init__(self, name, function, dependencies=(), parameters=None, always_run=False):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.parameters = parameters or {}
+        self.always_run = always_run
+
+
+# Error raised when a stage cannot run because its inputs are missing or a stage failed
+class PipelineError(Exception):
+    pass
+
+
+# Function to get the path of a stage's checkpoint
+def checkpoint_path(checkpoint_directory, stage_name):
+    return os.path.join(checkpoint_directory, stage_name + ".pkl")
+
+
+# Function to read the pipeline state, an empty state when no run has been recorded yet
+def load_pipeline_state(checkpoint_directory):
+    try:
+        with open(os.path.join(checkpoint_directory, pipeline_state_file), 'r') as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {'run_id': None, 'stages': {}}
+
+
+# Function to write the pipeline state, replacing the previous file in one step
+def save_pipeline_state(checkpoint_directory, state):
+    os.makedirs(checkpoint_directory, exist_ok=True)
+    path = os.path.join(checkpoint_directory, pipeline_state_file)
+    with open(path + ".tmp", 'w') as state_file:
+        json.dump(state, state_file, indent=2, default=str)
+    os.replace(path + ".tmp", path)
+
+
+# Function to write a stage's output checkpoint and return the fingerprint of its content
+def write_checkpoint(checkpoint_directory, stage_name, output):
+    os.makedirs(checkpoint_directory, exist_ok=True)
+    data = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+    path = checkpoint_path(checkpoint_directory, stage_name)
+    with open(path + ".tmp", 'wb') as checkpoint_file:
+        checkpoint_file.write(data)
+    os.replace(path + ".tmp", path)
+    return hashlib.sha256(data).hexdigest()
+
+
+# Function to read a stage's output checkpoint
+def read_checkpoint(checkpoint_directory, stage_name):
+    path = checkpoint_path(checkpoint_directory, stage_name)
+    if not os.path.exists(path):
+        raise PipelineError(f"stage {stage_name} has no checkpoint in {checkpoint_directory}, run it first")
+    with open(path, 'rb') as checkpoint_file:
+        return pickle.load(checkpoint_file)
+
+
+# Function to build the key of a stage's inputs from its parameters and the fingerprints of its dependencies' outputs
+def stage_input_key(stage, state):
+    key_source = json.dumps({
+        'stage': stage.name,
+        'parameters': stage.parameters,
+        'dependencies': {name: state['stages'].get(name, {}).get('output_key') for name in stage.dependencies},
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+
+# Function to order stages so every stage comes after its dependencies
+def topological_order(stages):
+    stages_by_name = {stage.name: stage for stage in stages}
+    ordered = []
+    visiting = set()
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name in visiting:
+            raise PipelineError(f"stage {name} depends on itself")
+        if name not in stages_by_name:
+            raise PipelineError(f"unknown stage {name}")
+        visiting.add(name)
+        for dependency in stages_by_name[name].dependencies:
+            visit(dependency)
+        visiting.discard(name)
+        ordered.append(name)
+
+    for stage in stages:
+        visit(stage.name)
+    return [stages_by_name[name] for name in ordered]
+
+
+# Function to decide whether a stage can reuse its checkpoint instead of running
+def can_skip_stage(stage, stage_state, input_key, run_id, force):
+    if force or stage_state.get('status') != 'succeeded' or stage_state.get('input_key') != input_key:
+        return False
+    # Stages reading outside data are reused only when resuming the run that completed them
+    return not stage.always_run or stage_state.get('run_id') == run_id
+
+
+# Function to run the selected stages (every stage when None) with independent stages run concurrently
+# Stages whose inputs are unchanged since their last successful run are skipped and their checkpoint is reused,
+# resume continues the last run, skipping every stage it completed, force runs every selected stage
+def run_pipeline(stages, selected=None, checkpoint_directory=default_checkpoint_directory, resume=False, force=False,
+                 max_workers=default_max_workers):
+    stages = topological_order(stages)
+    stages_by_name = {stage.name: stage for stage in stages}
+    selected = set(stages_by_name) if selected is None else set(selected)
+    unknown_stages = selected - set(stages_by_name)
+    if unknown_stages:
+        raise PipelineError(f"unknown stage(s): {', '.join(sorted(unknown_stages))}")
+
+    state = load_pipeline_state(checkpoint_directory)
+    if not resume or state['run_id'] is None:
+        state['run_id'] = uuid.uuid4().hex
+    run_id = state['run_id']
+    logging.info(f"pipeline run {run_id} for stages {', '.join(stage.name for stage in stages if stage.name in selected)}")
+
+    reset_metrics()
+    outputs = {}
+    statuses = {}
+
+    # Function to get a dependency's output, from memory or from its checkpoint
+    def dependency_output(name):
+        if name not in outputs:
+            if state['stages'].get(name, {}).get('status') != 'succeeded':
+                raise PipelineError(f"stage {name} has not succeeded, run it first")
+            outputs[name] = read_checkpoint(checkpoint_directory, name)
+        return outputs[name]
+
+    # Function to run one stage and checkpoint its output, in a worker thread
+    def execute(stage, arguments):
+        start = time.perf_counter()
+        with stage_span(stage.name):
+            add_to_counter('rows_in', sum(len(argument) for argument in arguments if hasattr(argument, '__len__')))
+            output = stage.function(*arguments)
+            if hasattr(output, '__len__') and not isinstance(output, str):
+                add_to_counter('rows_out', len(output))
+        output_key = write_checkpoint(checkpoint_directory, stage.name, output)
+        return output, output_key, time.perf_counter() - start
+
+    pending = [stage for stage in stages if stage.name in selected]
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for stage in list(pending):
+                blocked = [name for name in stage.dependencies if name in selected and name not in statuses]
+                if blocked:
+                    continue
+                pending.remove(stage)
+
+                failed = [name for name in stage.dependencies if statuses.get(name) in ('failed', 'blocked')]
+                if failed:
+                    statuses[stage.name] = 'blocked'
+                    logging.error(f"stage {stage.name} not run because {', '.join(failed)} did not succeed")
+                    continue
+
+                stage_state = state['stages'].get(stage.name, {})
+                input_key = stage_input_key(stage, state)
+                if can_skip_stage(stage, stage_state, input_key, run_id, force) and \
+                        os.path.exists(checkpoint_path(checkpoint_directory, stage.name)):
+                    statuses[stage.name] = 'skipped'
+                    logging.info(f"stage {stage.name} skipped, its inputs are unchanged since its last run")
+                    continue
+
+                try:
+                    arguments = [dependency_output(name) for name in stage.dependencies]
+                except Exception as excep:
+                    statuses[stage.name] = 'failed'
+                    logging.error(f"stage {stage.name} failed: {excep}")
+                    continue
+                logging.info(f"stage {stage.name} started")
+                state['stages'][stage.name] = {'status': 'running', 'input_key': input_key, 'run_id': run_id}
+                running[executor.submit(execute, stage, arguments)] = stage
+
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                stage_state = state['stages'][stage.name]
+                try:
+                    outputs[stage.name], stage_state['output_key'], elapsed = future.result()
+                    stage_state.update(status='succeeded', elapsed_seconds=round(elapsed, 3),
+                                       finished_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+                    statuses[stage.name] = 'succeeded'
+                    logging.info(f"stage {stage.name} succeeded in {elapsed:.2f}s")
+                except Exception as excep:
+                    stage_state.update(status='failed', error=str(excep))
+                    statuses[stage.name] = 'failed'
+                    logging.error(f"stage {stage.name} failed: {excep}")
+                save_pipeline_state(checkpoint_directory, state)
+
+    save_pipeline_state(checkpoint_directory, state)
+    return statuses
@@ -0,0 +1,242 @@
+import concurrent.futures
+import html
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Default directory of the profile report and its figures
+default_profile_directory = "../project_logs/profile"
+
+# Default number of figures rendered at the same time, each in its own process
+default_max_workers = os.cpu_count() or 1
+
+# What the profile of each dataset holds, the summaries and figures ExploratoryAnalysis.py shows interactively:
+# value_counts: columns whose values are counted, each drawn as a bar chart
+# histograms: numeric columns binned into (bins, x label, title) histograms
+# box_plots: (group column, value column, title) box plots of a value per group
+# pivot: (index, columns, values, title) mean pivot drawn as a heatmap
+# bar_plots: (x column, hue column, value column, title) mean per x, one chart per hue value
+# line_plots: (x column, value column, title) mean per x
+profile_specs = {
+    'interest_rates': {
+        'value_counts': ['security_type_desc'],
+        'histograms': {'avg_interest_rate_amt': (30, 'Average Interest Rate', 'Histogram of Average Interest Rates')},
+        'box_plots': [('security_type_desc', 'avg_interest_rate_amt',
+                       'Box Plot of Average Interest Rates by Security Type')],
+        'pivot': ('record_calendar_year', 'security_type_desc', 'avg_interest_rate_amt',
+                  'Heatmap of Average Interest Rates by Year and Security Type'),
+        'bar_plots': [],
+        'line_plots': [],
+    },
+    'debt': {
+        'value_counts': ['security_type_desc', 'security_class_desc'],
+        'histograms': {'debt_held_public_mil_amt': (20, 'Debt Held by Public (in millions)',
+                                                    'Histogram of Debt Held by Public'),
+                       'intragov_hold_mil_amt': (20, 'Debt Held by Intragovernmental (in millions)',
+                                                 'Histogram of Debt Held Intragovernmentally')},
+        'box_plots': [('security_type_desc', 'debt_held_public_mil_amt', 'Debt Held by Security Type')],
+        'pivot': None,
+        'bar_plots': [('record_calendar_year', 'security_type_desc', 'total_mil_amt', 'Total {} Debt by Year')],
+        'line_plots': [('record_date', 'total_mil_amt', 'Total Public Debt Outstanding Over Time')],
+    },
+}
+
+
+# Function to convert a pandas summary to plain JSON values, NaN becomes null and dates ISO strings
+def to_json_value(summary):
+    return json.loads(summary.to_json(date_format='iso', default_handler=str))
+
+
+# Function to get the box plot statistics of value per group: quartiles, whiskers at the furthest values within
+# 1.5 times the interquartile range, and the count, computed for every group at once
+def box_plot_stats(df, group_column, value_column):
+    values = df[value_column].astype('float64')
+    grouped = values.groupby(df[group_column], observed=True)
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    # The fences of each row's group, broadcast back to the rows
+    row_q1 = grouped.transform('quantile', 0.25)
+    row_q3 = grouped.transform('quantile', 0.75)
+    lower_fence = row_q1 - 1.5 * (row_q3 - row_q1)
+    upper_fence = row_q3 + 1.5 * (row_q3 - row_q1)
+    whisker_low = values.where(values >= lower_fence).groupby(df[group_column], observed=True).min()
+    whisker_high = values.where(values <= upper_fence).groupby(df[group_column], observed=True).max()
+    counts = grouped.count()
+    return [{'label': str(group), 'q1': float(quartiles.at[group, 0.25]), 'med': float(quartiles.at[group, 0.5]),
+             'q3': float(quartiles.at[group, 0.75]), 'whislo': float(whisker_low[group]),
+             'whishi': float(whisker_high[group]), 'count': int(counts[group])}
+            for group in quartiles.index if counts[group] > 0]
+
+
+# Function to compute every summary of a dataset and the data of its figures in one pass over the frame
+# Returns the summary, JSON ready, and the figures as plain dicts that a worker process can draw without the frame
+def profile_dataset(name, df, spec):
+    start = time.perf_counter()
+    missing = df.isna()
+    null_counts = missing.sum()
+    summary = {
+        'rows': len(df),
+        'columns': {column: str(dtype) for column, dtype in df.dtypes.items()},
+        'memory_bytes': int(df.memory_usage(deep=True).sum()),
+        'describe': to_json_value(df.describe(include='all')),
+        'null_counts': to_json_value(null_counts[null_counts > 0]),
+        'value_counts': {},
+        'value_percentages': {},
+        'histograms': {},
+    }
+    if 'record_fiscal_year' in df.columns:
+        # One grouped sum over the missing-value mask, keeping only the columns with nulls in each year
+        by_year = missing.groupby(df['record_fiscal_year']).sum()
+        summary['null_counts_by_fiscal_year'] = {
+            str(year): {column: int(count) for column, count in counts.items() if count > 0}
+            for year, counts in by_year.iterrows() if counts.any()}
+
+    figures = []
+    for column in spec['value_counts']:
+        counts = df[column].value_counts()
+        summary['value_counts'][column] = {str(value): int(count) for value, count in counts.items()}
+        summary['value_percentages'][column] = {str(value): float(count / counts.sum() * 100)
+                                                for value, count in counts.items()}
+        figures.append({'kind': 'bar', 'name': f"{name}_{column}_counts", 'title': f"Count of {column}",
+                        'xlabel': column, 'ylabel': 'Count', 'labels': [str(value) for value in counts.index],
+                        'values': counts.astype(float).tolist()})
+
+    for column, (bins, xlabel, title) in spec['histograms'].items():
+        counts, edges = np.histogram(df[column].dropna().astype('float64'), bins=bins)
+        summary['histograms'][column] = {'counts': counts.tolist(), 'edges': edges.tolist()}
+        figures.append({'kind': 'histogram', 'name': f"{name}_{column}_histogram", 'title': title,
+                        'xlabel': xlabel, 'ylabel': 'Frequency', 'counts': counts.tolist(), 'edges': edges.tolist()})
+
+    for group_column, value_column, title in spec['box_plots']:
+        stats = box_plot_stats(df, group_column, value_column)
+        summary.setdefault('box_plots', {})[value_column] = stats
+        figures.append({'kind': 'box', 'name': f"{name}_{value_column}_by_{group_column}", 'title': title,
+                        'xlabel': group_column, 'ylabel': value_column, 'stats': stats})
+
+    if spec['pivot'] is not None:
+        index, columns, values, title = spec['pivot']
+        pivot_table = df.pivot_table(index=index, columns=columns, values=values, aggfunc='mean', observed=True)
+        summary['pivot'] = to_json_value(pivot_table)
+        figures.append({'kind': 'heatmap', 'name': f"{name}_{values}_pivot", 'title': title, 'xlabel': columns,
+                        'ylabel': index, 'rows': [str(row) for row in pivot_table.index],
+                        'columns': [str(column) for column in pivot_table.columns],
+                        'values': pivot_table.astype('float64').to_numpy().tolist()})
+
+    for x_column, hue_column, value_column, title in spec['bar_plots']:
+        means = df.groupby([hue_column, x_column], observed=True)[value_column].mean()
+        for hue_value, hue_means in means.groupby(level=0, observed=True):
+            hue_means = hue_means.droplevel(0)
+            figures.append({'kind': 'bar', 'name': f"{name}_{value_column}_{hue_value}_by_{x_column}",
+                            'title': title.format(hue_value), 'xlabel': x_column, 'ylabel': value_column,
+                            'labels': [str(value) for value in hue_means.index],
+                            'values': hue_means.astype('float64').tolist()})
+
+    for x_column, value_column, title in spec['line_plots']:
+        means = df.groupby(x_column, observed=True)[value_column].mean().sort_index()
+        figures.append({'kind': 'line', 'name': f"{name}_{value_column}_over_{x_column}", 'title': title,
+                        'xlabel': x_column, 'ylabel': value_column, 'labels': [str(value) for value in means.index],
+                        'values': means.astype('float64').tolist()})
+
+    summary['profile_seconds'] = time.perf_counter() - start
+    return summary, figures
+
+
+# Function to draw one figure to a PNG file, run in a worker process
+# Uses matplotlib's Figure directly, so no pyplot window or display is involved
+def render_figure(figure, path):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    if figure['kind'] == 'histogram':
+        edges = figure['edges']
+        ax.bar(edges[:-1], figure['counts'], width=np.diff(edges), align='edge', color='skyblue', edgecolor='black')
+    elif figure['kind'] == 'bar':
+        ax.bar(range(len(figure['values'])), figure['values'], color='skyblue')
+        ax.set_xticks(range(len(figure['labels'])), figure['labels'], rotation=45, ha='right')
+    elif figure['kind'] == 'box':
+        ax.bxp([{**stats, 'fliers': []} for stats in figure['stats']], showfliers=False)
+        ax.tick_params(axis='x', labelrotation=90)
+    elif figure['kind'] == 'heatmap':
+        image = ax.imshow(np.array(figure['values'], dtype='float64'), cmap='YlGnBu', aspect='auto')
+        ax.set_xticks(range(len(figure['columns'])), figure['columns'], rotation=45, ha='right')
+        ax.set_yticks(range(len(figure['rows'])), figure['rows'])
+        fig.colorbar(image, ax=ax)
+    elif figure['kind'] == 'line':
+        ax.plot(pd.to_datetime(figure['labels']), figure['values'])
+    else:
+        raise ValueError(f"unknown figure kind {figure['kind']}")
+    ax.set_title(figure['title'])
+    ax.set_xlabel(figure['xlabel'])
+    ax.set_ylabel(figure['ylabel'])
+    fig.tight_layout()
+    fig.savefig(path + ".tmp", format='png')
+    os.replace(path + ".tmp", path)
+    return os.path.basename(path)
+
+
+# Function to draw every figure to output_directory, with max_workers > 1 in a process pool
+def render_figures(figures, output_directory, max_workers=default_max_workers):
+    paths = [os.path.join(output_directory, figure['name'] + ".png") for figure in figures]
+    if max_workers <= 1 or len(figures) <= 1:
+        return [render_figure(figure, path) for figure, path in zip(figures, paths)]
+    # Workers are not forked, the pipeline runs stages in threads and forking a threaded process can deadlock
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(max_workers, len(figures)),
+                                                mp_context=multiprocessing.get_context(start_method)) as executor:
+        return list(executor.map(render_figure, figures, paths))
+
+
+# Function to write the profile as an HTML page with the figures next to it
+def profile_html(profile):
+    parts = ["<html><head><meta charset='utf-8'><title>Dataset profile</title></head><body>",
+             f"<h1>Dataset profile</h1><p>Generated at {html.escape(profile['generated_at'])}</p>"]
+    for name, dataset in profile['datasets'].items():
+        parts.append(f"<h2>{html.escape(name)}</h2><p>{dataset['rows']} rows, "
+                     f"{dataset['memory_bytes'] / 2 ** 20:.1f} MiB</p>")
+        parts.append(pd.DataFrame(dataset['describe']).to_html(na_rep=''))
+        if dataset['null_counts']:
+            parts.append("<h3>Null counts</h3>" + pd.Series(dataset['null_counts'], name='nulls').to_frame().to_html())
+        if dataset.get('null_counts_by_fiscal_year'):
+            parts.append("<h3>Null counts by record_fiscal_year</h3>" +
+                         pd.DataFrame(dataset['null_counts_by_fiscal_year']).T.fillna(0).astype(int).to_html())
+        for column, counts in dataset['value_counts'].items():
+            parts.append(f"<h3>{html.escape(column)}</h3>" +
+                         pd.DataFrame({'count': counts, 'percent': dataset['value_percentages'][column]}).to_html())
+        if 'pivot' in dataset:
+            parts.append("<h3>Pivot</h3>" + pd.DataFrame(dataset['pivot']).to_html(na_rep=''))
+        for file_name in dataset['figures']:
+            parts.append(f"<p><img src='{html.escape(file_name)}' alt='{html.escape(file_name)}'></p>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+# Function to profile every dataset and write profile.json, profile.html and the figures to output_directory
+# datasets maps a name of profile_specs to its frame; returns the path of the JSON report
+def write_profile_report(datasets, output_directory=default_profile_directory, max_workers=default_max_workers):
+    os.makedirs(output_directory, exist_ok=True)
+    profile = {'generated_at': pd.Timestamp.now().isoformat(), 'datasets': {}}
+    figures = []
+    for name, df in datasets.items():
+        summary, dataset_figures = profile_dataset(name, df, profile_specs[name])
+        summary['figures'] = [figure['name'] + ".png" for figure in dataset_figures]
+        profile['datasets'][name] = summary
+        figures.extend(dataset_figures)
+
+    start = time.perf_counter()
+    render_figures(figures, output_directory, max_workers)
+    profile['render_seconds'] = time.perf_counter() - start
+
+    report_path = os.path.join(output_directory, "profile.json")
+    with open(report_path + ".tmp", 'w') as report_file:
+        json.dump(profile, report_file, indent=2, default=str)
+    os.replace(report_path + ".tmp", report_path)
+    with open(os.path.join(output_directory, "profile.html"), 'w', encoding='utf-8') as html_file:
+        html_file.write(profile_html(profile))
+    logging.info(f"profiled {len(datasets)} dataset(s) and rendered {len(figures)} figure(s) to {output_directory} "
+                 f"in {profile['render_seconds']:.2f}s")
+    return report_path
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from metrics import add_to_counter, current_stage
+
+# Default path of the manifest of published outputs: the content hash of every blob and table last written,
+# with the storage version it was written as and whether the last publish reused it
+default_manifest_path = "../project_logs/publish_manifest.json"
+
+
+# Manifest of the outputs the pipeline published, keyed by "blob:<container>/<blob>" or "sql:<backend>:<table>"
+# An output is unchanged when the content it is published from hashes the same and the stored copy is still the
+# version written, e.g. the blob's ETag or the table's row count, so a copy changed outside the pipeline is published
+# again; blob entries also keep the sha256 of the bytes written
+class PublishManifest:
+    def __init__(self, path=default_manifest_path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, 'r') as manifest_file:
+                self.outputs = json.load(manifest_file)['outputs']
+        except FileNotFoundError:
+            self.outputs = {}
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"ignoring the unreadable publish manifest {path}: {e}")
+            self.outputs = {}
+
+    def is_unchanged(self, key, content_hash, version):
+        with self.lock:
+            entry = self.outputs.get(key)
+        return entry is not None and version is not None and entry.get('content_hash') == content_hash and \
+            entry['version'] == version
+
+    # Function to record an output's content hash and stored version, and whether this publish reused the stored copy
+    # A reused output keeps the size and sha256 recorded when it was written
+    def record(self, key, content_hash, version, reused, size=None, sha256=None):
+        now = time.strftime('%Y-%m-%dT%H:%M:%S')
+        with self.lock:
+            entry = self.outputs.get(key, {})
+            if reused:
+                size, sha256 = entry.get('size'), entry.get('sha256')
+            self.outputs[key] = {'content_hash': content_hash, 'sha256': sha256, 'size': size, 'version': version,
+                                 'stage': current_stage.get(), 'reused': reused, 'checked_at': now,
+                                 'published_at': entry.get('published_at', now) if reused else now}
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path + ".tmp", 'w') as manifest_file:
+                json.dump({'outputs': self.outputs}, manifest_file, indent=2, default=str)
+            os.replace(self.path + ".tmp", self.path)
+        if reused:
+            add_to_counter('publishes_reused', 1)
+            add_to_counter('publish_bytes_saved', size or 0)
+            logging.info(f"{key} is unchanged since {self.outputs[key]['published_at']}, reusing the stored copy")
+        else:
+            add_to_counter('publishes_uploaded', 1)
+
+
+publish_manifests = {}
+publish_manifests_lock = threading.Lock()
+
+
+# Function to get the process-wide manifest stored at path
+def get_publish_manifest(path=default_manifest_path):
+    with publish_manifests_lock:
+        if path not in publish_manifests:
+            publish_manifests[path] = PublishManifest(path)
+        return publish_manifests[path]
+
+
+# Function to pass chunks on to an upload while hashing and counting them, digest and sizes collect the result
+def iter_hashed_chunks(chunks, digest, sizes):
+    for chunk in chunks:
+        chunk = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        digest.update(chunk)
+        sizes.append(len(chunk))
+        yield chunk
+
+
+# Function to hash bytes already in memory, as the content hash of an output uploaded from them
+def bytes_content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Function to upload a blob unless the stored blob already holds the same bytes, returns whether it was uploaded
+def publish_bytes(manifest, storage, container_name, blob_name, data):
+    data = data.encode('utf-8') if isinstance(data, str) else data
+    key = f"blob:{container_name}/{blob_name}"
+    content_hash = bytes_content_hash(data)
+    version = storage.blob_etag(container_name, blob_name)
+    if manifest.is_unchanged(key, content_hash, version):
+        manifest.record(key, content_hash, version, reused=True)
+        return False
+    storage.upload_bytes(container_name, blob_name, data)
+    manifest.record(key, content_hash, storage.blob_etag(container_name, blob_name), reused=False, size=len(data),
+                    sha256=content_hash)
+    return True
+
+
+# Function to upload a stream of chunks as staged blocks unless the stored blob was published from the same content
+# content_hash identifies what the chunks are encoded from, so an unchanged output is skipped before a chunk is
+# encoded; otherwise the chunks are hashed on their way to the upload, in the same single pass
+# Returns the number of blocks uploaded, 0 when the stored blob was reused
+def publish_chunks(manifest, storage, container_name, blob_name, chunks, content_hash):
+    key = f"blob:{container_name}/{blob_name}"
+    version = storage.blob_etag(container_name, blob_name)
+    if manifest.is_unchanged(key, content_hash, version):
+        manifest.record(key, content_hash, version, reused=True)
+        return 0
+    digest = hashlib.sha256()
+    sizes = []
+    block_count = storage.upload_blocks(container_name, blob_name, iter_hashed_chunks(chunks, digest, sizes))
+    manifest.record(key, content_hash, storage.blob_etag(container_name, blob_name), reused=False, size=sum(sizes),
+                    sha256=digest.hexdigest())
+    return block_count
+
+
+# Function to hash the content of a frame, or of each frame of a partitioned join in order, without encoding it
+def frames_content_hash(frames):
+    digest = hashlib.sha256()
+    for df in [frames] if isinstance(frames, pd.DataFrame) else frames:
+        digest.update(json.dumps([str(column) for column in df.columns]).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,324 @@
+import argparse
+import collections
+import io
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from parquet_storage import RangedReader, read_parquet
+from schema import apply_schema, read_csv_options
+from storage_backend import ChunkReader, get_storage_backend
+
+# The serving data the service answers from, the blob the pipeline's publish-blob stage writes
+container_name = "f23projectcontainer"
+serving_blob_name = "serving_data/serving_data.csv"
+
+# file path for the.config file to read the storage connection string
+file_path = "../../Account_Key.config"
+connection_string = "CONNECTION-STRING"
+
+# Default address of the service, entries of its result cache, and seconds between checks for a new serving version
+default_host = "127.0.0.1"
+default_port = 8622
+default_result_cache_size = 1024
+default_reload_interval_seconds = 60
+
+# Default and largest number of rows a /records query returns
+default_record_limit = 1000
+max_record_limit = 100000
+
+# The serving data suffixes the interest rate dataset's security type with _df2, the serving table does not
+serving_renames = {'security_type_desc_df2': 'security_type_desc'}
+
+# Columns the /aggregate query reduces and how
+aggregate_columns = {
+    'avg_interest_rate_amt': 'mean',
+    'debt_held_public_mil_amt': 'sum',
+    'intragov_hold_mil_amt': 'sum',
+    'total_mil_amt': 'sum',
+}
+
+# Indexed columns, the sorted row positions of each of their values are kept in memory
+indexed_columns = ['security_desc', 'security_type_desc']
+
+
+# Function to read the serving data into the compact schema, sorted on record_date
+def load_serving_frame(storage, container_name, blob_name):
+    if blob_name.endswith(".parquet"):
+        reader = RangedReader(lambda offset, length: storage.read_range(container_name, blob_name, offset, length),
+                              storage.blob_size(container_name, blob_name))
+        df = read_parquet(reader)
+    else:
+        with io.BufferedReader(ChunkReader(storage.iter_chunks(container_name, blob_name))) as blob_stream:
+            df = pd.read_csv(blob_stream, encoding='utf-8', **read_csv_options())
+    df = apply_schema(df).rename(columns=serving_renames)
+    return df.sort_values('record_date', kind='stable', ignore_index=True)
+
+
+# The serving frame and its indexes: the frame is sorted on record_date, so a date range is a slice found by binary
+# search, and each security_desc and security_type_desc value maps to its sorted row positions
+# version is the ETag of the blob the frame was loaded from
+class ServingIndex:
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self.loaded_at = time.time()
+        self.record_dates = df['record_date'].to_numpy()
+        self.positions = {column: {str(value): positions
+                                   for value, positions in df.groupby(column, observed=True).indices.items()}
+                          for column in indexed_columns}
+
+    # Function to get the row positions from start_date to end_date (both included) of a security type and security
+    def select(self, start_date=None, end_date=None, security_type=None, security_desc=None):
+        start = 0 if start_date is None else int(np.searchsorted(self.record_dates, start_date.to_datetime64(),
+                                                                 'left'))
+        stop = len(self.df) if end_date is None else int(np.searchsorted(self.record_dates,
+                                                                         end_date.to_datetime64(), 'right'))
+        positions = None
+        for column, value in (('security_type_desc', security_type), ('security_desc', security_desc)):
+            if value is None:
+                continue
+            value_positions = self.positions[column].get(value, np.empty(0, dtype=np.intp))
+            # A value's positions are sorted, so its rows in the date range are a slice of them
+            value_positions = value_positions[np.searchsorted(value_positions, start):
+                                              np.searchsorted(value_positions, stop)]
+            positions = value_positions if positions is None else np.intersect1d(positions, value_positions,
+                                                                                 assume_unique=True)
+        return np.arange(start, stop) if positions is None else positions
+
+    # Function to get the row positions selected by a query's start, end, security_type and security_desc parameters
+    def select_positions(self, params):
+        return self.select(parse_date(params.get('start')), parse_date(params.get('end')),
+                           params.get('security_type'), params.get('security_desc'))
+
+    def select_rows(self, params):
+        return self.df.take(self.select_positions(params))
+
+
+# Function to parse a query's date parameter, None when it is not given
+def parse_date(value):
+    return None if value is None else pd.Timestamp(value)
+
+
+# Function to convert rows to JSON records, NaN becomes null and dates ISO strings
+def frame_records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+# Function to answer /records: the rows in a date range of a security type and security, at most limit of them
+def query_records(index, params):
+    limit = min(int(params.get('limit', default_record_limit)), max_record_limit)
+    positions = index.select_positions(params)
+    return {'count': len(positions), 'records': frame_records(index.df.take(positions[:limit]))}
+
+
+# Function to answer /aggregate: average rate and summed holdings of the selected rows per group_by value,
+# security_type_desc (default), security_desc, year or month
+def query_aggregate(index, params):
+    group_by = params.get('group_by', 'security_type_desc')
+    rows = index.select_rows(params)
+    if group_by == 'year':
+        keys = rows['record_date'].dt.year.rename('year')
+    elif group_by == 'month':
+        keys = rows['record_date'].dt.strftime('%Y-%m').rename('month')
+    elif group_by in indexed_columns:
+        keys = rows[group_by]
+    else:
+        raise ValueError(f"unknown group_by {group_by}, use security_type_desc, security_desc, year or month")
+    groups = rows.groupby(keys, observed=True).agg(rows=('record_date', 'size'),
+                                                   **{column: (column, function)
+                                                      for column, function in aggregate_columns.items()})
+    return {'group_by': group_by, 'groups': frame_records(groups.reset_index())}
+
+
+# Function to answer /top: the n securities with the highest average interest rate over the selected rows
+def query_top(index, params):
+    n = int(params.get('n', 3))
+    rows = index.select_rows(params)
+    averages = rows.groupby('security_desc', observed=True)['avg_interest_rate_amt'].mean().dropna().nlargest(n)
+    return {'top': [{'security_desc': str(security_desc), 'avg_interest_rate_amt': float(average)}
+                    for security_desc, average in averages.items()]}
+
+
+query_functions = {
+    '/records': query_records,
+    '/aggregate': query_aggregate,
+    '/top': query_top,
+}
+
+
+# Error raised when the service has no serving data to answer from yet
+class ServingDataUnavailable(Exception):
+    pass
+
+
+# Least recently used cache of encoded responses, bounded to max_entries
+class ResultCache:
+    def __init__(self, max_entries=default_result_cache_size):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Read-only query service over the serving data, loaded into memory once and reloaded in the background when a new
+# version of the serving blob lands; a reload builds the new index aside and swaps it in, so queries never wait
+class QueryService:
+    def __init__(self, storage, container_name=container_name, blob_name=serving_blob_name,
+                 result_cache_size=default_result_cache_size,
+                 reload_interval_seconds=default_reload_interval_seconds):
+        self.storage = storage
+        self.container_name = container_name
+        self.blob_name = blob_name
+        self.reload_interval_seconds = reload_interval_seconds
+        self.cache = ResultCache(result_cache_size)
+        self.index = None
+        self.reload_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.reload_thread = threading.Thread(target=self.watch, name="serving-reload", daemon=True)
+
+    # Function to load the serving blob when its ETag changed, returns whether a new version was loaded
+    def reload(self):
+        with self.reload_lock:
+            version = self.storage.blob_etag(self.container_name, self.blob_name)
+            if version is None or (self.index is not None and version == self.index.version):
+                return False
+            start = time.perf_counter()
+            index = ServingIndex(load_serving_frame(self.storage, self.container_name, self.blob_name), version)
+            # Queries in flight finish on the index they started with, cached results of the old version are dropped
+            self.index = index
+            self.cache.clear()
+            logging.info(f"loaded {len(index.df)} serving rows of version {version} from {self.blob_name} "
+                         f"in {time.perf_counter() - start:.2f}s")
+            return True
+
+    # Function to check for a new serving version every reload_interval_seconds until the service stops
+    def watch(self):
+        while not self.stop_event.wait(self.reload_interval_seconds):
+            try:
+                self.reload()
+            except Exception as excep:
+                logging.error(f"reloading the serving data failed, still answering from the loaded version: {excep}")
+
+    def start(self):
+        self.reload()
+        self.reload_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    # Function to answer a query with its encoded JSON response, from the result cache when it was asked before
+    def answer(self, path, params):
+        index = self.index
+        if index is None:
+            raise ServingDataUnavailable(f"{self.blob_name} has not been loaded")
+        key = (index.version, path, tuple(sorted(params.items())))
+        body = self.cache.get(key)
+        if body is None:
+            body = json.dumps({'version': index.version, **query_functions[path](index, params)}).encode('utf-8')
+            self.cache.put(key, body)
+        return body
+
+    def status(self):
+        index = self.index
+        return {'version': index.version if index else None, 'rows': len(index.df) if index else 0,
+                'loaded_at': index.loaded_at if index else None, 'cache_entries': len(self.cache.entries),
+                'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses}
+
+
+# Function to build the HTTP handler class answering GET requests of a service
+def make_handler(service):
+    class QueryHandler(BaseHTTPRequestHandler):
+        # Keeps client connections open between requests
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                if url.path == '/health':
+                    status, body = 200, json.dumps(service.status()).encode('utf-8')
+                elif url.path in query_functions:
+                    status, body = 200, service.answer(url.path, params)
+                else:
+                    status, body = 404, json.dumps({'error': f"unknown query {url.path}, use /health or "
+                                                             f"{', '.join(query_functions)}"}).encode('utf-8')
+            except ServingDataUnavailable as excep:
+                status, body = 503, json.dumps({'error': str(excep)}).encode('utf-8')
+            except (ValueError, TypeError) as excep:
+                status, body = 400, json.dumps({'error': str(excep)}).encode('utf-8')
+            except Exception as excep:
+                # Any other failure still answers with JSON, so the client is not left with a dropped connection
+                logging.exception(f"answering {self.path} failed")
+                status, body = 500, json.dumps({'error': f"internal error: {excep}"}).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return QueryHandler
+
+
+# Function to start a service and its HTTP server, port 0 picks a free port; returns the server, not yet serving
+def create_server(service, host=default_host, port=default_port):
+    service.start()
+    return ThreadingHTTPServer((host, port), make_handler(service))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename='../project_logs/query_service.log', level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Read-only HTTP/JSON queries over the serving data")
+    parser.add_argument("--host", default=default_host)
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--storage-backend", default="azure", choices=["azure", "local"])
+    parser.add_argument("--local-storage-root", default="../../local_storage")
+    parser.add_argument("--blob-name", default=serving_blob_name,
+                        help="serving blob, serving_data/serving_data.parquet for the parquet storage format")
+    parser.add_argument("--result-cache-size", type=int, default=default_result_cache_size)
+    parser.add_argument("--reload-interval", type=float, default=default_reload_interval_seconds,
+                        help="seconds between checks for a new serving version")
+    args = parser.parse_args()
+
+    storage = get_storage_backend(args.storage_backend, file_path, connection_string, args.local_storage_root)
+    query_service = QueryService(storage, container_name, args.blob_name, args.result_cache_size, args.reload_interval)
+    server = create_server(query_service, args.host, args.port)
+    print(f"Serving queries on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        query_service.stop()
+        server.server_close()
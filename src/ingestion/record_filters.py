@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+
+# Function to turn a dataset's cleaning rules into a function that cleans a DataFrame in one vectorized pass
+#   include:  {column: values} keeps rows whose column is one of the values
+#   exclude:  {column: values} drops rows whose column is one of the values
+#   required: [columns] drops rows where any of the columns is missing or empty
+#   mappings: {column: {old: new}} renames values, values not in the mapping are kept
+def compile_cleaning_rules(rules):
+    include = [(column, pd.Index(values).unique()) for column, values in rules.get('include', {}).items()]
+    exclude = [(column, pd.Index(values).unique()) for column, values in rules.get('exclude', {}).items()]
+    required = list(rules.get('required', []))
+    mappings = [(column, dict(mapping)) for column, mapping in rules.get('mappings', {}).items()]
+
+    def clean(df):
+        # Every row rule is combined into one boolean mask before any rows are copied
+        mask = np.ones(len(df), dtype=bool)
+        for column, values in include:
+            mask &= df[column].isin(values).to_numpy()
+        for column, values in exclude:
+            mask &= ~df[column].isin(values).to_numpy()
+        for column in required:
+            mask &= (df[column].notna() & (df[column] != '')).to_numpy()
+        df = df[mask].reset_index(drop=True)
+
+        # Mappings are applied to the distinct values only, then expanded back through the category codes
+        for column, mapping in mappings:
+            categorical = df[column].astype('category')
+            categories = categorical.cat.categories
+            mapped_categories = [mapping.get(value, value) for value in categories]
+            if len(set(mapped_categories)) == len(mapped_categories):
+                df[column] = categorical.cat.rename_categories(mapped_categories).astype(object)
+            else:
+                codes = categorical.cat.codes.to_numpy()
+                values = np.asarray(mapped_categories, dtype=object).take(codes)
+                values[codes == -1] = None
+                df[column] = values
+        return df
+
+    return clean
+
+
+# Function to clean a DataFrame with a dataset's cleaning rules
+def apply_cleaning_rules(df, rules):
+    return compile_cleaning_rules(rules)(df)
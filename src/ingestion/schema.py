@@ -0,0 +1,74 @@
+import pandas as pd
+
+# Strings pd.read_csv treats as missing, kept in step so in-memory frames match frames read back from storage
+missing_value_strings = ['', 'null', 'NULL', 'None', 'NaN', 'nan', 'N/A', 'NA', 'n/a', '<NA>']
+
+# Compact dtypes of every column of both datasets and of the merged serving frame:
+# categories for the low-cardinality descriptors, nullable small integers for the calendar parts,
+# and float64 for the amounts: a float32 interest rate reads back as 1.468000054359436 once it is widened for the
+# SQL load or written to CSV, and the holdings reach 11 significant digits in millions with 3 decimals
+column_dtypes = {
+    'record_date': 'datetime64[ns]',
+    'security_type_desc': 'category',
+    'security_desc': 'category',
+    'security_class_desc': 'category',
+    'avg_interest_rate_amt': 'float64',
+    'debt_held_public_mil_amt': 'float64',
+    'intragov_hold_mil_amt': 'float64',
+    'total_mil_amt': 'float64',
+    'src_line_nbr': 'Int16',
+    'record_fiscal_year': 'Int16',
+    'record_fiscal_quarter': 'Int8',
+    'record_calendar_year': 'Int16',
+    'record_calendar_quarter': 'Int8',
+    'record_calendar_month': 'Int8',
+    'record_calendar_day': 'Int8',
+}
+# The serving frame suffixes the interest rate dataset's descriptor and calendar columns with _df2
+column_dtypes.update({f"{column}_df2": dtype for column, dtype in list(column_dtypes.items())
+                      if column != 'record_date'})
+
+date_columns = [column for column, dtype in column_dtypes.items() if dtype.startswith('datetime')]
+
+
+# Function to get the schema's dtype of a column, None for columns outside the schema
+def dtype_for(column):
+    return column_dtypes.get(column)
+
+
+# Function to get the pd.read_csv arguments that read the columns straight into the schema's dtypes
+# Without columns the file's header is unknown, so the dates are left to apply_schema after the read
+def read_csv_options(columns=None):
+    return {
+        'dtype': {column: dtype for column, dtype in column_dtypes.items()
+                  if column not in date_columns and (columns is None or column in columns)},
+        'parse_dates': [column for column in columns if column in date_columns] if columns is not None else False,
+        'na_values': missing_value_strings,
+        'keep_default_na': False,
+    }
+
+
+# Function to convert one column to a schema dtype, values that do not parse become missing
+def convert_column(series, dtype):
+    if dtype.startswith('datetime'):
+        return pd.to_datetime(series, errors='coerce', format='%Y-%m-%d')
+    if dtype == 'category':
+        return series.astype('category')
+    return pd.to_numeric(series, errors='coerce').astype(dtype)
+
+
+# Function to convert the columns of a DataFrame to the schema's dtypes, columns outside the schema are kept
+def apply_schema(df):
+    conversions = {column: convert_column(df[column], dtype_for(column)) for column in df.columns
+                   if dtype_for(column) is not None and str(df[column].dtype) != dtype_for(column)}
+    return df.assign(**conversions) if conversions else df
+
+
+# Function to give two categorical join keys the same categories, so the merge joins on the category codes
+def align_categories(left, left_column, right, right_column):
+    if isinstance(left[left_column].dtype, pd.CategoricalDtype) and \
+            isinstance(right[right_column].dtype, pd.CategoricalDtype):
+        categories = left[left_column].cat.categories.union(right[right_column].cat.categories)
+        left = left.assign(**{left_column: left[left_column].cat.set_categories(categories)})
+        right = right.assign(**{right_column: right[right_column].cat.set_categories(categories)})
+    return left, right
@@ -0,0 +1,288 @@
+import logging
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from metrics import add_to_counter
+
+# Serving table and the columns loaded into it, in the order of the merged DataFrame's columns
+serving_table_name = "f23_project.US_Treasury_details"
+serving_staging_table_name = "f23_project.US_Treasury_details_staging"
+serving_table_columns = ["record_date", "security_type_desc", "security_desc", "avg_interest_rate_amt",
+                         "record_fiscal_year_df2", "record_fiscal_quarter_df2", "record_calendar_year_df2",
+                         "record_calendar_quarter_df2", "record_calendar_month_df2", "record_calendar_day_df2",
+                         "debt_held_public_mil_amt", "intragov_hold_mil_amt", "total_mil_amt"]
+
+# Default number of rows bound and committed per batch
+default_batch_size = 10000
+
+# Key of a serving row for incremental upserts
+serving_key_columns = ["record_date", "security_desc"]
+
+# Serving table columns for the embedded SQLite stand-in, mirrors DDL_scripts.sql
+sqlite_serving_table_columns = """(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_date DATE,
+    security_type_desc VARCHAR(30),
+    security_desc VARCHAR(100),
+    avg_interest_rate_amt FLOAT,
+    record_fiscal_year_df2 INT,
+    record_fiscal_quarter_df2 INT,
+    record_calendar_year_df2 INT,
+    record_calendar_quarter_df2 INT,
+    record_calendar_month_df2 INT,
+    record_calendar_day_df2 INT,
+    debt_held_public_mil_amt FLOAT,
+    intragov_hold_mil_amt FLOAT,
+    total_mil_amt FLOAT
+)"""
+
+# Analysis indexes and the monthly aggregate cube for the SQLite stand-in, mirrors DDL_scripts.sql
+sqlite_analysis_ddl = """
+CREATE INDEX IF NOT EXISTS f23_project.IX_US_Treasury_details_record_date ON US_Treasury_details (record_date);
+CREATE INDEX IF NOT EXISTS f23_project.IX_US_Treasury_details_security_type_desc
+    ON US_Treasury_details (security_type_desc, record_date);
+CREATE TABLE IF NOT EXISTS f23_project.US_Treasury_monthly_cube (
+    record_month DATE,
+    security_type_desc VARCHAR(30),
+    security_desc VARCHAR(100),
+    row_count INT,
+    rate_count INT,
+    rate_sum FLOAT,
+    rate_max FLOAT,
+    debt_held_public_sum FLOAT,
+    intragov_hold_sum FLOAT,
+    total_sum FLOAT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS f23_project.UX_US_Treasury_monthly_cube
+    ON US_Treasury_monthly_cube (record_month, security_type_desc, security_desc);
+"""
+
+# Serving table DDL for the embedded SQLite stand-in, mirrors DDL_scripts.sql
+sqlite_serving_table_ddl = f"""
+DROP TABLE IF EXISTS f23_project.US_Treasury_details;
+DROP TABLE IF EXISTS f23_project.US_Treasury_monthly_cube;
+CREATE TABLE f23_project.US_Treasury_details {sqlite_serving_table_columns};
+{sqlite_analysis_ddl}"""
+
+# Serving table DDL for incremental loads on the SQLite stand-in, mirrors DDL_incremental_scripts.sql
+sqlite_serving_table_incremental_ddl = f"""
+CREATE TABLE IF NOT EXISTS f23_project.US_Treasury_details {sqlite_serving_table_columns};
+CREATE UNIQUE INDEX IF NOT EXISTS f23_project.UX_US_Treasury_details_record_date_security_desc
+    ON US_Treasury_details (record_date, security_desc);
+{sqlite_analysis_ddl}"""
+
+
+# Connector for the Azure SQL database through pyodbc
+class AzureSqlConnector:
+    def __init__(self, connection_string):
+        self.connection_string = connection_string
+
+    def connect(self):
+        import pyodbc
+
+        return pyodbc.connect(self.connection_string)
+
+    def run_ddl(self, connection, ddl_script):
+        connection.cursor().execute(ddl_script)
+        connection.commit()
+
+    def run_incremental_ddl(self, connection, ddl_script):
+        self.run_ddl(connection, ddl_script)
+
+    def month_start_expression(self, column):
+        return f"DATEFROMPARTS(YEAR({column}), MONTH({column}), 1)"
+
+    # Binds each executemany batch as parameter arrays, one round trip per batch instead of one per row
+    def prepare_cursor(self, cursor):
+        cursor.fast_executemany = True
+
+    def create_staging_table(self, cursor, table_name, staging_table_name, columns):
+        cursor.execute(f"IF OBJECT_ID('{staging_table_name}', 'U') IS NOT NULL DROP TABLE {staging_table_name};")
+        cursor.execute(f"SELECT {', '.join(columns)} INTO {staging_table_name} FROM {table_name} WHERE 1 = 0;")
+
+    def drop_staging_table(self, cursor, staging_table_name):
+        cursor.execute(f"DROP TABLE {staging_table_name};")
+
+    # Inserts new keys and updates rows whose values changed, EXCEPT compares the values NULL-safely
+    def upsert_from_staging(self, cursor, table_name, staging_table_name, columns, key_columns):
+        value_columns = [column for column in columns if column not in key_columns]
+        cursor.execute(f"""
+            MERGE {table_name} WITH (HOLDLOCK) AS target
+            USING {staging_table_name} AS source
+            ON {' AND '.join(f'target.{column} = source.{column}' for column in key_columns)}
+            WHEN MATCHED AND EXISTS (SELECT {', '.join(f'source.{column}' for column in value_columns)}
+                                     EXCEPT
+                                     SELECT {', '.join(f'target.{column}' for column in value_columns)})
+                THEN UPDATE SET {', '.join(f'target.{column} = source.{column}' for column in value_columns)}
+            WHEN NOT MATCHED BY TARGET
+                THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f'source.{column}' for column in columns)});
+        """)
+        return cursor.rowcount
+
+
+# Connector for an embedded SQLite database with the same interface, for offline runs and load benchmarks
+class SqliteConnector:
+    def __init__(self, database_path=":memory:"):
+        self.database_path = database_path
+        self.schema_path = database_path if database_path == ":memory:" else f"{database_path}.f23_project"
+        self.shared_connection = None
+
+    def connect(self):
+        # An in-memory database only lives as long as its connection, so that connection is reused
+        if self.database_path == ":memory:" and self.shared_connection is not None:
+            return self.shared_connection
+        if self.database_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.database_path)), exist_ok=True)
+        connection = sqlite3.connect(self.database_path, check_same_thread=False)
+        # The f23_project schema is an attached database so the same table names work in both connectors
+        connection.execute("ATTACH DATABASE ? AS f23_project", (self.schema_path,))
+        if self.database_path == ":memory:":
+            self.shared_connection = connection
+        return connection
+
+    def run_ddl(self, connection, ddl_script):
+        # DDL_scripts.sql is T-SQL, the stand-in uses its own equivalent DDL
+        connection.executescript(sqlite_serving_table_ddl)
+        connection.commit()
+
+    def run_incremental_ddl(self, connection, ddl_script):
+        connection.executescript(sqlite_serving_table_incremental_ddl)
+        connection.commit()
+
+    def month_start_expression(self, column):
+        return f"strftime('%Y-%m-01', {column})"
+
+    def prepare_cursor(self, cursor):
+        pass
+
+    def create_staging_table(self, cursor, table_name, staging_table_name, columns):
+        cursor.execute(f"DROP TABLE IF EXISTS {staging_table_name}")
+        cursor.execute(f"CREATE TABLE {staging_table_name} AS SELECT {', '.join(columns)} FROM {table_name} WHERE 0")
+
+    def drop_staging_table(self, cursor, staging_table_name):
+        cursor.execute(f"DROP TABLE {staging_table_name}")
+
+    def upsert_from_staging(self, cursor, table_name, staging_table_name, columns, key_columns):
+        value_columns = [column for column in columns if column not in key_columns]
+        target = table_name.split('.')[-1]
+        # "WHERE true" keeps SQLite from reading ON CONFLICT as part of the SELECT's join
+        cursor.execute(f"""
+            INSERT INTO {table_name} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {staging_table_name} WHERE true
+            ON CONFLICT ({', '.join(key_columns)}) DO UPDATE
+            SET {', '.join(f'{column} = excluded.{column}' for column in value_columns)}
+            WHERE {' OR '.join(f'{target}.{column} IS NOT excluded.{column}' for column in value_columns)}
+        """)
+        return cursor.rowcount
+
+
+# Function to stream a DataFrame as batches of row tuples, missing values become None for the database driver
+def iter_row_batches(df, batch_size=default_batch_size):
+    for start in range(0, len(df), batch_size):
+        batch_df = df.iloc[start:start + batch_size]
+        # Dates are bound as ISO strings, which every driver converts into a DATE column
+        for column in batch_df.columns[batch_df.dtypes.map(lambda dtype: dtype.kind == 'M')]:
+            batch_df = batch_df.assign(**{column: batch_df[column].dt.strftime('%Y-%m-%d')})
+        batch_df = batch_df.astype(object)
+        batch_df = batch_df.where(batch_df.notna(), None)
+        yield list(batch_df.itertuples(index=False, name=None))
+
+
+# Function to insert a DataFrame into a table in parameter-array batches, committing after every batch
+def load_batches(cursor, connection, df, table_name, columns, batch_size):
+    query = (f"INSERT INTO {table_name} ({', '.join(columns)}) "
+             f"VALUES ({', '.join('?' for _ in columns)})")
+    rows_loaded = 0
+    for batch in iter_row_batches(df, batch_size):
+        cursor.executemany(query, batch)
+        connection.commit()
+        rows_loaded += len(batch)
+        logging.info(f"loaded {rows_loaded} of {len(df)} rows into {table_name}")
+    return rows_loaded
+
+
+# Function to bulk load a DataFrame whose columns are in the order of columns, committing after every batch
+# With use_staging the batches go to a staging table that is copied into the table in one statement at the end
+def bulk_load(connector, connection, df, table_name=serving_table_name, columns=serving_table_columns,
+              batch_size=default_batch_size, use_staging=False, staging_table_name=serving_staging_table_name):
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    connector.prepare_cursor(cursor)
+
+    target_table_name = table_name
+    if use_staging:
+        connector.create_staging_table(cursor, table_name, staging_table_name, columns)
+        connection.commit()
+        target_table_name = staging_table_name
+
+    rows_loaded = load_batches(cursor, connection, df, target_table_name, columns, batch_size)
+
+    if use_staging:
+        cursor.execute(f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                       f"SELECT {', '.join(columns)} FROM {staging_table_name}")
+        connector.drop_staging_table(cursor, staging_table_name)
+        connection.commit()
+
+    elapsed = time.perf_counter() - start
+    add_to_counter('sql_rows_loaded', rows_loaded)
+    add_to_counter('sql_load_seconds', elapsed)
+    logging.info(f"loaded {rows_loaded} rows into {table_name} in {elapsed:.2f}s "
+                 f"({rows_loaded / elapsed if elapsed else 0:.0f} rows/s)")
+    return rows_loaded
+
+
+# Function to get the oldest record_date an upsert with lookback_days sends, None when every row is sent
+def lookback_cutoff(cursor, table_name=serving_table_name, lookback_days=None):
+    if lookback_days is None:
+        return None
+    newest_record_date = cursor.execute(f"SELECT MAX(record_date) FROM {table_name}").fetchone()[0]
+    if newest_record_date is None:
+        return None
+    return pd.Timestamp(newest_record_date) - pd.Timedelta(days=lookback_days)
+
+
+# Function to count the rows of a table, None when the table does not exist yet
+def table_row_count(connection, table_name=serving_table_name):
+    try:
+        return connection.cursor().execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    except Exception as e:
+        # pyodbc and sqlite3 raise their own error types for a missing table
+        logging.info(f"could not count the rows of {table_name}: {e}")
+        connection.rollback()
+        return None
+
+
+# Function to upsert a DataFrame into the table: rows are staged, then merged in one statement on the key columns
+# With lookback_days only rows dated at most that many days before the table's newest record_date are sent
+def upsert_load(connector, connection, df, table_name=serving_table_name, columns=serving_table_columns,
+                key_columns=serving_key_columns, batch_size=default_batch_size, lookback_days=None,
+                staging_table_name=serving_staging_table_name):
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    connector.prepare_cursor(cursor)
+
+    # The frame's columns are positional, so it is renamed to the table's columns to find the key columns
+    df = df.set_axis(columns, axis=1)
+    cutoff = lookback_cutoff(cursor, table_name, lookback_days)
+    if cutoff is not None:
+        df = df[pd.to_datetime(df['record_date']) >= cutoff]
+    df = df.drop_duplicates(subset=key_columns, keep='last')
+
+    connector.create_staging_table(cursor, table_name, staging_table_name, columns)
+    connection.commit()
+    rows_staged = load_batches(cursor, connection, df, staging_table_name, columns, batch_size)
+
+    # Readers see either the old rows or the merged rows, the table is never emptied
+    rows_changed = connector.upsert_from_staging(cursor, table_name, staging_table_name, columns, key_columns)
+    connector.drop_staging_table(cursor, staging_table_name)
+    connection.commit()
+
+    elapsed = time.perf_counter() - start
+    add_to_counter('sql_rows_loaded', rows_staged)
+    add_to_counter('sql_load_seconds', elapsed)
+    logging.info(f"upserted {rows_staged} staged rows into {table_name}, {rows_changed} rows inserted or updated "
+                 f"in {elapsed:.2f}s")
+    return rows_changed
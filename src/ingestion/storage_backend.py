@@ -0,0 +1,343 @@
+import abc
+import base64
+import collections
+import concurrent.futures
+import configparser
+import functools
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from metrics import add_to_counter, in_current_context
+
+# Default number of parallel connections used for one upload or download
+default_max_concurrency = 4
+
+# Default size of the ranges a streamed download is split into
+default_download_chunk_size = 4 * 1024 * 1024
+
+
+# Function to read and parse a config file once per process
+@functools.lru_cache(maxsize=None)
+def load_config(filepath):
+    config = configparser.ConfigParser()
+    if not config.read(filepath):
+        raise FileNotFoundError(2, 'No such file or directory', filepath)
+    return config
+
+
+# Function to read a property from a config file, using the parsed copy cached for the process
+def read_config_property(filepath, property_name):
+    config = load_config(filepath)
+    if property_name in config and property_name in config[property_name]:
+        return config[property_name][property_name]
+    raise KeyError(f'{property_name} key not found in the configuration file.')
+
+
+# Read-only file object over an iterator of byte chunks, so a reader such as pd.read_csv parses a download as it
+# arrives instead of from one bytes object holding the whole blob
+class ChunkReader(io.RawIOBase):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.chunk = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.chunk:
+            try:
+                self.chunk = memoryview(next(self.chunks))
+            except StopIteration:
+                return 0
+        length = min(len(buffer), len(self.chunk))
+        buffer[:length] = self.chunk[:length]
+        self.chunk = self.chunk[length:]
+        return length
+
+    def close(self):
+        # Stops a download abandoned halfway
+        if hasattr(self.chunks, 'close'):
+            self.chunks.close()
+        super().close()
+
+
+# Base class of the storage backends, blob names are "directory/file" paths inside a container
+# A backend missing one of the abstract methods fails when it is created, not halfway through a pipeline run
+class StorageBackend(abc.ABC):
+    # Ranges downloaded at the same time by iter_chunks
+    max_concurrency = 1
+
+    @abc.abstractmethod
+    def upload_bytes(self, container_name, blob_name, data):
+        pass
+
+    @abc.abstractmethod
+    def upload_blocks(self, container_name, blob_name, chunks):
+        pass
+
+    @abc.abstractmethod
+    def read_bytes(self, container_name, blob_name):
+        pass
+
+    @abc.abstractmethod
+    def read_range(self, container_name, blob_name, offset, length):
+        pass
+
+    # Returns the blob's current ETag from its properties, without downloading it, None when it does not exist
+    @abc.abstractmethod
+    def blob_etag(self, container_name, blob_name):
+        pass
+
+    @abc.abstractmethod
+    def blob_size(self, container_name, blob_name):
+        pass
+
+    # Returns the MD5 digest of the blob's stored content, None when it does not exist
+    @abc.abstractmethod
+    def blob_content_md5(self, container_name, blob_name):
+        pass
+
+    @abc.abstractmethod
+    def list_blobs(self, container_name, prefix):
+        pass
+
+    # Yields the blob's bytes in order as ranges of chunk_size, up to max_concurrency of them downloaded at a time,
+    # so only the ranges in flight are held in memory instead of the whole blob
+    def iter_chunks(self, container_name, blob_name, chunk_size=default_download_chunk_size):
+        size = self.blob_size(container_name, blob_name)
+        ranges = [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+        if self.max_concurrency <= 1 or len(ranges) <= 1:
+            for offset, length in ranges:
+                yield self.read_range(container_name, blob_name, offset, length)
+            return
+
+        # The downloaded bytes are recorded in the metrics of the stage that reads the blob
+        read_range = in_current_context(self.read_range)
+        in_flight = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for offset, length in ranges:
+                in_flight.append(executor.submit(read_range, container_name, blob_name, offset, length))
+                if len(in_flight) >= self.max_concurrency:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+
+
+# Storage backend for Azure Blob Storage that reuses one client, its connection pool and known containers
+class AzureBlobStorageBackend(StorageBackend):
+    def __init__(self, connection_string, max_concurrency=default_max_concurrency):
+        from azure.storage.blob import BlobServiceClient
+
+        self.blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+        self.max_concurrency = max_concurrency
+        self.container_clients = {}
+        self.existing_containers = set()
+        self.lock = threading.Lock()
+
+    def container_client(self, container_name):
+        with self.lock:
+            if container_name not in self.container_clients:
+                self.container_clients[container_name] = self.blob_service_client.get_container_client(container_name)
+            return self.container_clients[container_name]
+
+    def blob_client(self, container_name, blob_name):
+        return self.container_client(container_name).get_blob_client(blob_name)
+
+    # Creates the container the first time it is written to, later calls are answered from memory
+    def ensure_container(self, container_name):
+        from azure.core.exceptions import ResourceExistsError
+
+        if container_name in self.existing_containers:
+            return
+        container_client = self.container_client(container_name)
+        if not container_client.exists():
+            try:
+                container_client.create_container()
+            except ResourceExistsError:
+                pass
+        with self.lock:
+            self.existing_containers.add(container_name)
+
+    # The blob's Content-MD5 is set from the uploaded bytes, so the stored copy can be checked without downloading it
+    def upload_bytes(self, container_name, blob_name, data):
+        from azure.storage.blob import ContentSettings
+
+        self.ensure_container(container_name)
+        data = data.encode('utf-8') if isinstance(data, str) else data
+        self.blob_client(container_name, blob_name).upload_blob(
+            data, overwrite=True, max_concurrency=self.max_concurrency, validate_content=True,
+            content_settings=ContentSettings(content_md5=bytearray(hashlib.md5(data).digest())))
+        add_to_counter('bytes_uploaded', len(data))
+
+    # Stages the chunks as blocks, up to max_concurrency at a time, and commits them in order at the end
+    # The service checks each block against its MD5, and the blob's Content-MD5 is set from all the staged chunks
+    def upload_blocks(self, container_name, blob_name, chunks):
+        from azure.storage.blob import ContentSettings
+
+        self.ensure_container(container_name)
+        blob_client = self.blob_client(container_name, blob_name)
+        block_ids = []
+        content_md5 = hashlib.md5()
+        in_flight = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for index, chunk in enumerate(chunks):
+                chunk = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                block_id = base64.b64encode(f"{index:08d}".encode('utf-8')).decode('utf-8')
+                block_ids.append(block_id)
+                content_md5.update(chunk)
+                add_to_counter('bytes_uploaded', len(chunk))
+                in_flight.append(executor.submit(blob_client.stage_block, block_id, chunk, validate_content=True))
+                if len(in_flight) >= self.max_concurrency:
+                    in_flight.popleft().result()
+            while in_flight:
+                in_flight.popleft().result()
+        blob_client.commit_block_list(block_ids,
+                                      content_settings=ContentSettings(content_md5=bytearray(content_md5.digest())))
+        return len(block_ids)
+
+    def read_bytes(self, container_name, blob_name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            data = self.blob_client(container_name, blob_name).download_blob(
+                max_concurrency=self.max_concurrency).readall()
+        except ResourceNotFoundError:
+            return None
+        add_to_counter('bytes_downloaded', len(data))
+        return data
+
+    def read_range(self, container_name, blob_name, offset, length):
+        data = self.blob_client(container_name, blob_name).download_blob(offset=offset, length=length).readall()
+        add_to_counter('bytes_downloaded', len(data))
+        return data
+
+    def blob_etag(self, container_name, blob_name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return self.blob_client(container_name, blob_name).get_blob_properties().etag
+        except ResourceNotFoundError:
+            return None
+
+    def blob_size(self, container_name, blob_name):
+        return self.blob_client(container_name, blob_name).get_blob_properties().size
+
+    # Blobs written without a Content-MD5 return an empty digest, which never matches an upload's
+    def blob_content_md5(self, container_name, blob_name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            content_md5 = self.blob_client(container_name, blob_name).get_blob_properties().content_settings.content_md5
+        except ResourceNotFoundError:
+            return None
+        return bytes(content_md5 or b'')
+
+    def list_blobs(self, container_name, prefix):
+        container_client = self.container_client(container_name)
+        if container_name not in self.existing_containers and not container_client.exists():
+            return []
+        return sorted(blob.name for blob in container_client.list_blobs(name_starts_with=prefix))
+
+
+# Storage backend that keeps containers as directories on the local disk, for offline runs and benchmarks
+class LocalStorageBackend(StorageBackend):
+    def __init__(self, root_directory):
+        self.root_directory = root_directory
+
+    def path(self, container_name, blob_name):
+        return os.path.join(self.root_directory, container_name, *blob_name.split('/'))
+
+    def upload_bytes(self, container_name, blob_name, data):
+        return self.upload_blocks(container_name, blob_name, [data])
+
+    # Writes to a temporary file that replaces the blob at the end, like a block list commit
+    def upload_blocks(self, container_name, blob_name, chunks):
+        path = self.path(container_name, blob_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        block_count = 0
+        with open(temporary_path, 'wb') as blob_file:
+            for chunk in chunks:
+                chunk = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                blob_file.write(chunk)
+                add_to_counter('bytes_uploaded', len(chunk))
+                block_count += 1
+        os.replace(temporary_path, path)
+        return block_count
+
+    def read_bytes(self, container_name, blob_name):
+        try:
+            with open(self.path(container_name, blob_name), 'rb') as blob_file:
+                data = blob_file.read()
+        except FileNotFoundError:
+            return None
+        add_to_counter('bytes_downloaded', len(data))
+        return data
+
+    def read_range(self, container_name, blob_name, offset, length):
+        with open(self.path(container_name, blob_name), 'rb') as blob_file:
+            blob_file.seek(offset)
+            data = blob_file.read(length)
+        add_to_counter('bytes_downloaded', len(data))
+        return data
+
+    def blob_etag(self, container_name, blob_name):
+        try:
+            return self.file_etag(os.stat(self.path(container_name, blob_name)))
+        except FileNotFoundError:
+            return None
+
+    # Uploads replace the file, so its modification time and size change whenever its content does
+    def file_etag(self, file_stat):
+        return f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+
+    def blob_size(self, container_name, blob_name):
+        return os.path.getsize(self.path(container_name, blob_name))
+
+    # Hashes the file as it is read back from the disk
+    def blob_content_md5(self, container_name, blob_name):
+        content_md5 = hashlib.md5()
+        try:
+            with open(self.path(container_name, blob_name), 'rb') as blob_file:
+                for chunk in iter(functools.partial(blob_file.read, default_download_chunk_size), b''):
+                    content_md5.update(chunk)
+        except FileNotFoundError:
+            return None
+        return content_md5.digest()
+
+    def list_blobs(self, container_name, prefix):
+        container_directory = os.path.join(self.root_directory, container_name)
+        blob_names = []
+        for directory, _, file_names in os.walk(container_directory):
+            for file_name in file_names:
+                if file_name.endswith('.tmp'):
+                    continue
+                relative_path = os.path.relpath(os.path.join(directory, file_name), container_directory)
+                blob_name = relative_path.replace(os.sep, '/')
+                if blob_name.startswith(prefix):
+                    blob_names.append(blob_name)
+        return sorted(blob_names)
+
+
+storage_backends = {}
+storage_backends_lock = threading.Lock()
+
+
+# Function to get the process-wide storage backend, created once for each configuration
+def get_storage_backend(backend_name, config_file_path=None, connection_property=None, local_root=None,
+                        max_concurrency=default_max_concurrency):
+    key = (backend_name, config_file_path, connection_property, local_root, max_concurrency)
+    with storage_backends_lock:
+        if key not in storage_backends:
+            logging.info(f"creating the {backend_name} storage backend")
+            if backend_name == "azure":
+                storage_backends[key] = AzureBlobStorageBackend(
+                    read_config_property(config_file_path, connection_property), max_concurrency)
+            elif backend_name == "local":
+                storage_backends[key] = LocalStorageBackend(local_root)
+            else:
+                raise ValueError(f"Unknown storage backend: {backend_name}")
+        return storage_backends[key]
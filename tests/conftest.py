@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# The ingestion modules and the synthetic data of the benchmarks import each other by module name, as the scripts do
+# when run from their own folder
+repository_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ("ingestion", "benchmarks"):
+    sys.path.insert(0, os.path.join(repository_root, "src", folder))
+
+
+# Pipeline script imported once from a copy of the src layout, so the logs it opens at import land in a temporary folder
+@pytest.fixture(scope="session")
+def pipeline_script_module(tmp_path_factory):
+    pytest.importorskip("pandas")
+    work_directory = tmp_path_factory.mktemp("pipeline")
+    (work_directory / "src" / "ingestion").mkdir(parents=True)
+    (work_directory / "src" / "project_logs").mkdir()
+    current_directory = os.getcwd()
+    os.chdir(work_directory / "src" / "ingestion")
+    try:
+        import DataEngineering_Script
+    finally:
+        os.chdir(current_directory)
+    return DataEngineering_Script
+
+
+# Pipeline script writing to local storage and caches under tmp_path, without a publish manifest
+@pytest.fixture
+def pipeline_script(pipeline_script_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_script_module, "storage_backend_name", "local")
+    monkeypatch.setattr(pipeline_script_module, "local_storage_root", str(tmp_path / "storage"))
+    monkeypatch.setattr(pipeline_script_module, "blob_cache_directory", str(tmp_path / "blob_cache"))
+    monkeypatch.setattr(pipeline_script_module, "publish_manifest_path", None)
+    monkeypatch.setattr(pipeline_script_module, "storage_format", "csv")
+    monkeypatch.setattr(pipeline_script_module, "ingestion_mode", "full")
+    return pipeline_script_module
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from aggregate_cube import cube_version, refresh_monthly_cube
+from sql_loader import SqliteConnector
+
+serving_rows = [
+    ("2023-01-31", "Marketable", "Treasury Bills", 4.5, 100.0, 10.0, 110.0),
+    ("2023-01-31", "Marketable", "Treasury Notes", 2.5, 200.0, 20.0, 220.0),
+    ("2023-02-28", "Non-marketable", "Domestic Series", 7.9, 50.0, 5.0, 55.0),
+]
+
+
+# Function to load rows into a fresh embedded serving table and build its cube
+def loaded_connection(rows):
+    connector = SqliteConnector()
+    connection = connector.connect()
+    connector.run_ddl(connection, "")
+    connection.executemany("INSERT INTO f23_project.US_Treasury_details (record_date, security_type_desc, "
+                           "security_desc, avg_interest_rate_amt, debt_held_public_mil_amt, intragov_hold_mil_amt, "
+                           "total_mil_amt) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    refresh_monthly_cube(connector, connection)
+    return connector, connection
+
+
+def test_cube_version_is_stable_for_the_same_rows():
+    assert cube_version(loaded_connection(serving_rows)[1]) == cube_version(loaded_connection(serving_rows)[1])
+
+
+def test_cube_version_changes_when_rows_are_relabeled():
+    # Swapping the two January securities keeps every count, total and maximum of the cube
+    relabeled_rows = [serving_rows[0][:2] + ("Treasury Notes",) + serving_rows[0][3:],
+                      serving_rows[1][:2] + ("Treasury Bills",) + serving_rows[1][3:], serving_rows[2]]
+
+    assert cube_version(loaded_connection(serving_rows)[1]) != cube_version(loaded_connection(relabeled_rows)[1])
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from aggregate_cube import refresh_monthly_cube
+from analysis_queries import answer_business_questions
+from sql_loader import SqliteConnector, serving_table_name
+
+# (record_date, security_type_desc, security_desc, avg_interest_rate_amt, debt_held_public, intragov_hold)
+serving_rows = [
+    ("2021-12-31", "Marketable", "Treasury Bills", 9.0, 100.0, 10.0),
+    ("2023-01-31", "Marketable", "Treasury Bills", 4.0, 100.0, 10.0),
+    ("2023-01-31", "Marketable", "Treasury Notes", 2.0, 200.0, 20.0),
+    ("2024-03-31", "Marketable", "Treasury Bonds", 5.0, 300.0, 0.0),
+    ("2024-03-31", "Non-marketable", "Domestic Series", 7.0, 10.0, 900.0),
+    ("2024-04-30", "Non-marketable", "Foreign Series", 3.0, 20.0, 100.0),
+    ("2024-04-30", "Marketable", "Treasury Bills", 4.5, 150.0, 5.0),
+]
+
+today = "2024-06-15"
+
+
+# Function to load rows into a fresh embedded serving table and build its monthly cube
+def loaded_connection(rows):
+    connector = SqliteConnector()
+    connection = connector.connect()
+    connector.run_ddl(connection, "")
+    connection.executemany(f"INSERT INTO {serving_table_name} (record_date, security_type_desc, security_desc, "
+                           f"avg_interest_rate_amt, debt_held_public_mil_amt, intragov_hold_mil_amt, total_mil_amt) "
+                           f"VALUES (?, ?, ?, ?, ?, ?, ?)", [row + (row[4] + row[5],) for row in rows])
+    refresh_monthly_cube(connector, connection)
+    return connection
+
+
+def test_business_questions_are_answered_from_the_cube():
+    answers = answer_business_questions(loaded_connection(serving_rows), today=today)
+
+    assert answers['max_holding_category'] == "Non-marketable"
+    # The latest month is April 2024, when Marketable securities hold more publicly
+    assert answers['max_public_holding_category'] == "Marketable"
+    assert answers['highest_interest_category'] == "Non-Marketable"
+    # Since June 2022
+    assert answers['average_interest_marketable'] == pytest.approx((4.0 + 2.0 + 5.0 + 4.5) / 4)
+    assert answers['average_interest_non_marketable'] == pytest.approx((7.0 + 3.0) / 2)
+    assert answers['top_3_marketable'] == ["Treasury Bonds", "Treasury Bills", "Treasury Notes"]
+    assert answers['top_3_non_marketable'] == ["Domestic Series", "Foreign Series"]
+    assert answers['highest_avg_interest_security'] == "Domestic Series"
+
+
+def test_cached_answers_follow_the_serving_data(tmp_path):
+    cache_directory = str(tmp_path / "analysis_cache")
+    connection = loaded_connection(serving_rows)
+
+    answers = answer_business_questions(connection, today=today, cache_directory=cache_directory)
+    assert answer_business_questions(connection, today=today, cache_directory=cache_directory) == answers
+    assert len(os.listdir(cache_directory)) == 1
+
+    # Swapping the January 2023 Bills and Notes keeps every count, total and maximum of the cube, not the answers
+    swapped_names = {"Treasury Bills": "Treasury Notes", "Treasury Notes": "Treasury Bills"}
+    relabeled_rows = [row[:2] + (swapped_names[row[2]] if row[0] == "2023-01-31" else row[2],) + row[3:]
+                      for row in serving_rows]
+    relabeled_answers = answer_business_questions(loaded_connection(relabeled_rows), today=today,
+                                                  cache_directory=cache_directory)
+    assert relabeled_answers['top_3_marketable'] == ["Treasury Bonds", "Treasury Notes", "Treasury Bills"]
+    assert len(os.listdir(cache_directory)) == 2
+
+
+def test_time_relative_answers_move_with_today():
+    answers = answer_business_questions(loaded_connection(serving_rows), today="2023-06-15")
+
+    # Nothing is dated in 2023 after January, the current year's highest rate is the January Treasury Bills
+    assert answers['highest_avg_interest_security'] == "Treasury Bills"
+    # The last two years now reach back to December 2021
+    assert answers['average_interest_marketable'] == pytest.approx((9.0 + 4.0 + 2.0 + 5.0 + 4.5) / 5)
@@ -0,0 +1,64 @@
+import io
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from schema import apply_schema, read_csv_options
+
+# Quoted values with separators, quotes and line breaks, long enough that small download ranges end inside them
+quoted_values = ["Bills, Notes and Bonds", 'Treasury "FRN" Notes', "first line\nsecond line",
+                 "carriage\r\nreturn, with a comma", "Série I €, \"quoted\"\nand wrapped"]
+
+
+# Function to store a CSV of quoted values, returns its bytes
+def store_quoted_csv(pipeline_script, row_count=200):
+    records_df = pd.DataFrame({'record_date': [f"20{10 + index % 14}-{index % 12 + 1:02d}-28"
+                                               for index in range(row_count)],
+                               'security_desc': [quoted_values[index % len(quoted_values)]
+                                                 for index in range(row_count)],
+                               'avg_interest_rate_amt': [index / 8 for index in range(row_count)]})
+    csv_data = records_df.to_csv(index=False).encode('utf-8')
+    pipeline_script.get_storage().upload_bytes("container", "directory/records.csv", csv_data)
+    return csv_data
+
+
+# Function to get the byte offsets inside quoted fields, where a range boundary splits a value
+def offsets_inside_quotes(csv_data):
+    offsets, quoted = set(), False
+    for offset, byte in enumerate(csv_data):
+        if byte == ord('"'):
+            quoted = not quoted
+        elif quoted:
+            offsets.add(offset)
+    return offsets
+
+
+@pytest.mark.parametrize("blob_cache_directory", ["blob_cache", None])
+@pytest.mark.parametrize("chunk_size", [7, 64, 1000])
+def test_csv_read_in_ranges_matches_a_whole_read(pipeline_script, monkeypatch, tmp_path, blob_cache_directory,
+                                                 chunk_size):
+    # The cache copies a miss in ranges of the storage's default size, the stream in blob_download_chunk_size
+    monkeypatch.setattr(pipeline_script, "blob_cache_directory",
+                        blob_cache_directory and str(tmp_path / blob_cache_directory))
+    monkeypatch.setattr(pipeline_script, "blob_download_chunk_size", chunk_size)
+    csv_data = store_quoted_csv(pipeline_script)
+    assert offsets_inside_quotes(csv_data) & set(range(chunk_size, len(csv_data), chunk_size))
+    expected_df = apply_schema(pd.read_csv(io.BytesIO(csv_data), encoding='utf-8', **read_csv_options()))
+
+    # The second read with the cache on is a hit, parsed from the memory-mapped copy
+    for _ in range(2 if blob_cache_directory else 1):
+        df = pipeline_script.read_from_azure_blob_storage("container", "directory/records.csv")
+
+        pd.testing.assert_frame_equal(df, expected_df)
+        assert df['security_desc'].astype(str).tolist()[:len(quoted_values)] == quoted_values
+
+
+def test_column_subset_is_read_in_ranges(pipeline_script):
+    csv_data = store_quoted_csv(pipeline_script)
+    columns = ['record_date', 'security_desc']
+
+    df = pipeline_script.read_from_azure_blob_storage("container", "directory/records.csv", columns)
+
+    pd.testing.assert_frame_equal(df, apply_schema(pd.read_csv(io.BytesIO(csv_data), encoding='utf-8',
+                                                               usecols=columns, **read_csv_options(columns))))
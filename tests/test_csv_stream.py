@@ -0,0 +1,67 @@
+import io
+import tracemalloc
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from bench_csv_streaming import generate_records, header
+from csv_stream import iter_dataframe_csv_chunks, iter_frames_csv_chunks
+
+# Values the CSV must quote: separators, quotes, embedded line breaks, padding, blanks and non-ASCII text
+awkward_values = ["Bills, Notes and Bonds", 'Treasury "FRN" Notes', "first line\nsecond line", "carriage\r\nreturn",
+                  "  padded  ", "", None, "Série I €", "plain"]
+
+
+# Function to stream a frame through the ingestion's upload into local storage, returns the stored bytes
+def upload_frame(pipeline_script, records_df, chunk_rows):
+    pipeline_script.upload_stream_to_azure_blob_storage(
+        "container", iter_dataframe_csv_chunks(records_df, list(records_df.columns), chunk_rows), "records.csv",
+        "directory", "csv:test")
+    return pipeline_script.get_storage().read_bytes("container", "directory/records.csv")
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 4, 1000])
+def test_streamed_upload_is_byte_for_byte_to_csv(pipeline_script, chunk_rows):
+    records_df = pd.DataFrame({'record_date': [f"2024-01-{day:02d}" for day in range(1, len(awkward_values) + 1)],
+                               'security_desc': awkward_values,
+                               'avg_interest_rate_amt': [1.468, 9.824, None, 0.1, 2.0, 3.25, 4.5, 5.0, 6.125]})
+
+    stored_data = upload_frame(pipeline_script, records_df, chunk_rows)
+
+    assert stored_data == records_df.to_csv(index=False, lineterminator='\n').encode('utf-8')
+    parsed_df = pd.read_csv(io.BytesIO(stored_data), dtype=str, keep_default_na=False)
+    assert parsed_df['security_desc'].tolist() == [value or "" for value in awkward_values]
+
+
+def test_frame_without_rows_is_stored_with_its_header(pipeline_script):
+    records_df = pd.DataFrame(columns=header)
+
+    assert upload_frame(pipeline_script, records_df, 10) == records_df.to_csv(index=False,
+                                                                             lineterminator='\n').encode('utf-8')
+
+
+def test_partitions_are_stored_as_one_csv_with_one_header():
+    records_df = pd.DataFrame(list(generate_records(25)), columns=header)
+    frames = [records_df.iloc[:0], records_df.iloc[:10], records_df.iloc[10:]]
+
+    assert b''.join(iter_frames_csv_chunks(frames, chunk_rows=4)) == \
+        records_df.to_csv(index=False, lineterminator='\n').encode('utf-8')
+
+
+def test_streamed_upload_holds_a_chunk_of_rows_at_a_time(pipeline_script):
+    records_df = pd.DataFrame(list(generate_records(300000)), columns=header)
+    chunk_rows = 5000
+
+    # Only the encoding and the upload are traced, the cleaned frame is already held by the ingestion
+    tracemalloc.start()
+    try:
+        upload_frame(pipeline_script, records_df, chunk_rows)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    blob_size = pipeline_script.get_storage().blob_size("container", "directory/records.csv")
+    # The CSV is 60 chunks, the upload holds the chunk being encoded and written, never the whole CSV
+    assert blob_size > 50 * chunk_rows * 40
+    assert peak_bytes < blob_size // 3
@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("matplotlib")
+pytest.importorskip("seaborn")
+
+from synthetic_treasury import make_debt_records, make_interest_rate_records
+
+ingestion_directory = os.path.join(os.path.dirname(__file__), os.pardir, "src", "ingestion")
+
+
+# Function to store the synthetic datasets where ExploratoryAnalysis.py reads them from the local storage backend
+def store_datasets(storage_root):
+    import ExploratoryAnalysis
+
+    for directory_name, blob_name, records in [
+            (ExploratoryAnalysis.directory_name_d1, ExploratoryAnalysis.blob_name_d1,
+             make_interest_rate_records(month_count=24)),
+            (ExploratoryAnalysis.directory_name_d2, ExploratoryAnalysis.blob_name_d2,
+             make_debt_records(month_count=24))]:
+        path = os.path.join(storage_root, ExploratoryAnalysis.container_name, *directory_name.split('/'), blob_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pd.DataFrame(list(records)).replace("null", "").to_csv(path, index=False)
+
+
+def test_headless_profile_renders_the_figures_in_several_processes(tmp_path):
+    # The script's relative paths (../../local_storage, ../blob_cache) resolve inside tmp_path
+    working_directory = tmp_path / "src" / "ingestion"
+    working_directory.mkdir(parents=True)
+    store_datasets(str(tmp_path / "local_storage"))
+    output_directory = tmp_path / "profile"
+
+    # Each worker imports the script again as its main module, which must not run the analysis a second time
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ingestion_directory, "ExploratoryAnalysis.py"), "--headless",
+         "--storage-backend", "local", "--max-workers", "2", "--output-directory", str(output_directory)],
+        cwd=working_directory, capture_output=True, text=True, timeout=300)
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.count("Profile report has been saved to:") == 1
+    with open(output_directory / "profile.json") as report_file:
+        profile = json.load(report_file)
+    figures = [file_name for dataset in profile['datasets'].values() for file_name in dataset['figures']]
+    assert len(figures) > 2
+    assert all((output_directory / file_name).stat().st_size > 0 for file_name in figures)
+    assert profile['datasets']['interest_rates']['rows'] == len(make_interest_rate_records(month_count=24))
@@ -0,0 +1,36 @@
+import hashlib
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from handoff import verify_stored_copy
+from storage_backend import LocalStorageBackend
+
+
+def test_stored_copy_matches_the_uploaded_bytes(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path))
+    storage.upload_blocks("container", "directory/data.csv", [b"a,b\n", "1,2\n"])
+
+    verify_stored_copy(storage, "container", "directory/data.csv", hashlib.md5(b"a,b\n1,2\n").digest())
+
+
+@pytest.mark.parametrize("stored_data", [b"a,b\n1,3\n", None])
+def test_changed_or_missing_stored_copy_fails(tmp_path, stored_data):
+    storage = LocalStorageBackend(str(tmp_path))
+    if stored_data is not None:
+        storage.upload_bytes("container", "directory/data.csv", stored_data)
+
+    with pytest.raises(RuntimeError, match="does not hold the uploaded data"):
+        verify_stored_copy(storage, "container", "directory/data.csv", hashlib.md5(b"a,b\n1,2\n").digest())
+
+
+def test_streamed_upload_returns_the_md5_of_the_stored_blob(pipeline_script):
+    df = pd.DataFrame({'record_date': ["2024-01-31", "2024-02-29"], 'security_desc': ["Bills", "Notes, \"FRN\""]})
+
+    content_md5 = pipeline_script.upload_stream_to_azure_blob_storage(
+        "container", pipeline_script.iter_dataframe_csv_chunks(df, list(df.columns), 1), "data.csv", "directory",
+        "csv:test")
+
+    assert content_md5 == hashlib.md5(df.to_csv(index=False, lineterminator='\n').encode('utf-8')).digest()
+    verify_stored_copy(pipeline_script.get_storage(), "container", "directory/data.csv", content_md5)
@@ -0,0 +1,153 @@
+import threading
+import time
+from datetime import date
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import metrics
+from http_cache import HttpCache, is_closed_request, record_date_windows
+
+params = {'filter': 'record_date:gte:2001-01-01', 'page[size]': 100}
+
+
+def test_request_is_split_into_yearly_windows_in_record_date_order():
+    windows = record_date_windows(params, today=date(2004, 6, 15))
+
+    # Only the filter changes, the windows are listed in the API's default ascending record_date order
+    assert [window['filter'] for window in windows] == [
+        "record_date:gte:2001-01-01,record_date:lte:2001-12-31",
+        "record_date:gte:2002-01-01,record_date:lte:2002-12-31",
+        "record_date:gte:2003-01-01,record_date:lte:2003-12-31",
+        "record_date:gte:2004-01-01",
+    ]
+    assert all({**window, 'filter': params['filter']} == params for window in windows)
+    assert not is_closed_request(windows[-1], today=date(2004, 6, 15))
+    assert all(is_closed_request(window, today=date(2004, 6, 15)) for window in windows[:-1])
+
+
+def test_windows_follow_the_request_sort():
+    descending_windows = record_date_windows({**params, 'sort': '-record_date'}, today=date(2004, 6, 15))
+
+    assert [window['filter'] for window in descending_windows] == [
+        window['filter'] for window in record_date_windows(params, today=date(2004, 6, 15))][::-1]
+    assert record_date_windows({**params, 'sort': 'security_desc'}, today=date(2004, 6, 15)) == [
+        {**params, 'sort': 'security_desc'}]
+
+
+def test_closed_responses_are_revalidated_after_their_max_age(tmp_path):
+    cache = HttpCache(str(tmp_path), closed_max_age_seconds=3600)
+    closed_params = record_date_windows(params, today=date(2004, 6, 15))[0]
+    entry = {'etag': '"v1"', 'stored_at': time.time() - 60}
+
+    assert cache.is_fresh(entry, closed_params)
+    assert not cache.is_fresh({**entry, 'stored_at': time.time() - 7200}, closed_params)
+    assert HttpCache(str(tmp_path), closed_max_age_seconds=None).is_fresh({**entry, 'stored_at': 0}, closed_params)
+
+
+# Function to get a recorded counter of requests made outside any stage
+def counter(name):
+    return metrics.counters.get((name, 'pipeline'), 0)
+
+
+@pytest.fixture
+def stub_server():
+    pytest.importorskip("requests")
+    from stub_fiscaldata_server import make_handler
+    from synthetic_treasury import make_interest_rate_records
+
+    # Three years of records from January 2001, every month long closed
+    records = make_interest_rate_records(month_count=36)
+    requests_served = []
+
+    class CountingHandler(make_handler(records, latency_seconds=0.0)):
+        def do_GET(self):
+            requests_served.append(self.path)
+            super().do_GET()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/avg_interest_rates", records, requests_served
+    server.shutdown()
+    server.server_close()
+
+
+# Function to fetch every record of the stub server through a new fetcher, returns the records and the seconds taken
+def fetch_records(base_url, cache, requests_per_second=None):
+    from async_fetcher import AsyncFetcher
+
+    fetcher = AsyncFetcher(max_connections=4, requests_per_second=requests_per_second, max_retries=0, cache=cache)
+    try:
+        start = time.perf_counter()
+        records = fetcher.fetch_all_pages(base_url, params)
+        return records, time.perf_counter() - start
+    finally:
+        fetcher.close()
+
+
+def test_closed_windows_are_served_from_the_cache_and_the_open_one_revalidated(stub_server, tmp_path):
+    base_url, records, requests_served = stub_server
+    metrics.reset_metrics()
+
+    cold_records, _ = fetch_records(base_url, HttpCache(str(tmp_path)))
+    cold_requests = len(requests_served)
+    assert sorted(record['record_date'] for record in cold_records) == sorted(record['record_date']
+                                                                             for record in records)
+    assert counter('http_cache_misses') == cold_requests
+
+    warm_records, _ = fetch_records(base_url, HttpCache(str(tmp_path)))
+
+    assert warm_records == cold_records
+    # Only the current year's window has no upper bound, its page is revalidated with a 304
+    assert len(requests_served) == cold_requests + 1
+    assert counter('http_cache_hits') == cold_requests - 1
+    assert counter('http_cache_revalidated') == 1
+    assert counter('http_cache_misses') == cold_requests
+
+
+def test_cache_hits_do_not_wait_on_the_rate_cap(stub_server, tmp_path):
+    base_url, _, requests_served = stub_server
+    fetch_records(base_url, HttpCache(str(tmp_path)))
+    cached_pages = len(requests_served) - 1
+
+    # At 2 requests per second, pacing every cached page would take over cached_pages / 2 seconds
+    _, warm_seconds = fetch_records(base_url, HttpCache(str(tmp_path)), requests_per_second=2)
+
+    assert cached_pages >= 20
+    assert warm_seconds < 2
+
+
+def test_windowed_records_keep_the_order_of_the_whole_request(stub_server, tmp_path):
+    base_url, _, _ = stub_server
+
+    whole_records, _ = fetch_records(base_url, None)
+    cold_records, _ = fetch_records(base_url, HttpCache(str(tmp_path)))
+    warm_records, _ = fetch_records(base_url, HttpCache(str(tmp_path)))
+
+    assert cold_records == whole_records
+    assert warm_records == whole_records
+
+
+def test_closed_windows_past_their_max_age_are_revalidated(stub_server, tmp_path):
+    base_url, records, requests_served = stub_server
+    fetch_records(base_url, HttpCache(str(tmp_path)))
+    cold_requests = len(requests_served)
+    metrics.reset_metrics()
+
+    warm_records, _ = fetch_records(base_url, HttpCache(str(tmp_path), closed_max_age_seconds=0))
+
+    # Every page is asked again with its validators, the unchanged ones come back as 304s without a body
+    assert len(requests_served) == 2 * cold_requests
+    assert counter('http_cache_revalidated') == cold_requests
+    assert counter('http_cache_hits') == 0
+    assert len(warm_records) == len(records)
+
+
+def test_without_a_cache_the_request_is_not_split_into_windows(stub_server):
+    base_url, records, requests_served = stub_server
+
+    fetched_records, _ = fetch_records(base_url, None)
+
+    assert len(fetched_records) == len(records)
+    assert len(requests_served) == -(-len(records) // params['page[size]'])
@@ -0,0 +1,37 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from incremental import group_frame_by_partition, rows_at_or_before_watermark
+
+
+def partition_frame(record_dates):
+    return pd.DataFrame({'record_date': record_dates, 'security_desc': ['Treasury Bills'] * len(record_dates)})
+
+
+# Function to rewrite a stored partition the way the incremental ingestion does
+def rewrite_partition(stored_df, new_df, watermark):
+    return pd.concat([rows_at_or_before_watermark(stored_df, watermark), new_df], ignore_index=True)
+
+
+def test_retried_partition_write_does_not_duplicate_rows():
+    stored_df = partition_frame(["2023-01-15", "2023-01-31"])
+    new_df = partition_frame(["2023-01-31"])
+
+    # The first attempt writes the partition and fails before the watermark moves, the retry writes it again
+    first_attempt = rewrite_partition(stored_df.iloc[:1], new_df, "2023-01-15")
+    retry = rewrite_partition(first_attempt, new_df, "2023-01-15")
+
+    assert retry['record_date'].tolist() == ["2023-01-15", "2023-01-31"]
+
+
+def test_first_run_without_watermark_replaces_the_partition():
+    assert rows_at_or_before_watermark(partition_frame(["2023-01-31"]), None).empty
+
+
+def test_records_are_grouped_by_month_partition():
+    partitions = group_frame_by_partition(partition_frame(["2023-01-31", "2023-02-28", "2023-02-01"]), "debt",
+                                          "debt.csv")
+
+    assert sorted(partitions) == ["debt/year=2023/month=01/debt.csv", "debt/year=2023/month=02/debt.csv"]
+    assert len(partitions["debt/year=2023/month=02/debt.csv"]) == 2
@@ -0,0 +1,94 @@
+import io
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+import metrics
+from parquet_storage import append_string_frame_to_parquet_bytes, read_parquet, string_frame_to_parquet_bytes
+
+header = ["record_date", "security_desc", "avg_interest_rate_amt", "record_fiscal_year"]
+
+
+# Rows as the API returns them: every value a string, missing values as the literal "null"
+def api_frame():
+    return pd.DataFrame([["2023-01-31", "Treasury Bills", "4.123", "2023"],
+                         ["2023-02-28", "Treasury Notes", "null", "2023"],
+                         ["null", "null", "2.5", "null"]], columns=header)
+
+
+def test_null_strings_round_trip_as_missing_values():
+    df = read_parquet(io.BytesIO(string_frame_to_parquet_bytes(api_frame(), header)))
+
+    assert len(df) == 3
+    rates = df.set_index('security_desc')['avg_interest_rate_amt']
+    assert rates['Treasury Bills'] == pytest.approx(4.123)
+    assert pd.isna(rates['Treasury Notes'])
+    missing_row = df[df['security_desc'].isna()]
+    assert len(missing_row) == 1
+    assert pd.isna(missing_row['record_date'].iloc[0])
+    assert pd.isna(missing_row['record_fiscal_year'].iloc[0])
+    assert missing_row['avg_interest_rate_amt'].iloc[0] == pytest.approx(2.5)
+
+
+def test_append_keeps_existing_rows_with_null_strings():
+    existing_bytes = string_frame_to_parquet_bytes(api_frame(), header)
+    new_rows = pd.DataFrame([["2023-03-31", "Treasury Bonds", "null", "2023"]], columns=header)
+
+    df = read_parquet(io.BytesIO(append_string_frame_to_parquet_bytes(existing_bytes, new_rows, header,
+                                                                      "2023-02-28")))
+
+    assert len(df) == 4
+    assert df['avg_interest_rate_amt'].isna().sum() == 2
+
+
+def test_append_replaces_rows_newer_than_the_watermark():
+    existing_bytes = string_frame_to_parquet_bytes(api_frame(), header)
+    # A retry fetches the rows after the watermark again, the February row among them
+    new_rows = pd.DataFrame([["2023-02-28", "Treasury Notes", "3.25", "2023"]], columns=header)
+
+    once = append_string_frame_to_parquet_bytes(existing_bytes, new_rows, header, "2023-01-31")
+    twice = append_string_frame_to_parquet_bytes(once, new_rows, header, "2023-01-31")
+
+    df = read_parquet(io.BytesIO(twice))
+    assert len(df) == 3
+    assert df.set_index('security_desc')['avg_interest_rate_amt']['Treasury Notes'] == pytest.approx(3.25)
+
+
+# Function to store a Parquet blob of monthly rows in many row groups, returns its rows and its name
+def store_monthly_parquet(pipeline_script):
+    records_df = pd.DataFrame([[f"{year}-{month:02d}-28", f"Security {index}", f"{index % 7}.25", str(year)]
+                               for year in range(2001, 2025) for month in range(1, 13) for index in range(10)],
+                              columns=header)
+    pipeline_script.get_storage().upload_bytes("container", "directory/records.parquet",
+                                               string_frame_to_parquet_bytes(records_df, header, row_group_size=120))
+    return records_df, "directory/records.parquet"
+
+
+def test_cold_read_fetches_only_the_needed_ranges_with_the_blob_cache_on(pipeline_script, tmp_path):
+    records_df, blob_name = store_monthly_parquet(pipeline_script)
+    blob_size = pipeline_script.get_storage().blob_size("container", blob_name)
+    metrics.reset_metrics()
+
+    df = pipeline_script.read_parquet_from_azure_blob_storage("container", blob_name, ['record_date',
+                                                              'avg_interest_rate_amt'], "2010-01-01", "2010-12-31")
+
+    assert len(df) == len(records_df[records_df['record_fiscal_year'] == "2010"])
+    assert metrics.counters[('bytes_downloaded', 'pipeline')] < blob_size // 5
+    # A miss reads the ranges without downloading the whole blob into the cache
+    assert not list((tmp_path / "blob_cache").glob("*.blob"))
+
+
+def test_current_cached_copy_is_read_without_downloading(pipeline_script):
+    _, blob_name = store_monthly_parquet(pipeline_script)
+    # A whole read (e.g. of the bytes) leaves a local copy of the blob behind
+    pipeline_script.read_bytes_from_azure_blob_storage("container", blob_name)
+    expected_df = pipeline_script.read_parquet_from_azure_blob_storage("container", blob_name, None, "2010-01-01")
+    metrics.reset_metrics()
+
+    df = pipeline_script.read_parquet_from_azure_blob_storage("container", blob_name, None, "2010-01-01")
+
+    pd.testing.assert_frame_equal(df, expected_df)
+    assert metrics.counters.get(('bytes_downloaded', 'pipeline'), 0) == 0
+    assert metrics.counters[('blob_cache_hits', 'pipeline')] == 1
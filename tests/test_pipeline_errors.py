@@ -0,0 +1,31 @@
+import logging
+
+import pytest
+
+
+# Fetcher stand-in whose requests fail the way an unreachable API does
+class UnreachableFetcher:
+    def fetch_pages(self, *args, **kwargs):
+        raise ConnectionError("connection refused")
+
+
+def test_failed_ingestion_raises_its_cause_and_logs_the_traceback(pipeline_script, monkeypatch, caplog):
+    monkeypatch.setattr(pipeline_script, "get_async_fetcher", lambda *args: UnreachableFetcher())
+
+    with caplog.at_level(logging.ERROR), pytest.raises(ConnectionError, match="connection refused"):
+        pipeline_script.ingest_dataset("https://api.example/debt", {}, ["record_date"], "debt_statement.csv",
+                                       "processed_data/debt")
+
+    assert any(record.exc_info and "https://api.example/debt" in record.getMessage() for record in caplog.records)
+
+
+@pytest.mark.parametrize("blob_cache_directory", ["cached", None])
+def test_missing_blob_raises_instead_of_returning_none(pipeline_script, monkeypatch, tmp_path, caplog,
+                                                       blob_cache_directory):
+    monkeypatch.setattr(pipeline_script, "blob_cache_directory",
+                        blob_cache_directory and str(tmp_path / blob_cache_directory))
+
+    with caplog.at_level(logging.ERROR), pytest.raises(FileNotFoundError):
+        pipeline_script.read_blob_dataframe("container", "directory/missing.csv", start_date="2024-01-01")
+
+    assert any(record.exc_info and "directory/missing.csv" in record.getMessage() for record in caplog.records)
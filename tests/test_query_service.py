@@ -0,0 +1,219 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from query_service import (QueryService, ServingDataUnavailable, aggregate_columns, make_handler, parse_date,
+                           serving_renames)
+from storage_backend import LocalStorageBackend
+
+
+# Service stand-in whose answers fail with the given error
+class FailingService:
+    def __init__(self, error):
+        self.error = error
+
+    def answer(self, path, params):
+        raise self.error
+
+    def status(self):
+        return {'version': None, 'rows': 0}
+
+
+# Function to send one GET request to a server answering from service, returns the status and the decoded body
+def get(service, path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("error, expected_status", [
+    (KeyError('security_desc'), 500),
+    (ServingDataUnavailable("not loaded"), 503),
+    (ValueError("unknown group_by"), 400),
+])
+def test_failed_queries_answer_with_a_json_error(error, expected_status):
+    status, body = get(FailingService(error), "/records?limit=1")
+
+    assert status == expected_status
+    assert 'error' in body
+
+
+def test_unknown_path_is_not_found():
+    assert get(FailingService(KeyError()), "/missing")[0] == 404
+
+
+# Function to store synthetic serving data, newest month first; returns the stored frame as
+# plain pandas reads it, sorted on record_date like the service's index
+def store_serving_data(storage, seed):
+    from bench_query_service import make_serving_records, serving_header
+    from synthetic_treasury import iter_records_csv_chunks
+
+    records = list(make_serving_records(1, seed=seed))
+    storage.upload_blocks("container", "serving_data/serving_data.csv", iter_records_csv_chunks(records,
+                                                                                                serving_header))
+    df = pd.DataFrame(records).rename(columns=serving_renames)
+    df['record_date'] = pd.to_datetime(df['record_date'])
+    for column in aggregate_columns:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df.sort_values('record_date', kind='stable', ignore_index=True)
+
+
+@pytest.fixture
+def serving(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path))
+    expected_df = store_serving_data(storage, seed=1)
+    service = QueryService(storage, "container", "serving_data/serving_data.csv", reload_interval_seconds=3600)
+    assert service.reload()
+    return storage, service, expected_df
+
+
+# Function to select the rows of a query's parameters with plain pandas filters
+def expected_rows(df, start=None, end=None, security_type=None, security_desc=None):
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df['record_date'] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df['record_date'] <= pd.Timestamp(end)
+    if security_type is not None:
+        mask &= df['security_type_desc'] == security_type
+    if security_desc is not None:
+        mask &= df['security_desc'] == security_desc
+    return df[mask]
+
+
+# Function to get a query's decoded answer from the service
+def answer(service, path, **params):
+    return json.loads(service.answer(path, {name: str(value) for name, value in params.items()}))
+
+
+selections = [
+    {},
+    {'start': "2010-01-01", 'end': "2012-06-30"},
+    {'start': "2020-03-31"},
+    {'end': "2001-03-31", 'security_type': "Marketable"},
+    {'start': "2005-01-01", 'end': "2015-12-31", 'security_type': "Non-marketable"},
+    {'start': "2008-01-01", 'end': "2009-12-31", 'security_desc': "Treasury Bills"},
+    {'security_type': "Marketable", 'security_desc': "Treasury Notes"},
+    {'security_type': "Non-marketable", 'security_desc': "Treasury Notes"},
+    {'start': "2030-01-01"},
+]
+
+
+@pytest.mark.parametrize("selection", selections)
+def test_index_selects_the_rows_of_a_date_range_security_type_and_security(serving, selection):
+    _, service, expected_df = serving
+    dates = {name: parse_date(selection.get(name)) for name in ('start', 'end')}
+
+    positions = service.index.select(dates['start'], dates['end'], selection.get('security_type'),
+                                     selection.get('security_desc'))
+    rows = service.index.df.take(positions)
+    expected = expected_rows(expected_df, **selection)
+
+    # The blob is stored newest first, the index answers in ascending record_date order
+    assert rows['record_date'].is_monotonic_increasing
+    assert rows['record_date'].tolist() == expected['record_date'].tolist()
+    assert rows['security_desc'].astype(str).tolist() == expected['security_desc'].tolist()
+    assert rows['avg_interest_rate_amt'].tolist() == pytest.approx(expected['avg_interest_rate_amt'].tolist(),
+                                                                   nan_ok=True)
+
+
+@pytest.mark.parametrize("selection", selections[:6])
+def test_records_query_matches_pandas(serving, selection):
+    _, service, expected_df = serving
+    expected = expected_rows(expected_df, **selection)
+
+    result = answer(service, '/records', limit=50, **selection)
+
+    assert result['count'] == len(expected)
+    assert [record['security_desc'] for record in result['records']] == expected['security_desc'].head(50).tolist()
+    assert [record['record_date'][:10] for record in result['records']] == \
+        expected['record_date'].head(50).dt.strftime('%Y-%m-%d').tolist()
+
+
+@pytest.mark.parametrize("group_by", ["security_type_desc", "security_desc", "year", "month"])
+def test_aggregate_query_matches_pandas(serving, group_by):
+    _, service, expected_df = serving
+    expected = expected_rows(expected_df, start="2004-01-01", end="2012-12-31")
+    if group_by == 'year':
+        keys = expected['record_date'].dt.year
+    elif group_by == 'month':
+        keys = expected['record_date'].dt.strftime('%Y-%m')
+    else:
+        keys = expected[group_by]
+    expected_groups = expected.groupby(keys).agg(rows=('record_date', 'size'), **{
+        column: (column, function) for column, function in aggregate_columns.items()})
+
+    result = answer(service, '/aggregate', start="2004-01-01", end="2012-12-31", group_by=group_by)
+
+    groups = {str(group[group_by]): group for group in result['groups']}
+    assert sorted(groups) == sorted(str(key) for key in expected_groups.index)
+    for key, expected_group in expected_groups.iterrows():
+        group = groups[str(key)]
+        assert group['rows'] == expected_group['rows']
+        for column in aggregate_columns:
+            assert group[column] == pytest.approx(expected_group[column], rel=1e-9)
+
+
+def test_top_query_matches_pandas(serving):
+    _, service, expected_df = serving
+    expected = expected_rows(expected_df, start="2015-01-01", security_type="Marketable")
+    expected_top = expected.groupby('security_desc')['avg_interest_rate_amt'].mean().dropna().nlargest(4)
+
+    result = answer(service, '/top', start="2015-01-01", security_type="Marketable", n=4)
+
+    assert [top['security_desc'] for top in result['top']] == expected_top.index.tolist()
+    assert [top['avg_interest_rate_amt'] for top in result['top']] == pytest.approx(expected_top.tolist())
+
+
+def test_repeated_queries_are_answered_from_the_result_cache(serving):
+    _, service, _ = serving
+    params = {'start': "2010-01-01", 'security_type': "Marketable"}
+
+    first = service.answer('/aggregate', params)
+    hits = service.cache.hits
+    second = service.answer('/aggregate', dict(reversed(list(params.items()))))
+    service.answer('/aggregate', {**params, 'group_by': 'year'})
+
+    assert second is first
+    assert service.cache.hits == hits + 1
+    assert service.status()['cache_entries'] == 2
+
+
+def test_new_serving_version_is_reloaded_when_the_blob_etag_changes(serving):
+    storage, service, _ = serving
+    first_version = service.index.version
+    answer(service, '/records', limit=1)
+
+    assert not service.reload()
+    new_expected_df = store_serving_data(storage, seed=2)
+    assert service.reload()
+
+    assert service.index.version == storage.blob_etag("container", "serving_data/serving_data.csv") != first_version
+    assert service.status()['cache_entries'] == 0
+    result = answer(service, '/aggregate', group_by='security_type_desc')
+    assert result['version'] == service.index.version
+    expected_sums = new_expected_df.groupby('security_type_desc')['debt_held_public_mil_amt'].sum()
+    assert {group['security_type_desc']: group['debt_held_public_mil_amt'] for group in result['groups']} == \
+        pytest.approx(expected_sums.to_dict(), rel=1e-9)
+
+
+def test_queries_are_answered_over_http(serving):
+    _, service, expected_df = serving
+
+    status, body = get(service, "/records?start=2010-01-01&end=2010-12-31&security_desc=Treasury%20Bills")
+
+    assert status == 200
+    assert body['count'] == len(expected_rows(expected_df, start="2010-01-01", end="2010-12-31",
+                                              security_desc="Treasury Bills"))
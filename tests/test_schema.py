@@ -0,0 +1,33 @@
+import io
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from schema import apply_schema, read_csv_options
+from sql_loader import SqliteConnector, iter_row_batches
+
+interest_rate_csv = ("record_date,security_type_desc,security_desc,avg_interest_rate_amt,record_fiscal_year\n"
+                     "2023-01-31,Marketable,Treasury Bills,1.468,2023\n"
+                     "2023-01-31,Non-marketable,Domestic Series,9.824,2023\n"
+                     "2023-02-28,Marketable,Treasury Notes,null,2023\n")
+
+
+def test_interest_rates_keep_the_source_decimals_in_row_batches():
+    df = pd.read_csv(io.StringIO(interest_rate_csv), **read_csv_options())
+    df = apply_schema(df)
+
+    rows = [row for batch in iter_row_batches(df) for row in batch]
+
+    assert [row[3] for row in rows] == [1.468, 9.824, None]
+    assert rows[0][0] == "2023-01-31"
+
+
+def test_interest_rates_keep_the_source_decimals_in_sqlite():
+    df = apply_schema(pd.read_csv(io.StringIO(interest_rate_csv), **read_csv_options()))
+    connection = SqliteConnector().connect()
+    connection.execute("CREATE TABLE rates (avg_interest_rate_amt FLOAT)")
+    connection.executemany("INSERT INTO rates VALUES (?)", [(row[3],) for row in next(iter_row_batches(df))])
+
+    assert connection.execute("SELECT MAX(avg_interest_rate_amt) FROM rates").fetchone()[0] == 9.824
+    assert df['avg_interest_rate_amt'].to_csv(index=False).split('\n')[1] == "1.468"
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("numpy")
+
+from bench_sql_load import make_serving_frame
+from sql_loader import SqliteConnector, bulk_load, iter_row_batches, serving_table_name
+
+
+# Function to get a fresh in-memory serving table
+def serving_connection():
+    connector = SqliteConnector()
+    connection = connector.connect()
+    connector.run_ddl(connection, "")
+    return connector, connection
+
+
+def test_row_batches_cover_the_frame_in_order():
+    df = make_serving_frame(2500)
+
+    batches = list(iter_row_batches(df, batch_size=1000))
+
+    assert [len(batch) for batch in batches] == [1000, 1000, 500]
+    assert batches[2][-1][0] == df['record_date'].iloc[-1].strftime('%Y-%m-%d')
+    # Missing holdings are bound as NULL, not NaN
+    assert batches[0][0][11] is None
+
+
+@pytest.mark.parametrize("batch_size, use_staging", [(1000, False), (7000, False), (1000, True)])
+def test_bulk_load_stores_every_row_and_value(batch_size, use_staging):
+    df = make_serving_frame(20000)
+    connector, connection = serving_connection()
+
+    rows_loaded = bulk_load(connector, connection, df, batch_size=batch_size, use_staging=use_staging)
+
+    assert rows_loaded == len(df)
+    count, rate_sum, missing_holdings, first_date, last_date = connection.execute(
+        f"SELECT COUNT(*), SUM(avg_interest_rate_amt), SUM(intragov_hold_mil_amt IS NULL), MIN(record_date), "
+        f"MAX(record_date) FROM {serving_table_name}").fetchone()
+    assert count == len(df)
+    assert rate_sum == pytest.approx(df['avg_interest_rate_amt'].sum())
+    assert missing_holdings == df['intragov_hold_mil_amt'].isna().sum()
+    assert (first_date, last_date) == (df['record_date'].min().strftime('%Y-%m-%d'),
+                                       df['record_date'].max().strftime('%Y-%m-%d'))
+
+
+def test_bulk_load_throughput():
+    df = make_serving_frame(100000)
+    connector, connection = serving_connection()
+
+    start = time.perf_counter()
+    bulk_load(connector, connection, df, batch_size=10000)
+    rows_per_second = len(df) / (time.perf_counter() - start)
+
+    # The embedded database loads several hundred thousand rows per second, the floor only catches a regression to
+    # per-row round trips or commits
+    assert rows_per_second > 20000
@@ -0,0 +1,50 @@
+import hashlib
+import io
+
+import pytest
+
+from storage_backend import ChunkReader, LocalStorageBackend, StorageBackend
+
+
+def test_incomplete_backend_fails_when_created():
+    class UploadOnlyBackend(StorageBackend):
+        def upload_bytes(self, container_name, blob_name, data):
+            pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        UploadOnlyBackend()
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+def test_local_blob_streams_back_in_ranges(tmp_path, max_concurrency):
+    storage = LocalStorageBackend(str(tmp_path))
+    storage.max_concurrency = max_concurrency
+    data = bytes(range(256)) * 1000
+    storage.upload_blocks("container", "directory/blob.bin", [data[:1000], data[1000:]])
+
+    chunks = list(storage.iter_chunks("container", "directory/blob.bin", chunk_size=4096))
+
+    assert b''.join(chunks) == data
+    assert len(chunks) == -(-len(data) // 4096)
+    with io.BufferedReader(ChunkReader(iter(chunks))) as blob_stream:
+        assert blob_stream.read() == data
+
+
+def test_local_etag_changes_when_the_blob_is_replaced(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path))
+    assert storage.blob_etag("container", "blob.csv") is None
+
+    storage.upload_bytes("container", "blob.csv", b"a,b\n")
+    first_etag = storage.blob_etag("container", "blob.csv")
+    storage.upload_bytes("container", "blob.csv", b"a,b\n1,2\n")
+
+    assert storage.blob_etag("container", "blob.csv") != first_etag
+    assert storage.list_blobs("container", "") == ["blob.csv"]
+
+
+def test_local_content_md5_is_read_back_from_the_stored_file(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path))
+    storage.upload_blocks("container", "directory/blob.csv", [b"a,b\n", "1,2\n"])
+
+    assert storage.blob_content_md5("container", "directory/blob.csv") == hashlib.md5(b"a,b\n1,2\n").digest()
+    assert storage.blob_content_md5("container", "directory/missing.csv") is None